@@ -0,0 +1,119 @@
+"""読み書きが混ざった負荷の下で、イベントループの遅れ(ラグ)を、データベースを直接呼ぶ場合と比べる
+
+serverディレクトリで ``python -m benchmark.async_database_benchmark [並行数...]`` として実行する。
+クローラーを模したコルーチンを並行数だけ動かし、それぞれが「ページキャッシュを引く(読み込み)→
+ヒット数を記録する(書き込み)→通信を待つ(スリープ)」を繰り返す。
+その間、1ms ごとに起きるコルーチンで、予定より何ms遅れて起きたかを計測する。
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import List, Dict, Iterable
+
+from service.async_database_service import AsyncDataBaseService
+from service.i_async_database_service import IAsyncDataBaseService
+from service.i_database_service import IDataBaseService
+from service.page_cache_service import PageCacheService
+from service.sqlite_database_service import SqliteDataBaseService
+
+# コルーチンごとの繰り返し回数
+REPEAT = 20
+
+# キャッシュに入れておくページ数(少ないほど、同じページを同時に引きやすい)
+PAGE_COUNT = 20
+
+# 通信を待つ秒数の代わり
+NETWORK_DELAY = 0.005
+
+# ラグを計測する間隔(秒)
+TICK_INTERVAL = 0.001
+
+
+class BlockingDataBaseService(IAsyncDataBaseService):
+    """比較用: asyncのメソッドの中から、データベースを直接(イベントループを止めて)呼ぶ"""
+
+    def __init__(self, database: IDataBaseService):
+        self.database = database
+        self.stats: Dict[str, int] = {'transaction': 0, 'coalesced': 0}
+
+    async def select(self, query: str, parameter=()) -> List[Dict[str, any]]:
+        return self.database.select(query, parameter)
+
+    async def many_query(self, query: List[str], parameter=None) -> None:
+        self.stats['transaction'] += 1
+        self.database.many_query(query, parameter)
+
+    async def bulk_query(self, query: List[str], parameter: List[Iterable[any]]) -> None:
+        self.stats['transaction'] += 1
+        self.database.bulk_query(query, parameter)
+
+    async def close(self) -> None:
+        pass
+
+
+async def crawl(database: IAsyncDataBaseService, rng: random.Random) -> None:
+    for _ in range(REPEAT):
+        url = f'https://example.com/lens/{rng.randrange(PAGE_COUNT)}'
+        await database.select('SELECT page_body.text FROM page_url '
+                              'JOIN page_body ON page_body.hash=page_url.hash WHERE page_url.url=?', (url,))
+        await database.query('INSERT INTO page_cache_stats (host, hit, miss) VALUES (?, 1, 0) '
+                             'ON CONFLICT (host) DO UPDATE SET hit=hit+1', ('example.com',))
+        await asyncio.sleep(NETWORK_DELAY)
+
+
+async def measure(database: IAsyncDataBaseService, concurrency: int) -> Dict[str, float]:
+    lag_list: List[float] = []
+    stop_event = asyncio.Event()
+
+    async def tick() -> None:
+        while not stop_event.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(TICK_INTERVAL)
+            lag_list.append(time.perf_counter() - start - TICK_INTERVAL)
+
+    ticker = asyncio.ensure_future(tick())
+    start = time.perf_counter()
+    rng = random.Random(0)
+    await asyncio.gather(*[crawl(database, random.Random(rng.random())) for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    stop_event.set()
+    await ticker
+    lag_list.sort()
+    return {
+        'elapsed': elapsed,
+        'p50': lag_list[len(lag_list) // 2],
+        'p99': lag_list[min(len(lag_list) - 1, len(lag_list) * 99 // 100)],
+        'max': lag_list[-1],
+    }
+
+
+def main(concurrency_list: List[int]):
+    print('mode\tconcurrency\tops\ttime[ms]\tlag p50[ms]\tlag p99[ms]\tlag max[ms]\ttransactions\tcoalesced')
+    for concurrency in concurrency_list:
+        for mode in ['blocking', 'async']:
+            with tempfile.TemporaryDirectory() as directory:
+                database = SqliteDataBaseService(os.path.join(directory, 'database.db'))
+                cache = PageCacheService(database)
+                for i in range(PAGE_COUNT):
+                    cache.put(f'https://example.com/lens/{i}', 'x' * 10000)
+                if mode == 'blocking':
+                    async_database: IAsyncDataBaseService = BlockingDataBaseService(database)
+                else:
+                    async_database = AsyncDataBaseService(database)
+
+                async def run() -> Dict[str, float]:
+                    async with async_database:
+                        return await measure(async_database, concurrency)
+
+                result = asyncio.run(run())
+                stats = async_database.stats
+                print(f'{mode}\t{concurrency}\t{concurrency * REPEAT * 2}\t{result["elapsed"] * 1000:.0f}\t'
+                      f'{result["p50"] * 1000:.2f}\t{result["p99"] * 1000:.2f}\t{result["max"] * 1000:.2f}\t'
+                      f'{stats["transaction"]}\t{stats["coalesced"]}')
+
+
+if __name__ == '__main__':
+    main([int(x) for x in sys.argv[1:]] or [10, 50])
@@ -0,0 +1,57 @@
+"""列指向バイナリ形式(.mftc)とJSON形式の、ファイルサイズと読み込み時間を比較する
+
+serverディレクトリで ``python -m benchmark.columnar_benchmark`` として実行する。
+現在のカタログ規模(約300件)と、その100倍の規模で計測する。
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import List
+
+from constant import Lens
+from service.columnar_service import write_columnar, ColumnarReader
+from service.synthetic_service import generate_lens_list
+
+
+def main(size_list: List[int]):
+    print('size\tjson[KB]\tmftc[KB]\tjson-load[ms]\tmftc-open+column[ms]\tjson-to-lens[ms]\tmftc-to-lens[ms]')
+    with tempfile.TemporaryDirectory() as directory:
+        for size in size_list:
+            lens_list = generate_lens_list(size)
+            json_path = os.path.join(directory, 'lens_data.json')
+            mftc_path = os.path.join(directory, 'lens_data.mftc')
+            with open(json_path, 'w') as f:
+                f.write(Lens.schema().dumps(lens_list, many=True))
+            write_columnar(lens_list, mftc_path)
+
+            # JSONは全体をパースしないと1列も読めない
+            start = time.perf_counter()
+            with open(json_path) as f:
+                data = json.load(f)
+            json_load_time = time.perf_counter() - start
+            start = time.perf_counter()
+            json_lens_list = [Lens.from_dict(x) for x in data]
+            json_lens_time = time.perf_counter() - start + json_load_time
+
+            # 列指向形式は、メモリマップして必要な列だけを参照できる
+            start = time.perf_counter()
+            reader = ColumnarReader(mftc_path)
+            weight = reader.column('weight')
+            _ = float(weight.mean())
+            mftc_load_time = time.perf_counter() - start
+            start = time.perf_counter()
+            mftc_lens_list = reader.to_lens_list()
+            mftc_lens_time = time.perf_counter() - start + mftc_load_time
+            assert mftc_lens_list == json_lens_list
+            del weight
+            reader.close()
+
+            print(f'{size}\t{os.path.getsize(json_path) / 1024:.1f}\t{os.path.getsize(mftc_path) / 1024:.1f}\t'
+                  f'{json_load_time * 1000:.2f}\t{mftc_load_time * 1000:.2f}\t'
+                  f'{json_lens_time * 1000:.2f}\t{mftc_lens_time * 1000:.2f}')
+
+
+if __name__ == '__main__':
+    main([int(x) for x in sys.argv[1:]] or [300, 30000])
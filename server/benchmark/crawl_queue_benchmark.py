@@ -0,0 +1,120 @@
+"""クロールキューを複数のワーカー(プロセス)で処理し、各URLがちょうど1回ずつ処理されるかと、かかる時間を調べる
+
+serverディレクトリで ``python -m benchmark.crawl_queue_benchmark [ワーカー数...]`` として実行する。
+手元に立てたスタブのHTTPサーバーが、合成データのレンズ1件ごとのページ(応答に PAGE_DELAY 秒かかる)を返す。
+ワーカーは ScrapingService の url_map で、架空のURLをスタブサーバーへ向けて取得する。
+途中で落ちるワーカーを1つ混ぜ、そのリースが切れたURLが他のワーカーに回ることも確かめる。
+"""
+import html
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from multiprocessing import Process
+from typing import List, Dict, Optional
+
+from constant import Lens
+from service.crawl_queue_service import CrawlQueueService, CrawlTask, run_crawl_worker, DATABASE_TIMEOUT
+from service.page_cache_service import PageCacheService
+from service.scraping_service import ScrapingService
+from service.sqlite_database_service import SqliteDataBaseService
+from service.synthetic_service import generate_lens_list
+
+LENS_COUNT = 60
+
+# スタブサーバーの応答にかける秒数(実際のサイトの応答の遅さの代わり)
+PAGE_DELAY = 0.5
+
+# 落ちたワーカーのリースが切れるまでの秒数
+LEASE_SECONDS = 5.0
+
+STUB_URL = 'https://stub.example.com'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """/lens/{番号} に、そのレンズのデータ(JSON)を埋め込んだページを返す"""
+    lens_list: List[Lens] = []
+    hit_counter: Counter = Counter()
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with self.lock:
+            self.hit_counter[self.path] += 1
+        time.sleep(PAGE_DELAY)
+        index = int(self.path.split('/')[-1])
+        body = f'<html><body><pre>{html.escape(self.lens_list[index].to_json())}</pre></body></html>'.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def run_worker(database_path: str, url_map: Dict[str, str], crash: bool) -> None:
+    """ワーカーのプロセス。crash がTrueなら、1件目を取得した直後に完了を報告せずに落ちる"""
+    database = SqliteDataBaseService(database_path, timeout=DATABASE_TIMEOUT)
+    scraping = ScrapingService(database, PageCacheService(database), url_map)
+
+    def handler(task: CrawlTask) -> Optional[Lens]:
+        lens = Lens.from_json(scraping.get_page(task.url).find('pre').text)
+        if crash:
+            os._exit(1)
+        return lens
+
+    run_crawl_worker(CrawlQueueService(database), handler, lease_seconds=LEASE_SECONDS, poll_interval=0.1)
+
+
+def run(worker_count: int, port: int) -> None:
+    StubHandler.hit_counter.clear()
+    with tempfile.TemporaryDirectory() as directory:
+        database_path = os.path.join(directory, 'database.db')
+        database = SqliteDataBaseService(database_path, timeout=DATABASE_TIMEOUT)
+        PageCacheService(database).start_crawl()
+        queue = CrawlQueueService(database)
+        queue.enqueue('stub', [(f'{STUB_URL}/lens/{i}', f'lens {i}') for i in range(LENS_COUNT)])
+
+        url_map = {STUB_URL: f'http://127.0.0.1:{port}'}
+        start = time.perf_counter()
+        process_list = [Process(target=run_worker, args=(database_path, url_map, True))]
+        process_list += [Process(target=run_worker, args=(database_path, url_map, False)) for _ in range(worker_count)]
+        for process in process_list:
+            process.start()
+        for process in process_list:
+            process.join()
+        elapsed = time.perf_counter() - start
+
+        # URLごとに結果がちょうど1件あり、元のレンズと一致するか
+        stats = queue.find_stats()
+        result = queue.load_result('stub')
+        assert stats['done'] == LENS_COUNT, stats
+        assert len(result) == LENS_COUNT
+        assert len(set([url for url, _ in result])) == LENS_COUNT
+        for url, lens in result:
+            assert lens == StubHandler.lens_list[int(url.split('/')[-1])], url
+        retried = database.select('SELECT COUNT(*) AS count FROM crawl_queue WHERE attempt > 1')[0]['count']
+        hit_list = list(StubHandler.hit_counter.values())
+        print(f'{worker_count}\t{LENS_COUNT}\t{stats["done"]}\t{retried}\t{sum(hit_list)}\t'
+              f'{len([x for x in hit_list if x > 1])}\t{elapsed * 1000:.0f}')
+
+
+def main(worker_count_list: List[int]):
+    StubHandler.lens_list = generate_lens_list(LENS_COUNT)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        # retried: リースが切れて取り出し直したURLの数、fetched twice: 2回以上取得したURLの数(落ちたワーカーの分)
+        print('workers\turls\tdone\tretried\tfetched\tfetched twice\ttime[ms]')
+        for worker_count in worker_count_list:
+            run(worker_count, server.server_address[1])
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main([int(x) for x in sys.argv[1:]] or [1, 4, 8])
@@ -0,0 +1,78 @@
+"""データベースの種類(SQLiteファイル・メモリ上のSQLite・DuckDB)ごとに、LensServiceの操作にかかる時間を比較する
+
+serverディレクトリで ``python -m benchmark.database_benchmark [件数...]`` として実行する。
+saveは1件ごとに全件を読み直すため、save件数(既定300件)は別に抑え、それ以外の操作は件数分を一括で書き込んでから計測する。
+DuckDBはduckdbパッケージがインストールされている場合のみ計測する。
+"""
+import os
+import sys
+import tempfile
+import time
+from typing import List, Callable
+
+from service.database_service_factory import create_database_service, DATABASE_BACKEND_LIST
+from service.i_database_service import IDataBaseService
+from service.lens_service import LensService
+from service.synthetic_service import generate_lens_list
+
+SAVE_SIZE = 300
+
+
+def measure(func: Callable[[], any], repeat: int = 3) -> float:
+    """複数回実行し、最短の時間(ms)を返す"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def bulk_insert(database: IDataBaseService, size: int) -> None:
+    """合成データを、1トランザクションでまとめて書き込む"""
+    lens_list = generate_lens_list(size)
+    column_list = list(lens_list[0].to_dict().keys())
+    query = f'INSERT INTO lens ({",".join(column_list)}) VALUES ({",".join(["?" for _ in column_list])})'
+    database.many_query([query for _ in lens_list],
+                        [[i + 1 if k == 'id' else v for k, v in x.to_dict().items()] for i, x in enumerate(lens_list)])
+
+
+def main(size_list: List[int]):
+    print('backend\tsize\tsave[ms/件]\tfind_all[ms]\tzoom_ratio>=5[ms]\tsearch[ms]\tmount集計[ms]')
+    with tempfile.TemporaryDirectory() as directory:
+        for backend in DATABASE_BACKEND_LIST:
+            for size in size_list:
+                path = '' if backend == 'memory' else os.path.join(directory, f'{backend}_{size}.db')
+                try:
+                    database = create_database_service(backend, path)
+                except ValueError as e:
+                    print(f'{backend}\t{e}')
+                    break
+                lens_service = LensService(database)
+
+                # 1件ずつのsave
+                lens_service.delete_all()
+                start = time.perf_counter()
+                for lens in generate_lens_list(SAVE_SIZE):
+                    lens_service.save(lens)
+                save_time = (time.perf_counter() - start) * 1000 / SAVE_SIZE
+
+                # 一括で書き込んでから、読み込み系の操作を計測する
+                lens_service.delete_all()
+                bulk_insert(database, size)
+                if lens_service.use_sqlite_feature:
+                    lens_service.rebuild_search_index()
+                find_all_time = measure(lambda: lens_service.find_all())
+                derived_time = measure(lambda: lens_service.find_by_derived_range('zoom_ratio', 5))
+                search_time = measure(lambda: lens_service.search('synthetic 25mm'))
+                aggregate_time = measure(lambda: database.select(
+                    'SELECT mount, COUNT(*) AS count, AVG(price) AS price, AVG(weight) AS weight '
+                    'FROM lens GROUP BY mount'))
+                print(f'{backend}\t{size}\t{save_time:.2f}\t{find_all_time:.1f}\t{derived_time:.1f}\t'
+                      f'{search_time:.1f}\t{aggregate_time:.2f}')
+                if hasattr(database, 'close'):
+                    database.close()
+
+
+if __name__ == '__main__':
+    main([int(x) for x in sys.argv[1:]] or [300, 30000])
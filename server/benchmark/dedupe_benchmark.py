@@ -0,0 +1,55 @@
+"""重複レンズの検出にかかる時間と、検出できた割合を計測する
+
+serverディレクトリで ``python -m benchmark.dedupe_benchmark [件数...]`` として実行する。
+合成データの1割を、別の情報源から来たかのように表記を崩して複製し、それらが元のレンズにまとめられるかを調べる。
+"""
+import random
+import sys
+import time
+from dataclasses import replace
+from typing import List
+
+from constant import Lens
+from service.dedupe_service import deduplicate
+from service.synthetic_service import generate_lens_list
+
+
+def make_variant(lens: Lens, rng: random.Random) -> Lens:
+    """表記だけが異なる、同じレンズのデータを作る"""
+    name = lens.name
+    pattern = rng.randrange(4)
+    if pattern == 0:
+        name = name.upper()
+    elif pattern == 1:
+        name = name.replace(f'{lens.maker} ', '')
+    elif pattern == 2:
+        name = name.replace(' F', ' F/')
+    else:
+        name = name.replace('SYNTHETIC', 'Synthetic').replace('mm', ' mm')
+    product_number = rng.choice(['', lens.product_number.lower().replace('-', ' ')])
+    return replace(lens, id=0, name=name, product_number=product_number, price=rng.choice([0, lens.price]))
+
+
+def main(size_list: List[int]):
+    print('size\tinput\toutput\tmerged\trecall[%]\tflagged\ttime[ms]')
+    for size in size_list:
+        rng = random.Random(0)
+        lens_list = generate_lens_list(size)
+        original_set = set([x.product_number for x in lens_list])
+        variant_list = [make_variant(x, rng) for x in rng.sample(lens_list, size // 10)]
+        input_list = lens_list + variant_list
+
+        start = time.perf_counter()
+        output, flag_list = deduplicate(input_list)
+        elapsed = time.perf_counter() - start
+
+        # 複製したレンズのうち、元のレンズにまとめられたものの割合
+        remain = len([x for x in output if x.id == 0])
+        recall = (len(variant_list) - remain) / len(variant_list) * 100 if len(variant_list) > 0 else 100.0
+        assert set([x.product_number for x in output if x.id != 0]) <= original_set
+        print(f'{size}\t{len(input_list)}\t{len(output)}\t{len(input_list) - len(output)}\t{recall:.1f}\t'
+              f'{len(flag_list)}\t{elapsed * 1000:.0f}')
+
+
+if __name__ == '__main__':
+    main([int(x) for x in sys.argv[1:]] or [300, 100000])
@@ -0,0 +1,92 @@
+"""ファセットの計数にかかる時間を、候補の値ごとに絞り込み直す素朴な方法と比べる
+
+serverディレクトリで ``python -m benchmark.facet_benchmark [件数...]`` として実行する。
+無作為な絞り込み条件ごとに、FacetService.count の結果が、Webアプリの filter と同じ条件で
+1件ずつ数えた結果と一致することも確かめる。
+"""
+import random
+import sys
+import time
+from typing import List, Dict, Callable
+
+from constant import Lens
+from service.facet_service import FacetService, Query, FACET_BUCKET_MAP, bucket_label_list, format_number
+from service.synthetic_service import generate_lens_list
+
+QUERY_COUNT = 20
+
+# Webアプリの model/query/*.ts の filter と同じ条件
+NAIVE_FILTER_MAP: Dict[str, Callable[[Lens, float], bool]] = {
+    'MaxWideFocalLength': lambda x, v: x.wide_focal_length <= v,
+    'MinTelephotoFocalLength': lambda x, v: x.telephoto_focal_length >= v,
+    'MaxWideFNumber': lambda x, v: x.wide_f_number <= v,
+    'MaxWeight': lambda x, v: x.weight <= v,
+    'MaxPrice': lambda x, v: x.price <= v,
+    'FilterDiameter': lambda x, v: x.filter_diameter == v,
+    'IsDripProof': lambda x, v: x.is_drip_proof,
+    'IsZoom': lambda x, v: x.wide_focal_length != x.telephoto_focal_length,
+    'FocalLengthRange': lambda x, v: x.telephoto_focal_length >= x.wide_focal_length * v,
+    'IsMicroFourThirds': lambda x, v: x.mount == 'マイクロフォーサーズ',
+}
+
+
+def random_query_list(rng: random.Random) -> List[Query]:
+    candidate_list: List[Query] = [
+        ('MaxWideFocalLength', rng.choice([12, 25, 50])),
+        ('MinTelephotoFocalLength', rng.choice([50, 100, 200])),
+        ('MaxWideFNumber', rng.choice([1.8, 2.8, 4])),
+        ('MaxWeight', rng.choice([300, 600, 1000])),
+        ('MaxPrice', rng.choice([100000, 200000])),
+        ('IsDripProof', 0),
+        ('IsZoom', 0),
+        ('FocalLengthRange', rng.choice([2, 3])),
+        ('IsMicroFourThirds', 0),
+    ]
+    return rng.sample(candidate_list, rng.randint(0, 3))
+
+
+def naive_count(lens_list: List[Lens], query_list: List[Query]) -> Dict[str, Dict[str, int]]:
+    """候補の値ごとに、条件に合うレンズを1件ずつ数える"""
+    filtered = [x for x in lens_list if all([NAIVE_FILTER_MAP[t](x, v) for t, v in query_list])]
+    output: Dict[str, Dict[str, int]] = {
+        'maker': {}, 'mount': {},
+        'filter_diameter': {},
+    }
+    for value in sorted(set([x.maker for x in lens_list])):
+        output['maker'][value] = len([x for x in filtered if x.maker == value])
+    for value in sorted(set([x.mount for x in lens_list])):
+        output['mount'][value] = len([x for x in filtered if x.mount == value])
+    for value in sorted(set([x.filter_diameter for x in lens_list])):
+        output['filter_diameter'][format_number(value)] = len([x for x in filtered if x.filter_diameter == value])
+    for field, edge_list in FACET_BUCKET_MAP.items():
+        temp: Dict[str, int] = {}
+        bound_list = ([float('-inf')] if edge_list[0] > 0 else []) + edge_list + [float('inf')]
+        for label, low, high in zip(bucket_label_list(edge_list), bound_list, bound_list[1:]):
+            temp[label] = len([x for x in filtered if low <= getattr(x, field) < high])
+        output[field] = temp
+    return output
+
+
+def main(size_list: List[int]):
+    print('size\tfacet[ms/query]\tnaive[ms/query]')
+    for size in size_list:
+        rng = random.Random(0)
+        lens_list = generate_lens_list(size)
+        service = FacetService(lens_list)
+        query_list_list = [random_query_list(rng) for _ in range(QUERY_COUNT)]
+
+        start = time.perf_counter()
+        result_list = [service.count(x) for x in query_list_list]
+        facet_time = (time.perf_counter() - start) / QUERY_COUNT
+
+        start = time.perf_counter()
+        naive_list = [naive_count(lens_list, x) for x in query_list_list]
+        naive_time = (time.perf_counter() - start) / QUERY_COUNT
+
+        for result, naive in zip(result_list, naive_list):
+            assert result['facet'] == naive, (result['facet'], naive)
+        print(f'{size}\t{facet_time * 1000:.2f}\t{naive_time * 1000:.2f}')
+
+
+if __name__ == '__main__':
+    main([int(x) for x in sys.argv[1:]] or [1000, 100000])
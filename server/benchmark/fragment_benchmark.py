@@ -0,0 +1,80 @@
+"""仕様の表だけを取り出すときの、ページごとのパース時間と最大メモリを、ページ全体のDOMを作る場合と比べる
+
+serverディレクトリで ``python -m benchmark.fragment_benchmark [ページの大きさ(KB)...]`` として実行する。
+ナビゲーションや本文の間に仕様の表を1つ置いた合成ページを作り、表の行のテキストを取り出すまでを計測する。
+lxmlのメモリはtracemallocでは見えないため、1回ずつ別プロセスで実行し、パースの前後の最大RSSの差を測る。
+表がページの先頭寄りにあれば、表が閉じた時点でパースを打ち切れる。
+"""
+import multiprocessing
+import resource
+import sys
+import time
+from typing import List, Tuple
+
+from requests_html import HTML
+
+from service.fragment_parser import parse_fragment
+
+ROW_COUNT = 30
+
+
+def make_page(size: int, position: str) -> str:
+    """約 size KB の合成ページ(position が top なら表は先頭寄り、bottom なら末尾寄り)"""
+    table = '<section class="tech-specs"><table>' + ''.join([
+        f'<tr><td>項目{i}</td><td>{i * 1.5}mm</td></tr>' for i in range(ROW_COUNT)
+    ]) + '</table></section>'
+    block = ('<div class="nav"><ul>' + ''.join([f'<li><a href="/p/{i}">リンク{i}</a></li>' for i in range(20)]) +
+             '</ul></div><div class="body"><p>' + 'レンズの紹介文です。' * 40 + '</p></div>')
+    filler = block * max(1, size * 1024 // len(block.encode('utf-8')))
+    if position == 'top':
+        body = block + table + filler
+    else:
+        body = filler + table + block
+    return f'<html><head><title>lens</title></head><body>{body}</body></html>'
+
+
+def extract_row_list(text: str, mode: str) -> List[Tuple[str, str]]:
+    if mode == 'full':
+        section = HTML(html=text).find('section.tech-specs', first=True)
+    else:
+        section = HTML(html=parse_fragment(text, 'section.tech-specs'))
+    output: List[Tuple[str, str]] = []
+    for tr_element in section.find('tr'):
+        td_elements = tr_element.find('td')
+        output.append((td_elements[0].text, td_elements[1].text))
+    return output
+
+
+def run_child(size: int, position: str, mode: str, queue: multiprocessing.Queue) -> None:
+    text = make_page(size, position)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    row_list = extract_row_list(text, mode)
+    elapsed = time.perf_counter() - start
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((elapsed, (after - before) / 1024, row_list))
+
+
+def measure(size: int, position: str, mode: str) -> Tuple[float, float, List[Tuple[str, str]]]:
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=run_child, args=(size, position, mode, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main(size_list: List[int]):
+    print('size[KB]\tposition\tfull[ms]\tfragment[ms]\tfull peak[MB]\tfragment peak[MB]')
+    for size in size_list:
+        for position in ['top', 'bottom']:
+            full_time, full_peak, full_row_list = measure(size, position, 'full')
+            fragment_time, fragment_peak, fragment_row_list = measure(size, position, 'fragment')
+            assert full_row_list == fragment_row_list and len(full_row_list) == ROW_COUNT
+            print(f'{size}\t{position}\t{full_time * 1000:.1f}\t{fragment_time * 1000:.1f}\t'
+                  f'{full_peak:.1f}\t{fragment_peak:.1f}')
+
+
+if __name__ == '__main__':
+    main([int(x) for x in sys.argv[1:]] or [100, 1000, 5000])
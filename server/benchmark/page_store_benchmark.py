@@ -0,0 +1,110 @@
+"""同じ本文を共有するページキャッシュで、保存するサイズと取得回数がどれだけ減るかを計測する
+
+serverディレクトリで ``python -m benchmark.page_store_benchmark [ページ数...]`` として実行する。
+手元のスタブサーバーに、同じ本文を返すURL(spec.html と index.html、クエリ文字列だけが違うURL)を置き、
+#以降だけが違うURLも混ぜて ScrapingService.get_text で取得する。
+取得回数・保存したサイズを、URLごとに本文を持つ場合(本文を共有せず、#以降も区別する)と比べる。
+古い形式のpage_cacheテーブルからの移行にかかる時間と、移行後に同じ本文を引けることも確かめる。
+"""
+import os
+import sys
+import tempfile
+import time
+from typing import List
+
+from service.page_cache_service import PageCacheService, canonicalize_url
+from service.scraping_service import ScrapingService
+from service.sqlite_database_service import SqliteDataBaseService
+from service.synthetic_site_service import SyntheticSiteServer, PageMap, make_page
+
+SIGMA_LIST_URL = 'https://www.sigma-global.com/jp/lenses/'
+
+
+def make_site(size: int) -> PageMap:
+    """同じ本文を返すURLを含むページ"""
+    output: PageMap = {}
+    for i in range(size):
+        text = make_page(f'M.ZUIKO {i}', f'<table><tr><th>質量</th><td>{100 + i}g</td></tr></table>', 20000)
+        output[f'https://www.olympus-imaging.jp/product/dslr/mlens/{i}/spec.html'] = text
+        output[f'https://www.olympus-imaging.jp/product/dslr/mlens/{i}/index.html'] = text
+        text = make_page(f'SIGMA {i}', f'<dl><dt>質量</dt><dd>{200 + i}g</dd></dl>', 20000)
+        output[f'https://www.sigma-global.com/jp/lenses/{i}/'] = text
+        output[f'https://www.sigma-global.com/jp/lenses/{i}/?from=list'] = text
+    output[SIGMA_LIST_URL] = make_page('SIGMA', '<ul class="lens-list"></ul>', 20000)
+    return output
+
+
+def make_request_list(page_map: PageMap) -> List[str]:
+    """取得するURL(#以降だけが違うURLを含む)"""
+    output = [SIGMA_LIST_URL + '#/all/micro-four-thirds/', SIGMA_LIST_URL + '#/all/l-mount/']
+    for url in page_map.keys():
+        output.append(url)
+        if url.endswith('spec.html'):
+            output.append(url + '#spec')
+    return output
+
+
+def main(size_list: List[int]):
+    print('size\trequests\tfetches\tpage_url\tpage_body\tper URL[KB]\tshared[KB]\tfetch[ms]\tcached[ms]\t'
+          'migrate[ms]')
+    for size in size_list:
+        page_map = make_site(size)
+        request_list = make_request_list(page_map)
+        with tempfile.TemporaryDirectory() as directory, SyntheticSiteServer(page_map) as server:
+            database = SqliteDataBaseService(os.path.join(directory, 'database.db'))
+            cache = PageCacheService(database)
+            scraping = ScrapingService(database, cache, server.url_map)
+            with open(os.devnull, 'w') as devnull:
+                stdout, sys.stdout = sys.stdout, devnull
+                try:
+                    start = time.perf_counter()
+                    for url in request_list:
+                        scraping.get_text(url)
+                    fetch_time = time.perf_counter() - start
+                    start = time.perf_counter()
+                    for url in request_list:
+                        assert scraping.get_text(url) == page_map[canonicalize_url(url)], url
+                    cached_time = time.perf_counter() - start
+                finally:
+                    sys.stdout = stdout
+            # #以降だけが違うURLは、1度しか取得しない
+            assert all([x == 1 for x in server.hit_counter.values()]), 'ページを取得し直しています.'
+            assert sum(server.hit_counter.values()) == len(page_map)
+            url_count = database.select('SELECT COUNT(*) AS count FROM page_url')[0]['count']
+            body_count = database.select('SELECT COUNT(*) AS count FROM page_body')[0]['count']
+            # URLごとに本文を持つ場合は、#以降も区別したURLごとに本文を保存する
+            per_url_size = sum([len(page_map[canonicalize_url(x)].encode('utf-8')) for x in set(request_list)])
+
+            # 古い形式のテーブルから移しても、同じ本文を引けること
+            old_database = SqliteDataBaseService(os.path.join(directory, 'old.db'))
+            old_database.query('CREATE TABLE page_cache (url TEXT PRIMARY KEY, text TEXT)')
+            old_database.bulk_query(['INSERT INTO page_cache (url, text) VALUES (?, ?)'],
+                                    [[(x, page_map[canonicalize_url(x)]) for x in set(request_list)]])
+            start = time.perf_counter()
+            old_cache = PageCacheService(old_database)
+            migrate_time = time.perf_counter() - start
+            for url in request_list:
+                assert old_cache.get(url) == page_map[canonicalize_url(url)], url
+            assert old_cache.get_total_size() == cache.get_total_size()
+        print(f'{size}\t{len(request_list)}\t{len(page_map)}\t{url_count}\t{body_count}\t'
+              f'{per_url_size / 1024:.0f}\t{cache.get_total_size() / 1024:.0f}\t{fetch_time * 1000:.0f}\t'
+              f'{cached_time * 1000:.0f}\t{migrate_time * 1000:.0f}')
+
+
+def check_eviction() -> None:
+    """容量の上限を超えたら、どのURLからも参照されなくなった本文まで削除されること"""
+    with tempfile.TemporaryDirectory() as directory:
+        cache = PageCacheService(SqliteDataBaseService(os.path.join(directory, 'database.db')), 100000)
+        for i in range(20):
+            text = make_page(str(i), '', 20000)
+            cache.put(f'https://example.com/{i}/spec.html', text)
+            cache.put(f'https://example.com/{i}/index.html', text)
+        assert cache.get_total_size() <= cache.max_size
+        ref_count = cache.database.select('SELECT SUM(ref_count) AS count FROM page_body')[0]['count']
+        url_count = cache.database.select('SELECT COUNT(*) AS count FROM page_url')[0]['count']
+        assert ref_count == url_count, (ref_count, url_count)
+
+
+if __name__ == '__main__':
+    check_eviction()
+    main([int(x) for x in sys.argv[1:]] or [10, 50])
@@ -0,0 +1,106 @@
+"""カタログ全体の検査にかかる時間と、わざと壊した値を見つけられるかを計測する
+
+serverディレクトリで ``python -m benchmark.quality_benchmark [件数...]`` として実行する。
+架空のレンズデータを前回のビルドとして列指向バイナリ形式で書き出し、その一部の値を壊したものを今回のビルドとして検査する。
+壊し方ごとに、誤り(隔離)または注意として見つかった割合を表示する。
+"""
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import List, Dict, Tuple, Callable
+
+from constant import Lens
+from service.columnar_service import write_columnar
+from service.quality_service import check_quality, load_previous_column, to_column
+from service.synthetic_service import generate_lens_list
+
+# 壊し方ごとに壊すレンズ数
+FAULT_COUNT = 50
+
+
+def swap_focal_length(lens: Lens) -> None:
+    lens.wide_focal_length, lens.telephoto_focal_length = lens.telephoto_focal_length + 10, lens.wide_focal_length
+
+
+def swap_f_number(lens: Lens) -> None:
+    lens.wide_f_number, lens.telephoto_f_number = lens.telephoto_f_number + 1, lens.wide_f_number
+
+
+# (壊し方の名前, 値の壊し方, 隔離されるべきか)
+FAULT_LIST: List[Tuple[str, Callable[[Lens], None], bool]] = [
+    ('weight x1000', lambda x: setattr(x, 'weight', x.weight * 1000), True),
+    ('weight /1000', lambda x: setattr(x, 'weight', x.weight / 1000), True),
+    ('price 0', lambda x: setattr(x, 'price', 0), False),
+    ('price x10', lambda x: setattr(x, 'price', x.price * 10), False),
+    ('filter -1', lambda x: setattr(x, 'filter_diameter', -1), False),
+    ('magnification 0', lambda x: setattr(x, 'max_photographing_magnification', 0.0), True),
+    ('focal swapped', swap_focal_length, True),
+    ('f-number swapped', swap_f_number, True),
+    ('length NaN', lambda x: setattr(x, 'overall_length', math.nan), True),
+    ('length x3', lambda x: setattr(x, 'overall_length', x.overall_length * 3), False),
+    ('empty mount', lambda x: setattr(x, 'mount', ''), True),
+]
+
+
+def inject_fault(lens_list: List[Lens], rng: random.Random) -> Dict[str, Tuple[List[int], bool]]:
+    """レンズ一覧の値を壊し、壊し方ごとの(壊した位置, 隔離されるべきか)を返す"""
+    output: Dict[str, Tuple[List[int], bool]] = {}
+    # 価格が不明・フィルターが付かないレンズは、壊しても分からない場合があるので選ばない
+    candidate_list = [i for i, x in enumerate(lens_list) if x.price > 0 and x.filter_diameter > 0]
+    position_list = rng.sample(candidate_list, FAULT_COUNT * len(FAULT_LIST))
+    for i, (name, fault, is_error) in enumerate(FAULT_LIST):
+        temp = position_list[i * FAULT_COUNT:(i + 1) * FAULT_COUNT]
+        for position in temp:
+            fault(lens_list[position])
+        output[name] = (temp, is_error)
+    return output
+
+
+def main(size_list: List[int]):
+    print('size\tload previous[ms]\tto column[ms]\tcheck(incl. to column)[ms]\tquarantined\twarned')
+    detection_list: List[Dict[str, float]] = []
+    for size in size_list:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'lens_data.mftc')
+            write_columnar(generate_lens_list(size), path)
+            lens_list = generate_lens_list(size)
+
+            # 壊す前の誤りは無いこと
+            clean_report = check_quality(lens_list, load_previous_column(path))
+            assert not clean_report.error_mask.any() and len(clean_report.fatal_list) == 0, \
+                clean_report.quarantine_list[0:5]
+            clean_warning_mask = clean_report.warning_mask
+
+            fault_map = inject_fault(lens_list, random.Random(0))
+            start = time.perf_counter()
+            previous = load_previous_column(path)
+            load_time = time.perf_counter() - start
+            start = time.perf_counter()
+            to_column(lens_list)
+            column_time = time.perf_counter() - start
+            start = time.perf_counter()
+            report = check_quality(lens_list, previous)
+            check_time = time.perf_counter() - start
+            print(f'{size}\t{load_time * 1000:.1f}\t{column_time * 1000:.1f}\t{check_time * 1000:.1f}\t'
+                  f'{int(report.error_mask.sum())}\t{int(report.warning_mask.sum())}')
+
+            detection: Dict[str, float] = {}
+            for name, (position_list, is_error) in fault_map.items():
+                mask = report.error_mask if is_error else report.warning_mask & ~report.error_mask
+                if not is_error:
+                    # 壊す前から注意が付いていたレンズは数えない
+                    position_list = [x for x in position_list if not clean_warning_mask[x]]
+                detection[name] = sum([bool(mask[x]) for x in position_list]) / max(len(position_list), 1)
+            detection_list.append(detection)
+
+    print('fault\texpected\t' + '\t'.join([str(x) for x in size_list]))
+    for name, _, is_error in FAULT_LIST:
+        print(f'{name}\t{"quarantine" if is_error else "warning"}\t' +
+              '\t'.join([f'{x[name] * 100:.0f}%' for x in detection_list]))
+
+
+if __name__ == '__main__':
+    main([int(x) for x in sys.argv[1:]] or [1000, 100000])
@@ -0,0 +1,140 @@
+"""共有URLのクエリの正規化と、事前に計算した結果の引き当てにかかる時間を、毎回絞り込む場合と比べる
+
+serverディレクトリで ``python -m benchmark.query_cache_benchmark [件数...]`` として実行する。
+同じ絞り込みを、並び順・名前の大文字小文字・値の表記を変えたクエリ文字列で表し、どれも同じ文字列に
+正規化されることと、正規化したクエリでの絞り込みが元の条件と一致することを確かめる。
+検索回数に偏りのある(Zipf分布の)アクセスを2回流し、1回目は事前定義したクエリだけ、
+2回目は1回目の検索回数(アクセスログとして書き出し、record_log で読み込んだもの)から選んだクエリも
+計算した結果で、ヒット率を比べる。
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import List
+
+from service.export_service import export_query_cache
+from service.facet_service import FacetService, Query
+from service.query_cache_service import QueryCacheService, canonicalize_query, find_query_cache_key_list, \
+    parse_query_string, to_query_string, BOOLEAN_QUERY_TYPE_LIST, QUERY_TYPE_LIST
+from service.sqlite_database_service import SqliteDataBaseService
+from service.synthetic_service import generate_lens_list
+
+# 絞り込みの種類の数と、アクセス数
+QUERY_COUNT = 300
+ACCESS_COUNT = 5000
+
+# 結果を事前に計算しておく、検索回数の多いクエリの数
+POPULAR_COUNT = 50
+
+
+def random_query_list(rng: random.Random) -> List[Query]:
+    candidate_list: List[Query] = [
+        ('MaxWideFocalLength', rng.choice([12, 25, 50])),
+        ('MinTelephotoFocalLength', rng.choice([50, 100, 200])),
+        ('MaxWideFNumber', rng.choice([1.4, 1.8, 2.8, 4])),
+        ('MaxWideMinFocusDistance', rng.choice([150, 200, 300])),
+        ('MaxWeight', rng.choice([300, 600, 1000])),
+        ('MaxPrice', rng.choice([100000, 200000])),
+        ('FilterDiameter', rng.choice([46, 58, 62])),
+        ('IsDripProof', 0),
+        ('IsPrime', 0),
+        ('IsZoom', 0),
+        ('FocalLengthRange', rng.choice([2, 3])),
+        ('IsMicroFourThirds', 0),
+        ('IsLeicaL', 0),
+    ]
+    output = rng.sample(candidate_list, rng.randint(1, 4))
+    return sorted(output, key=lambda x: QUERY_TYPE_LIST.index(x[0]))
+
+
+def random_variant(query_list: List[Query], rng: random.Random) -> str:
+    """同じ絞り込みになる、表記の違うクエリ文字列"""
+    param_list: List[List[str]] = []
+    for query_type, value in query_list:
+        name = query_type.lower() if rng.random() < 0.5 else query_type
+        if query_type in BOOLEAN_QUERY_TYPE_LIST:
+            text = str(rng.randint(0, 9))
+        else:
+            text = rng.choice([f'{value}', f'{float(value):.2f}', f'{value}e0', f'+{value}mm', f'%20{value}'])
+        # 同じ名前は先に現れたものが使われるので、後ろに違う値を足しても変わらない
+        param_list.append([f'{name}={text}'] + ([f'{name}=-1'] if rng.random() < 0.2 else []))
+    if rng.random() < 0.3:
+        param_list.append(['utm_source=share'])
+    rng.shuffle(param_list)
+    return '?' + '&'.join(['&'.join(x) for x in param_list])
+
+
+def main(size_list: List[int]):
+    print('size\tcanonicalize[us]\tfilter[ms/query]\tlookup[us/query]\tcached queries\tfile[KB]\t'
+          'hit rate(preset)\thit rate(popular)')
+    for size in size_list:
+        rng = random.Random(0)
+        lens_list = generate_lens_list(size)
+        facet = FacetService(lens_list)
+        query_list_list: List[List[Query]] = []
+        for _ in range(QUERY_COUNT):
+            query_list = random_query_list(rng)
+            if query_list not in query_list_list:
+                query_list_list.append(query_list)
+
+        # 表記を変えても同じ文字列に正規化され、同じ絞り込みになること
+        variant_list: List[str] = []
+        for query_list in query_list_list:
+            key = canonicalize_query(to_query_string(query_list))
+            for _ in range(5):
+                variant = random_variant(query_list, rng)
+                assert canonicalize_query(variant) == key, (variant, key)
+                variant_list.append(variant)
+            assert facet.filter_bitset(parse_query_string(key)) == facet.filter_bitset(query_list), key
+        start = time.perf_counter()
+        for variant in variant_list:
+            canonicalize_query(variant)
+        canonicalize_time = (time.perf_counter() - start) / len(variant_list)
+
+        # 検索回数に偏りのあるアクセス(表記はばらばら)
+        weight_list = [1 / (i + 1) for i in range(len(query_list_list))]
+        access_list = [random_variant(x, rng)
+                       for x in rng.choices(query_list_list, weights=weight_list, k=ACCESS_COUNT)]
+
+        with tempfile.TemporaryDirectory() as directory:
+            database = SqliteDataBaseService(os.path.join(directory, 'database.db'))
+            path = os.path.join(directory, 'query_cache.json')
+            # Webサーバーのアクセスログ(静的ファイルへのリクエストも混ざる)
+            log_path = os.path.join(directory, 'access.log')
+            with open(log_path, 'w') as f:
+                for access in access_list:
+                    f.write(f'127.0.0.1 - - [19/Oct/2026:00:00:00 +0000] "GET /{access} HTTP/1.1" 200 512 "-" "-"\n'
+                            '127.0.0.1 - - [19/Oct/2026:00:00:00 +0000] "GET /static/js/main.js?v=1 HTTP/1.1" '
+                            '200 512 "-" "-"\n')
+            hit_rate_list: List[float] = []
+            for popular_count in [0, POPULAR_COUNT]:
+                popular_key_list = QueryCacheService(database).find_popular_key_list(popular_count)
+                export_query_cache(lens_list, find_query_cache_key_list(popular_key_list), path)
+                query_cache = QueryCacheService(database, path)
+                query_cache.load()
+                hit = 0
+                lookup_time = filter_time = 0.0
+                for access in access_list:
+                    start = time.perf_counter()
+                    id_list = query_cache.get(access)
+                    lookup_time += time.perf_counter() - start
+                    start = time.perf_counter()
+                    expected = sorted([x.id for x in facet.filter(parse_query_string(access))])
+                    filter_time += time.perf_counter() - start
+                    if id_list is not None:
+                        assert id_list == expected, access
+                        hit += 1
+                hit_rate_list.append(hit / len(access_list))
+                # 検索回数は、アクセスログから数える
+                assert QueryCacheService(database, path).record_log(log_path) == len(access_list)
+            cached_count = len(QueryCacheService(database, path).load())
+            file_size = os.path.getsize(path)
+        print(f'{size}\t{canonicalize_time * 1000000:.1f}\t{filter_time / len(access_list) * 1000:.2f}\t'
+              f'{lookup_time / len(access_list) * 1000000:.1f}\t{cached_count}\t{file_size / 1024:.1f}\t'
+              f'{hit_rate_list[0] * 100:.1f}%\t{hit_rate_list[1] * 100:.1f}%')
+
+
+if __name__ == '__main__':
+    main([int(x) for x in sys.argv[1:]] or [1000, 10000])
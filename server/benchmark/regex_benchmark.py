@@ -0,0 +1,86 @@
+"""項目の抽出に使う正規表現の、壊れた入力に対する最悪時の速さを、re(バックトラック型)と比べる
+
+serverディレクトリで ``python -m benchmark.regex_benchmark [文字数...]`` として実行する。
+まず、scraping_service.py で使っている全パターンについて、無作為な短い文字列で re と結果が一致することを確かめる。
+次に、数字の長い連続などバックトラックが爆発する入力で、文字数ごとの時間を計測する
+(re は、前の文字数で RE_TIME_LIMIT 秒を超えたら以降は計測しない)。
+最後に、ulitity.regex が予算(REGEX_TIME_BUDGET)の時間で打ち切ることを確かめる。
+"""
+import os
+import random
+import re
+import sys
+import time
+from typing import List, Optional, Callable
+
+from service.linear_regex import find_group_list
+from service.ulitity import regex, REGEX_TIME_BUDGET
+
+FUZZ_COUNT = 500
+
+RE_TIME_LIMIT = 1.0
+
+# 無作為な文字列に使う部品
+FUZZ_ALPHABET = list('0123456789.,:：mcg円倍-–～∞ /FfSL×φ換算相当\n') + ['mm', 'cm', ' m', 'to infinity', 'm～∞', 'm-∞']
+
+# (パターン, 文字数から壊れた入力を作る関数)
+ADVERSARIAL_LIST: List[tuple] = [
+    (r'(\d+\.?\d*)m-∞.*(\d+\.?\d*)m～∞', lambda n: '1m-∞' + '1' * n),
+    (r'(\d+\.\d+) *m.*(\d+\.\d+) *m', lambda n: '0.1m' + '1.1' * (n // 3)),
+    (r'(\d+\.?\d*)mm[^\d]*(\d+\.?\d*)mm', lambda n: '1' * n),
+    (r'(\d+\.?\d*).*-.*(\d+\.?\d*).*cm', lambda n: '1-' * (n // 2)),
+    (r'(\d+\.?\d*)[:：](\d+\.?\d*).*-.*(\d+\.?\d*)[:：](\d+\.?\d*)', lambda n: '1:1-' * (n // 4)),
+]
+
+
+def load_pattern_list() -> List[str]:
+    """scraping_service.py で regex に渡しているパターンの一覧"""
+    path = os.path.join(os.path.dirname(__file__), '..', 'service', 'scraping_service.py')
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    return sorted(set(re.findall(r"regex\([^\n]*?, r'([^']*)'", text)))
+
+
+def measure(func: Callable[[], any]) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def check_equivalence(pattern_list: List[str]) -> None:
+    rng = random.Random(0)
+    for pattern in pattern_list:
+        for _ in range(FUZZ_COUNT):
+            text = ''.join([rng.choice(FUZZ_ALPHABET) for _ in range(rng.randint(0, 30))])
+            expected = [x for m in re.finditer(pattern, text, re.MULTILINE) for x in m.groups()]
+            assert find_group_list(text, pattern) == expected, (pattern, text)
+    print(f'{len(pattern_list)} patterns x {FUZZ_COUNT} random inputs: same results as re')
+
+
+def main(size_list: List[int]):
+    check_equivalence(load_pattern_list())
+
+    print('pattern\tsize\tre[ms]\tlinear[ms]\tlinear[Mchar/s]')
+    for pattern, make_text in ADVERSARIAL_LIST:
+        re_time: Optional[float] = 0.0
+        for size in size_list:
+            text = make_text(size)
+            if re_time is not None and re_time < RE_TIME_LIMIT:
+                re_time = measure(lambda: [m.groups() for m in re.finditer(pattern, text, re.MULTILINE)])
+                re_text = f'{re_time * 1000:.1f}'
+            else:
+                re_time = None
+                re_text = '-'
+            linear_time = measure(lambda: find_group_list(text, pattern))
+            print(f'{pattern}\t{len(text)}\t{re_text}\t{linear_time * 1000:.1f}\t'
+                  f'{len(text) / linear_time / 1000000:.2f}')
+
+    # 予算で打ち切られるか
+    pattern, make_text = ADVERSARIAL_LIST[0]
+    text = make_text(size_list[-1] * 10)
+    elapsed = measure(lambda: regex(text, pattern))
+    print(f'regex() with budget {REGEX_TIME_BUDGET * 1000:.0f}ms on {len(text)} chars: {elapsed * 1000:.1f}ms')
+
+
+if __name__ == '__main__':
+    main([int(x) for x in sys.argv[1:]] or [250, 500, 1000, 2000, 4000])
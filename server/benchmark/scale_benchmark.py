@@ -0,0 +1,72 @@
+"""実データ(数百件)を大きく超える件数で、データベースへの書き込みから書き出しまでの各段階の時間を計測する
+
+serverディレクトリで ``python -m benchmark.scale_benchmark [件数...]`` として実行する(100万件なども指定できる)。
+架空のレンズデータを iter_synthetic_lens で少しずつ生成しながら bulk_load で書き込み、
+1件ずつの save(1件ごとに全件を読み直す)、find_all、JSON・列指向バイナリ形式での書き出しを計測する。
+最大メモリを件数ごとに測るため、件数ごとに別プロセスで実行する。
+"""
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from dataclasses import replace
+from typing import List, Dict
+
+from service.export_service import export_lens_data, export_columnar_lens_data
+from service.lens_service import LensService
+from service.sqlite_database_service import SqliteDataBaseService
+from service.synthetic_service import iter_synthetic_lens, generate_lens_list
+
+# 1件ずつ save する件数
+SAVE_COUNT = 3
+
+
+def run_child(size: int, queue: multiprocessing.Queue) -> None:
+    result: Dict[str, float] = {}
+    with tempfile.TemporaryDirectory() as directory:
+        lens_service = LensService(SqliteDataBaseService(os.path.join(directory, 'database.db')))
+
+        start = time.perf_counter()
+        count = lens_service.bulk_load(lambda: iter_synthetic_lens(size))
+        result['bulk_load'] = time.perf_counter() - start
+        assert count == size
+
+        start = time.perf_counter()
+        for lens in generate_lens_list(SAVE_COUNT, seed=1):
+            lens_service.save(replace(lens, id=0))
+        result['save'] = (time.perf_counter() - start) / SAVE_COUNT
+
+        start = time.perf_counter()
+        lens_list = lens_service.find_all()
+        result['find_all'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        export_lens_data(lens_list, os.path.join(directory, 'lens_data.json'))
+        result['export_json'] = time.perf_counter() - start
+        result['json_size'] = os.path.getsize(os.path.join(directory, 'lens_data.json'))
+
+        start = time.perf_counter()
+        export_columnar_lens_data(lens_list, os.path.join(directory, 'lens_data.mftc'))
+        result['export_columnar'] = time.perf_counter() - start
+    result['peak'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    queue.put(result)
+
+
+def main(size_list: List[int]):
+    print('size\tbulk_load[s]\tsave[ms/件]\tfind_all[s]\texport json[s]\tjson[MB]\texport mftc[s]\tpeak[MB]')
+    context = multiprocessing.get_context('spawn')
+    for size in size_list:
+        queue = context.Queue()
+        process = context.Process(target=run_child, args=(size, queue))
+        process.start()
+        result = queue.get()
+        process.join()
+        print(f'{size}\t{result["bulk_load"]:.2f}\t{result["save"] * 1000:.1f}\t{result["find_all"]:.2f}\t'
+              f'{result["export_json"]:.2f}\t{result["json_size"] / 1024 / 1024:.1f}\t'
+              f'{result["export_columnar"]:.2f}\t{result["peak"]:.0f}')
+
+
+if __name__ == '__main__':
+    main([int(x) for x in sys.argv[1:]] or [10000, 100000])
@@ -0,0 +1,63 @@
+"""類似レンズ検索の性能を、全件との距離計算(総当たり)と比較する
+
+serverディレクトリで ``python -m benchmark.similarity_benchmark`` として実行する。
+索引を作った後に保存し直したレンズが、検索結果から消えないことも確かめる。
+"""
+import sys
+import time
+from dataclasses import replace
+from typing import List
+
+import numpy
+
+from constant import Lens
+from service.similarity_service import SimilarityService
+from service.synthetic_service import generate_lens_list
+
+QUERY_COUNT = 200
+K = 10
+
+
+def check_update(service: SimilarityService, lens: Lens) -> None:
+    """最も近いレンズを保存し直しても、そのレンズが(新しい値で)見つかること"""
+    nearest, _ = service.find_similar(lens, 1)[0]
+    updated = replace(nearest, name=nearest.name + ' II')
+    service.on_save(updated)
+    result = service.find_similar(lens, K)
+    assert result[0][0] is updated, (nearest.id, [x[0].id for x in result])
+    assert len(set([x[0].id for x in result])) == len(result), '同じレンズが重複しています.'
+
+
+def main(size_list: List[int]):
+    print('size\tbuild[s]\tkd-tree[ms/query]\tbrute-force[ms/query]\tsame-result')
+    for size in size_list:
+        lens_list = generate_lens_list(size)
+        start = time.perf_counter()
+        service = SimilarityService(lens_list)
+        build_time = time.perf_counter() - start
+
+        # 総当たり用に、正規化済みのベクトルを並べておく
+        vectors = service.normalize(service.to_raw_matrix(lens_list))
+        ids = numpy.array([x.id for x in lens_list])
+        query_list = [lens_list[x] for x in numpy.random.default_rng(1).integers(0, size, QUERY_COUNT)]
+
+        start = time.perf_counter()
+        kd_result = [[x[0].id for x in service.find_similar(lens, K)] for lens in query_list]
+        kd_time = (time.perf_counter() - start) / QUERY_COUNT
+
+        start = time.perf_counter()
+        brute_result = []
+        for lens in query_list:
+            distance = ((vectors - service.to_vector(lens)) ** 2).sum(axis=1)
+            distance[ids == lens.id] = numpy.inf
+            top = numpy.argpartition(distance, K)[0:K]
+            brute_result.append(ids[top[numpy.argsort(distance[top])]].tolist())
+        brute_time = (time.perf_counter() - start) / QUERY_COUNT
+
+        same = sum([a == b for a, b in zip(kd_result, brute_result)])
+        check_update(service, query_list[0])
+        print(f'{size}\t{build_time:.2f}\t{kd_time * 1000:.3f}\t{brute_time * 1000:.3f}\t{same}/{QUERY_COUNT}')
+
+
+if __name__ == '__main__':
+    main([int(x) for x in sys.argv[1:]] or [1000, 10000, 100000, 1000000])
@@ -0,0 +1,70 @@
+"""メーカーのページを模した合成ページを手元のスタブサーバーから配り、スクレイピングの時間を計測する
+
+serverディレクトリで ``python -m benchmark.synthetic_site_benchmark [メーカーごとのレンズ数...]`` として実行する。
+架空のレンズデータから、パナソニックの比較ページとライカの一覧・個別ページを作り、
+get_p_lens_list・get_l_l_lens_list で読み取った結果が、ページに載せたレンズと一致することを確かめる。
+1回目はスタブサーバーから取得し、2回目はページキャッシュから読む。
+"""
+import os
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from typing import List, Callable
+
+from constant import Lens
+from service.page_cache_service import PageCacheService
+from service.scraping_service import ScrapingService, get_p_lens_list, get_l_l_lens_list
+from service.sqlite_database_service import SqliteDataBaseService
+from service.synthetic_service import generate_lens_list
+from service.synthetic_site_service import SyntheticSiteServer, make_panasonic_site, make_leica_site
+
+
+def assert_same(actual_list: List[Lens], expected_list: List[Lens]) -> None:
+    assert len(actual_list) == len(expected_list), (len(actual_list), len(expected_list))
+    for actual, expected in zip(actual_list, expected_list):
+        actual_dict, expected_dict = asdict(actual), asdict(expected)
+        for key, value in expected_dict.items():
+            if isinstance(value, float):
+                assert abs(actual_dict[key] - value) < 1e-6, (key, actual, expected)
+            else:
+                assert actual_dict[key] == value, (key, actual, expected)
+
+
+def main(size_list: List[int]):
+    print('maker\tsize\tpages\tsize[KB]\tfetch[ms]\tcached[ms]')
+    for size in size_list:
+        lens_list = generate_lens_list(size * 2, seed=size)
+        panasonic_page_map, panasonic_lens_list = make_panasonic_site(lens_list[0:size])
+        leica_page_map, leica_lens_list = make_leica_site(lens_list[size:])
+        case_list: List[tuple] = [
+            ('Panasonic', panasonic_page_map, panasonic_lens_list, get_p_lens_list),
+            ('LEICA', leica_page_map, leica_lens_list, get_l_l_lens_list),
+        ]
+        for maker, page_map, expected_list, get_lens_list in case_list:
+            get_lens_list: Callable[[ScrapingService], List[Lens]]
+            with tempfile.TemporaryDirectory() as directory, SyntheticSiteServer(page_map) as server:
+                database = SqliteDataBaseService(os.path.join(directory, 'database.db'))
+                scraping = ScrapingService(database, PageCacheService(database), server.url_map)
+                # 取得したURLの表示は、件数が多いと計測の邪魔になるので捨てる
+                with open(os.devnull, 'w') as devnull:
+                    stdout, sys.stdout = sys.stdout, devnull
+                    try:
+                        start = time.perf_counter()
+                        actual_list = get_lens_list(scraping)
+                        fetch_time = time.perf_counter() - start
+                        start = time.perf_counter()
+                        cached_list = get_lens_list(scraping)
+                        cached_time = time.perf_counter() - start
+                    finally:
+                        sys.stdout = stdout
+                assert_same(actual_list, expected_list)
+                assert_same(cached_list, expected_list)
+                assert all([x == 1 for x in server.hit_counter.values()]), 'キャッシュ済みのページを取得し直しています.'
+                page_size = sum([len(x.encode('utf-8')) for x in page_map.values()])
+                print(f'{maker}\t{size}\t{len(page_map)}\t{page_size / 1024:.0f}\t{fetch_time * 1000:.0f}\t'
+                      f'{cached_time * 1000:.0f}')
+
+
+if __name__ == '__main__':
+    main([int(x) for x in sys.argv[1:]] or [10, 100])
@@ -1,66 +1,317 @@
-from constant import DATABASE_PATH
+from argparse import ArgumentParser
+from itertools import chain
+from multiprocessing import Process
+from typing import List, Tuple, Callable, Set, Iterator, Optional, Dict
+
+from constant import DATABASE_PATH, Lens
+from service.build_journal_service import BuildJournalService
+from service.crawl_queue_service import CrawlQueueService, CrawlTask, run_crawl_worker, DATABASE_TIMEOUT
+from service.csv_ingest_service import find_csv_path_list, validate_csv, iter_csv_lens
+from service.dedupe_service import deduplicate, write_flag_list, FLAG_PRINT_COUNT, POSSIBLE_DUPLICATE_PATH
+from service.export_service import export_lens_data, export_skyline_data, export_sharded_lens_data, \
+    export_columnar_lens_data, export_catalogue_version, export_facet_data, export_query_cache
+from service.history_service import HistoryService
 from service.i_database_service import IDataBaseService
-from service.lens_service import Lens, LensService
-from service.scraping_service import ScrapingService, get_p_lens_list, get_o_lens_list, get_s_lens_list, \
-    get_other_lens_list, get_p_l_lens_list, get_s_l_lens_list, get_l_l_lens_list
+from service.lens_service import LensService
+from service.lens_writer_service import LensWriter
+from service.page_cache_service import PageCacheService, PAGE_CACHE_MAX_SIZE
+from service.profile_service import ProfileService
+from service.quality_service import QualityService, check_quality, load_previous_column, MAX_QUARANTINE_RATIO
+from service.query_cache_service import QueryCacheService, find_query_cache_key_list
+from service.scraping_service import ScrapingService, iter_p_lens, iter_o_lens, iter_s_lens, iter_other_lens, \
+    iter_p_l_lens, iter_s_l_lens, iter_l_l_lens, get_l_l_lens_list, LENS_PAGE_SCRAPER_MAP
+from service.shadow_database_service import ShadowDatabaseService
 from service.sqlite_database_service import SqliteDataBaseService
 
 
 def main():
-    database: IDataBaseService = SqliteDataBaseService(DATABASE_PATH)
-    scraping = ScrapingService(database)
+    parser = ArgumentParser(description='レンズ情報を収集し、データベースとWebアプリ用のデータを作り直す')
+    parser.add_argument('--resume', action='store_true', help='前回失敗したビルドを、取得し終えたところから再開する')
+    parser.add_argument('--cache-max-size', type=int, default=PAGE_CACHE_MAX_SIZE // (1024 * 1024),
+                        help='ページキャッシュの容量の上限(MB)')
+    parser.add_argument('--profile', nargs='?', const='profile', default=None, metavar='DIRECTORY',
+                        help='段階(メーカーごとのスクレイピングなど)ごとのCPU時間・メモリ割り当てを計測し、'
+                             'DIRECTORY(省略時はprofile)に書き出す')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='レンズごとのページを、この数のワーカー(プロセス)で分担して取得する(0なら分担しない)')
+    parser.add_argument('--url-map', action='append', default=[], metavar='FROM=TO',
+                        help='URLの先頭がFROMのページを、TOに置き換えたURLから取得する(スタブサーバーでの確認用。複数指定できる)')
+    parser.add_argument('--max-quarantine-ratio', type=float, default=MAX_QUARANTINE_RATIO,
+                        help='検査で隔離したレンズの割合がこれを超えたら、ビルドを止める')
+    subparsers = parser.add_subparsers(dest='command')
+    cache_parser = subparsers.add_parser('cache', help='ページキャッシュを管理する')
+    cache_parser.add_argument('action', choices=['stats', 'gc', 'vacuum'],
+                              help='stats: ホストごとの統計を表示する、gc: 最新のクロールで使われなかったページを削除する、'
+                                   'vacuum: 空いた領域を切り詰める')
+    query_parser = subparsers.add_parser('query', help='共有URLのクエリの、事前に計算した結果のヒット数・ミス数を管理する')
+    query_parser.add_argument('action', choices=['stats', 'reset', 'record'],
+                              help='stats: クエリごとのヒット数・ミス数を表示する、reset: 記録を消す、'
+                                   'record: アクセスログの検索を、書き出した結果に引き当てて数える'
+                                   '(次のビルドで、検索回数の多いクエリの結果を書き出す)')
+    query_parser.add_argument('path', nargs='*', help='record で読むアクセスログ(1行に1リクエスト)')
+    subparsers.add_parser('worker', help='実行中のビルドのクロールキューから、レンズごとのページを取得する'
+                                         '(キューが空になったら終わる。同じデータベースを見られるなら、いくつ起動してもよい)')
+    subparsers.add_parser('rollback', help='データベースを、直前のビルドの前の状態に戻す')
+    ingest_parser = subparsers.add_parser('ingest', help='CSVファイルのレンズを検証し、データベースにまとめて追加する'
+                                                         '(次のビルドで作り直される。ビルドに含めるならcsvディレクトリに置く)')
+    ingest_parser.add_argument('path', nargs='+', help='CSVファイル・ディレクトリ・globパターン')
+    ingest_parser.add_argument('--mount', help='mount列が無いファイルのレンズマウント')
+    ingest_parser.add_argument('--dry-run', action='store_true', help='検証だけを行い、追加しない')
+    ingest_parser.add_argument('--max-error', type=int, default=100, help='表示するエラーの最大件数')
+    args = parser.parse_args()
+    url_map = parse_url_map(args.url_map)
 
-    # パナソニック製レンズについての情報を収集する
-    p_lens_list = get_p_lens_list(scraping)
-    for lens in p_lens_list:
-        print(lens)
+    # ビルド以外で現在のデータベースに書き込むコマンドは、ビルドによる差し替えと同時に実行しない
+    shadow = ShadowDatabaseService(DATABASE_PATH)
+    if args.command == 'worker':
+        with shadow.use():
+            run_worker(args.cache_max_size * 1024 * 1024, url_map)
+        return
+    if args.command == 'rollback':
+        with shadow.lock_build(DATABASE_TIMEOUT):
+            shadow.rollback()
+        return
+    if args.command == 'ingest':
+        with shadow.use():
+            run_ingest_command(SqliteDataBaseService(DATABASE_PATH), find_csv_path_list(args.path), args.mount,
+                               args.dry_run, args.max_error)
+        return
 
-    p_l_lens_list = get_p_l_lens_list(scraping)
-    for lens in p_l_lens_list:
-        print(lens)
+    database: IDataBaseService = SqliteDataBaseService(DATABASE_PATH, timeout=DATABASE_TIMEOUT)
+    if args.command == 'cache':
+        with shadow.use():
+            run_cache_command(PageCacheService(database, args.cache_max_size * 1024 * 1024), args.action)
+    elif args.command == 'query':
+        with shadow.use():
+            run_query_command(QueryCacheService(database), args.action, args.path)
+    else:
+        cache = PageCacheService(database, args.cache_max_size * 1024 * 1024)
+        profiler = ProfileService(args.profile or 'profile', enabled=args.profile is not None)
+        build(database, cache, args.resume, profiler, args.workers, url_map, args.max_quarantine_ratio)
 
-    # オリンパス製レンズについての情報を収集する
-    o_lens_list = get_o_lens_list(scraping)
-    for lens in o_lens_list:
-        print(lens)
 
-    # シグマ製レンズについての情報を収集する
-    s_lens_list = get_s_lens_list(scraping)
-    for lens in s_lens_list:
-        print(lens)
-    s_l_lens_list = get_s_l_lens_list(scraping)
-    for lens in s_l_lens_list:
-        print(lens)
+def parse_url_map(text_list: List[str]) -> Dict[str, str]:
+    """「FROM=TO」形式の文字列の一覧を、URLの置き換え表にする"""
+    output: Dict[str, str] = {}
+    for text in text_list:
+        if '=' not in text:
+            raise ValueError(f'URLの置き換えは「FROM=TO」の形式で指定してください({text}).')
+        prefix, replacement = text.split('=', 1)
+        output[prefix] = replacement
+    return output
 
-    # ライカ製レンズについての情報を収集する
-    l_l_lens_list = get_l_l_lens_list(scraping)
-    for lens in l_l_lens_list:
-        print(lens)
 
-    # その他レンズについての情報を収集する
-    other_lens_list = get_other_lens_list()
-    for lens in other_lens_list:
+def run_worker(cache_max_size: int, url_map: Dict[str, str]) -> None:
+    """クロールキューが空になるまで、レンズごとのページを取得してパースし、結果を報告する"""
+    database: IDataBaseService = SqliteDataBaseService(DATABASE_PATH, timeout=DATABASE_TIMEOUT)
+    scraping = ScrapingService(database, PageCacheService(database, cache_max_size), url_map)
+
+    def handler(task: CrawlTask) -> Optional[Lens]:
+        _, parse_lens = LENS_PAGE_SCRAPER_MAP[task.maker]
+        lens = parse_lens(scraping, task.url, task.name)
         print(lens)
+        return lens
+
+    count = run_crawl_worker(CrawlQueueService(database), handler)
+    print(f'worker finished: {count} lenses')
+
+
+def run_cache_command(cache: PageCacheService, action: str) -> None:
+    """ページキャッシュを管理するコマンドを実行する"""
+    if action == 'stats':
+        print('host\tentries\tbodies\tsize[KB]\thit\tmiss\thit rate')
+        for record in cache.find_stats():
+            print(f'{record["host"]}\t{record["entries"]}\t{record["bodies"]}\t{record["size"] / 1024:.1f}\t'
+                  f'{record["hit"]}\t{record["miss"]}\t{record["hit_rate"] * 100:.1f}%')
+        print(f'total: {cache.get_total_size() / 1024:.1f}KB / {cache.max_size / 1024:.1f}KB '
+              f'(without sharing bodies: {cache.get_logical_size() / 1024:.1f}KB)')
+    elif action == 'gc':
+        print(f'removed {cache.collect_garbage()} pages')
+    elif action == 'vacuum':
+        print(f'freed {cache.vacuum()} pages')
+
+
+def run_query_command(query_cache: QueryCacheService, action: str, path_list: List[str]) -> None:
+    """共有URLのクエリの、ヒット数・ミス数を管理するコマンドを実行する"""
+    if action == 'stats':
+        print('query\thit\tmiss\thit rate')
+        for record in query_cache.find_stats():
+            print(f'{record["query_key"]}\t{record["hit"]}\t{record["miss"]}\t{record["hit_rate"] * 100:.1f}%')
+    elif action == 'reset':
+        print(f'removed {query_cache.reset()} queries')
+    elif action == 'record':
+        if len(path_list) == 0:
+            raise ValueError('読み込むアクセスログを指定してください.')
+        for path in path_list:
+            print(f'recorded {query_cache.record_log(path)} searches [{path}]')
+
+
+def run_ingest_command(database: IDataBaseService, path_list: List[str], mount: Optional[str], dry_run: bool,
+                       max_error: int) -> None:
+    """CSVファイルを検証し(1周目)、エラーが無ければ1トランザクションでまとめて追加する(2周目)"""
+    if len(path_list) == 0:
+        raise ValueError('CSVファイルが見つかりません.')
+    count, error_count, error_list = validate_csv(path_list, mount, max_error)
+    for error in error_list:
+        print(error)
+    if error_count > len(error_list):
+        print(f'... and {error_count - len(error_list)} more errors')
+    if error_count > 0:
+        raise ValueError(f'{error_count}件のエラーがあるため、追加しませんでした.')
+    print(f'validated {count} lenses in {len(path_list)} files')
+    if dry_run:
+        return
+    count = LensService(database).bulk_load(lambda: chain.from_iterable([iter_csv_lens(x, mount) for x in path_list]))
+    print(f'ingested {count} lenses')
+
+
+def build(database: IDataBaseService, cache: PageCacheService, resume: bool, profiler: ProfileService,
+          worker_count: int = 0, url_map: Optional[Dict[str, str]] = None,
+          max_quarantine_ratio: float = MAX_QUARANTINE_RATIO) -> None:
+    """レンズの情報を収集し、データベースとWebアプリ用のデータを作り直す
+
+    worker_count が1以上なら、一覧ページとレンズごとのページに分けて取得するメーカーは、
+    レンズのURLをクロールキューに積み、その数のワーカー(プロセス)で分担して取得する。
+    書き込む前にカタログ全体を検査し、誤りのあるレンズは隔離する(隔離が多すぎればビルドを止める)。
+    """
+    scraping = ScrapingService(database, cache, url_map)
+    journal = BuildJournalService(database)
+    queue = CrawlQueueService(database)
+    if not resume or cache.crawl_id == 0:
+        cache.start_crawl()
+    if not resume:
+        journal.clear()
+        queue.clear()
+
+    # レンズの情報を収集する。取得し終えたレンズ・メーカーは、書き込み用のスレッドで進捗記録にまとめて書き込む
+    scraper_list: List[Tuple[str, Callable[[Set[str]], Iterator[Tuple[str, Lens]]]]] = [
+        # パナソニック製レンズについての情報を収集する
+        ('panasonic_mft', lambda x: iter_p_lens(scraping, x)),
+        ('panasonic_l', lambda x: iter_p_l_lens(scraping, x)),
+        # オリンパス製レンズについての情報を収集する
+        ('olympus_mft', lambda x: iter_o_lens(scraping, x)),
+        # シグマ製レンズについての情報を収集する
+        ('sigma_mft', lambda x: iter_s_lens(scraping, x)),
+        ('sigma_l', lambda x: iter_s_l_lens(scraping, x)),
+        # ライカ製レンズについての情報を収集する
+        ('leica_l', lambda x: iter_l_l_lens(scraping, x)),
+        # その他レンズについての情報を収集する
+        ('other', lambda x: iter_other_lens(x)),
+    ]
+    queue_maker_list: List[str] = []
+    with LensWriter(journal.record) as writer:
+        for maker, scraper in scraper_list:
+            if journal.is_maker_finished(maker):
+                print(f'skip... [{maker}]')
+                continue
+            if worker_count > 0 and maker in LENS_PAGE_SCRAPER_MAP:
+                # 一覧ページだけを取得し、レンズごとのページはワーカーに任せる
+                find_lens_url_list, _ = LENS_PAGE_SCRAPER_MAP[maker]
+                finished_url_set = journal.find_finished_url_set(maker)
+                queue.enqueue(maker, [x for x in find_lens_url_list(scraping) if x[0] not in finished_url_set])
+                queue_maker_list.append(maker)
+                continue
+            with profiler.stage(maker):
+                for url, lens in scraper(journal.find_finished_url_set(maker)):
+                    print(lens)
+                    writer.put((maker, url, lens))
+                writer.put((maker, None, None))
+
+    if len(queue_maker_list) > 0:
+        with profiler.stage('crawl_queue'):
+            run_queue_workers(queue, journal, queue_maker_list, worker_count, cache.max_size, url_map or {})
+
+    # 複数の情報源から来た同じレンズを1つにまとめる
+    # (まとめきれない似たレンズは確認用にファイルへ書き出し、類似度の高いものだけを表示する)
+    journal_lens_list = journal.load_lens_list()
+    with profiler.stage('dedupe'):
+        lens_list, flag_list = deduplicate(journal_lens_list)
+    print(f'merged {len(journal_lens_list) - len(lens_list)} duplicate lenses')
+    flag_list = write_flag_list(flag_list)
+    print(f'possible duplicates: {len(flag_list)} pairs [{POSSIBLE_DUPLICATE_PATH}]')
+    for lens1, lens2, score in flag_list[:FLAG_PRINT_COUNT]:
+        print(f'possible duplicate ({score:.2f}): [{lens1.maker} {lens1.name}] [{lens2.maker} {lens2.name}]')
+
+    # カタログ全体を検査し、誤りのあるレンズを隔離する(前回のビルドとの比較には、前回書き出したデータを使う)
+    with profiler.stage('quality'):
+        report = check_quality(lens_list, load_previous_column())
+    for name, count in report.find_count().items():
+        print(f'quality check [{name}]: {count} lenses')
+    quarantine_list = report.quarantine_list
+    for lens, reason_list in quarantine_list:
+        print(f'quarantined ({", ".join(reason_list)}): [{lens.maker} {lens.name}]')
+    report.validate(max_quarantine_ratio)
+    lens_list = report.passed_lens_list
+
+    # 今回のクロールで使われなかったページをキャッシュから削除する
+    print(f'removed {cache.collect_garbage()} pages from cache')
+
+    # 全メーカーを取得し終えたら、DBの複製(シャドウ)を作り直して検証し、現在のDBと差し替える
+    # (差し替えまでの間、読み手は前回のビルドの内容を読み続けられる。書き込むコマンドは断る)
+    shadow = ShadowDatabaseService(DATABASE_PATH)
+    with shadow.lock_build(DATABASE_TIMEOUT):
+        shadow_database = shadow.create()
+        try:
+            lens_service = LensService(shadow_database)
+            written_count = len(lens_list)
+            with profiler.stage('save'):
+                lens_service.save_all(lens_list, replace_all=True)
+            QualityService(shadow_database).save_all(quarantine_list)
+            BuildJournalService(shadow_database).clear()
+
+            # 前回のビルドから変わった値を履歴に残す
+            lens_list = lens_service.find_all()
+            with profiler.stage('history'):
+                HistoryService(shadow_database).record(lens_list)
+
+            # 結果を事前に計算しておくクエリを、これまでの検索回数から選ぶ
+            query_key_list = find_query_cache_key_list(QueryCacheService(shadow_database).find_popular_key_list())
+
+            # 空いた領域を少しずつ切り詰める
+            print(f'freed {PageCacheService(shadow_database, cache.max_size).vacuum()} pages')
+            shadow.validate(written_count)
+        except BaseException:
+            shadow.discard()
+            raise
+        shadow.swap()
+
+    # Webアプリ用のデータを書き出す
+    with profiler.stage('export'):
+        export_lens_data(lens_list)
+        export_skyline_data(lens_list)
+        export_sharded_lens_data(lens_list)
+        export_columnar_lens_data(lens_list)
+        export_facet_data(lens_list)
+        export_query_cache(lens_list, query_key_list)
+        version = export_catalogue_version(lens_list)
+    print(f'catalogue version: {version}')
+
+
+def run_queue_workers(queue: CrawlQueueService, journal: BuildJournalService, maker_list: List[str],
+                      worker_count: int, cache_max_size: int, url_map: Dict[str, str]) -> None:
+    """ワーカーを起動してクロールキューを処理させ、結果をメーカーごとに進捗記録へ移す
+
+    取得できなかったURLが残ったメーカーは記録せずにValueErrorを投げる(--resume で、そのURLから取得し直せる)。
+    """
+    process_list = [Process(target=run_worker, args=(cache_max_size, url_map), name=f'crawl-worker-{i}')
+                    for i in range(worker_count)]
+    for process in process_list:
+        process.start()
+    for process in process_list:
+        process.join()
+    print(f'crawl queue: {queue.find_stats()}')
 
-    # DBを再構築して書き込む
-    lens_service = LensService(database)
-    lens_service.delete_all()
-    for lens in p_lens_list:
-        lens_service.save(lens)
-    for lens in p_l_lens_list:
-        lens_service.save(lens)
-    for lens in o_lens_list:
-        lens_service.save(lens)
-    for lens in s_lens_list:
-        lens_service.save(lens)
-    for lens in s_l_lens_list:
-        lens_service.save(lens)
-    for lens in l_l_lens_list:
-        lens_service.save(lens)
-    for lens in other_lens_list:
-        lens_service.save(lens)
-    with open('lens_data.json', 'w') as f:
-        f.write(Lens.schema().dumps(lens_service.find_all(), many=True))
+    error_maker_list: List[str] = []
+    for maker in maker_list:
+        failed_list = queue.find_failed_list(maker)
+        if not queue.is_finished() or len(failed_list) > 0:
+            for record in failed_list:
+                print(f'failed: [{record["url"]}] {record["error"]}')
+            error_maker_list.append(maker)
+            continue
+        journal.record([(maker, url, lens) for url, lens in queue.load_result(maker)] + [(maker, None, None)])
+    if len(error_maker_list) > 0:
+        raise ValueError(f'取得できなかったページがあります({", ".join(error_maker_list)}).')
 
 
 def main2():
@@ -0,0 +1,177 @@
+import asyncio
+import threading
+from collections import Counter
+from concurrent.futures import Future
+from queue import Queue, Empty
+from typing import List, Dict, Iterable, Optional, Tuple
+
+from service.i_async_database_service import IAsyncDataBaseService
+from service.i_database_service import IDataBaseService
+
+# 1回のトランザクションにまとめる、書き込み要求の最大数
+MAX_BATCH_SIZE = 100
+
+# まとめて書き込める文の種類(DML)。CREATE TABLEなどは、失敗しても取り消されない(その場でコミットされる)ことが
+# あるので、まとめずに1つずつ実行する
+BATCH_STATEMENT_LIST = ['INSERT', 'UPDATE', 'DELETE', 'REPLACE']
+
+
+class DataBaseRequest:
+    """データベース用のスレッドに渡す要求"""
+
+    def __init__(self, kind: str, query: List[str], parameter: List[any]):
+        # select(読み込み)・write(many_query)・bulk(bulk_query)・stop(スレッドの終了)のいずれか
+        self.kind = kind
+        self.query = query
+        self.parameter = parameter
+        self.future: Future = Future()
+
+
+class AsyncDataBaseService(IAsyncDataBaseService):
+    """IDataBaseService を、専用のスレッドで動かして非同期に呼び出せるようにする
+
+    要求は1本のキューに積み、データベース用のスレッドが積んだ順に処理するので、イベントループは待たされない。
+
+    - 続けて積まれた書き込み(query・many_query)は、max_batch_size 件まで1回のトランザクションにまとめて書き込む
+      (コミットのたびにディスクへの同期を待つSQLiteでは、これが書き込みの速さを決める)。
+      まとめるのはDML(INSERT・UPDATE・DELETE・REPLACE)だけの要求に限る。
+      まとめた書き込みが失敗したら、要求ごとに書き込み直して、失敗した要求だけに例外を返す
+    - 処理待ちの読み込みと同じクエリ・パラメーターの読み込みは、その結果を共有する(書き込みを挟んだものは共有しない)
+
+    呼び出し側の await がキャンセルされても、積んだ要求は実行される。
+    """
+
+    def __init__(self, database: IDataBaseService, max_batch_size: int = MAX_BATCH_SIZE):
+        self.database = database
+        self.dialect = database.dialect
+        self.max_batch_size = max_batch_size
+        self.request_queue: Queue = Queue()
+        # 処理待ちの読み込み((クエリ, パラメーター, それまでに積んだ書き込みの数) → 結果)
+        self.pending_read: Dict[Tuple, Future] = {}
+        self.write_count = 0
+        # 統計(select: 読み込み回数、coalesced: 結果を共有した読み込みの数、write: 書き込み要求の数、
+        # transaction: 書き込みのトランザクション数)
+        self.stats: Counter = Counter()
+        self.thread = threading.Thread(target=self.run, name='database', daemon=True)
+        self.thread.start()
+
+    async def select(self, query: str, parameter=()) -> List[Dict[str, any]]:
+        key: Optional[Tuple] = (query, tuple(parameter), self.write_count)
+        try:
+            hash(key)
+        except TypeError:
+            key = None
+        future = self.pending_read.get(key) if key is not None else None
+        if future is not None:
+            self.stats['coalesced'] += 1
+            result = await asyncio.shield(asyncio.wrap_future(future))
+            # 結果を共有する呼び出し元同士が、互いの辞書を書き換えないよう複製して返す
+            return [dict(x) for x in result]
+
+        future = self.submit(DataBaseRequest('select', [query], [parameter]))
+        if key is None:
+            return await asyncio.shield(asyncio.wrap_future(future))
+        self.pending_read[key] = future
+        try:
+            return await asyncio.shield(asyncio.wrap_future(future))
+        finally:
+            if self.pending_read.get(key) is future:
+                del self.pending_read[key]
+
+    async def many_query(self, query: List[str], parameter=None) -> None:
+        if parameter is None:
+            parameter = [() for _ in query]
+        if len(query) != len(parameter):
+            raise ValueError(f'クエリ({len(query)}件)とパラメーター({len(parameter)}件)の数が一致しません.')
+        self.write_count += 1
+        await asyncio.shield(asyncio.wrap_future(self.submit(DataBaseRequest('write', query, parameter))))
+
+    async def bulk_query(self, query: List[str], parameter: List[Iterable[any]]) -> None:
+        self.write_count += 1
+        await asyncio.shield(asyncio.wrap_future(self.submit(DataBaseRequest('bulk', query, parameter))))
+
+    async def close(self) -> None:
+        """積んである要求を処理し終えてから、データベース用のスレッドを止める"""
+        if not self.thread.is_alive():
+            return
+        self.submit(DataBaseRequest('stop', [], []))
+        await asyncio.get_running_loop().run_in_executor(None, self.thread.join)
+
+    def submit(self, request: DataBaseRequest) -> Future:
+        if request.kind != 'select':
+            self.stats[request.kind] += 1
+        self.request_queue.put(request)
+        return request.future
+
+    def run(self) -> None:
+        request: Optional[DataBaseRequest] = None
+        while True:
+            if request is None:
+                request = self.request_queue.get()
+            if request.kind == 'stop':
+                request.future.set_result(None)
+                return
+            next_request: Optional[DataBaseRequest] = None
+            if is_batchable(request):
+                # 続けて積まれている書き込みをまとめる(まとめられないものが来たら、それは次に処理する)
+                batch = [request]
+                while len(batch) < self.max_batch_size:
+                    try:
+                        temp: DataBaseRequest = self.request_queue.get_nowait()
+                    except Empty:
+                        break
+                    if not is_batchable(temp):
+                        next_request = temp
+                        break
+                    batch.append(temp)
+                self.execute_batch(batch)
+            else:
+                self.execute(request)
+            request = next_request
+
+    def execute(self, request: DataBaseRequest) -> None:
+        try:
+            if request.kind == 'select':
+                self.stats['select'] += 1
+                result = self.database.select(request.query[0], request.parameter[0])
+            elif request.kind == 'bulk':
+                self.stats['transaction'] += 1
+                result = self.database.bulk_query(request.query, request.parameter)
+            else:
+                self.stats['transaction'] += 1
+                result = self.database.many_query(request.query, request.parameter)
+        except BaseException as e:
+            request.future.set_exception(e)
+            return
+        request.future.set_result(result)
+
+    def execute_batch(self, batch: List[DataBaseRequest]) -> None:
+        if len(batch) == 1:
+            self.execute(batch[0])
+            return
+        query: List[str] = []
+        parameter: List[any] = []
+        for request in batch:
+            query.extend(request.query)
+            parameter.extend(request.parameter)
+        try:
+            self.stats['transaction'] += 1
+            self.database.many_query(query, parameter)
+        except BaseException:
+            # まとめた書き込み(DMLだけ)は取り消されているので、要求ごとに書き込み直す
+            for request in batch:
+                self.execute(request)
+            return
+        for request in batch:
+            request.future.set_result(None)
+
+
+def is_batchable(request: DataBaseRequest) -> bool:
+    """他の書き込みと1回のトランザクションにまとめられる要求か(DMLだけの書き込み)"""
+    if request.kind != 'write':
+        return False
+    for query in request.query:
+        temp = query.lstrip().split(None, 1)
+        if len(temp) == 0 or temp[0].upper() not in BATCH_STATEMENT_LIST:
+            return False
+    return True
@@ -0,0 +1,64 @@
+import time
+from typing import List, Set, Tuple, Optional
+
+from constant import Lens
+from service.i_database_service import IDataBaseService
+
+
+class BuildJournalService:
+    """ビルドの進捗記録(途中で失敗したビルドを、続きから再開するためのもの)
+
+    取得し終えたレンズを「メーカー・URL・レンズデータ」として、取得し終えたメーカーを「メーカー」として記録する。
+    ビルドが最後まで終わったら、記録したレンズをまとめてlensテーブルに書き込み、記録を消す。
+    """
+
+    def __init__(self, database: IDataBaseService):
+        self.database = database
+        self.database.many_query([
+            'CREATE TABLE IF NOT EXISTS build_journal_lens ('  # 取得し終えたレンズ
+            'id INTEGER PRIMARY KEY,'                          # 取得した順番
+            'maker TEXT,'                                      # メーカー(スクレイピング処理)の名前
+            'url TEXT,'                                        # レンズのURL
+            'lens TEXT,'                                       # レンズデータ(JSON)
+            'UNIQUE (maker, url))',
+            'CREATE TABLE IF NOT EXISTS build_journal_maker ('  # 取得し終えたメーカー
+            'maker TEXT PRIMARY KEY,'                           # メーカー(スクレイピング処理)の名前
+            'finished_at INTEGER)',                             # 取得し終えた日時(UNIX時間)
+        ])
+
+    def clear(self) -> None:
+        """記録を消す"""
+        self.database.many_query(['DELETE FROM build_journal_lens', 'DELETE FROM build_journal_maker'])
+
+    def is_maker_finished(self, maker: str) -> bool:
+        result = self.database.select('SELECT maker FROM build_journal_maker WHERE maker=?', (maker,))
+        return len(result) > 0
+
+    def find_finished_url_set(self, maker: str) -> Set[str]:
+        """あるメーカーについて、取得し終えたレンズのURL一覧"""
+        result = self.database.select('SELECT url FROM build_journal_lens WHERE maker=?', (maker,))
+        return set([x['url'] for x in result])
+
+    def record(self, record_list: List[Tuple[str, Optional[str], Optional[Lens]]]) -> None:
+        """取得し終えたレンズ・メーカーをまとめて記録する(1トランザクション)
+
+        Parameters
+        ----------
+        record_list: List[Tuple[str, Optional[str], Optional[Lens]]]
+            (メーカー, URL, レンズデータ)の一覧。URLとレンズデータがNoneなら、そのメーカーを取得し終えたことを表す
+        """
+        query: List[str] = []
+        parameter: List[any] = []
+        for maker, url, lens in record_list:
+            if lens is None:
+                query.append('INSERT OR REPLACE INTO build_journal_maker (maker, finished_at) VALUES (?, ?)')
+                parameter.append((maker, int(time.time())))
+            else:
+                query.append('INSERT OR REPLACE INTO build_journal_lens (maker, url, lens) VALUES (?, ?, ?)')
+                parameter.append((maker, url, lens.to_json(ensure_ascii=False)))
+        self.database.many_query(query, parameter)
+
+    def load_lens_list(self) -> List[Lens]:
+        """記録したレンズを、取得した順に読み込む"""
+        result = self.database.select('SELECT lens FROM build_journal_lens ORDER BY id')
+        return [Lens.from_json(x['lens']) for x in result]
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import time
+from typing import List, Dict, Optional
+
+from constant import Lens
+from service.ulitity import lens_key, make_lens_key
+
+MANIFEST_FILE_NAME = 'manifest.json'
+
+# 最新のバージョンの、キー → レンズIDの対応
+ID_MAP_FILE_NAME = 'id_map.json'
+
+
+def calc_delta(old: Dict[str, Dict[str, any]], new: Dict[str, Dict[str, any]]) -> Dict[str, any]:
+    """2つのカタログ(キー → レンズの辞書)の差分を求める
+
+    Returns
+    -------
+        added: 追加されたレンズの一覧
+        removed: 削除されたレンズのキーの一覧
+        changed: 変更されたレンズごとの、キーと変更後の値(変わった項目のみ)
+    """
+    added = [record for key, record in new.items() if key not in old]
+    removed = [key for key in old.keys() if key not in new]
+    changed: List[Dict[str, any]] = []
+    for key, record in new.items():
+        if key not in old:
+            continue
+        old_record = old[key]
+        field = {k: v for k, v in record.items() if old_record.get(k) != v}
+        if len(field) > 0:
+            changed.append({'key': key, 'field': field})
+    return {'added': added, 'removed': removed, 'changed': changed}
+
+
+class CatalogueVersionService:
+    """カタログのバージョンを管理し、バージョン間の差分(パッチ)を書き出す
+
+    ディレクトリ構成::
+
+        manifest.json       最新のバージョン、バージョンとパッチの一覧
+        id_map.json         最新のバージョンの、キー → レンズIDの対応
+        v{n}.json           バージョンnの全データ(直近keep件のみ残す)
+        patch/{k}-{n}.json  バージョンkからnへのパッチ
+
+    レンズIDはビルドごとに振り直すので、全データ・パッチ・内容のハッシュには含めず、キーでレンズを区別する。
+
+    新しいバージョンを作るたびに、直前のバージョンからのパッチと、
+    全データが残っている直近keep件のバージョンそれぞれからのパッチを書き出す。
+    バージョンkを持つクライアントは、manifestの中に k→最新 のパッチがあればそれを1つ、
+    なければ k→k+1→… と連続するパッチを順に適用し、それも無ければ全データを取り直す。
+    """
+
+    def __init__(self, directory: str, keep: int = 5, history: int = 100):
+        self.directory = directory
+        self.keep = keep
+        self.history = history
+        os.makedirs(os.path.join(directory, 'patch'), exist_ok=True)
+        manifest_path = os.path.join(directory, MANIFEST_FILE_NAME)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {'latest': 0, 'snapshot': '', 'version': [], 'patch': []}
+
+    def load_snapshot(self, version: int) -> Optional[Dict[str, Dict[str, any]]]:
+        """バージョンの全データを、キー → レンズの辞書として読み込む(残っていなければNone)"""
+        path = os.path.join(self.directory, f'v{version}.json')
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            # キーの決め方が変わっても比べられるよう、保存したキーではなくレンズの値からキーを求め直す
+            return {make_lens_key(x['lens']['maker'], x['lens']['mount'], x['lens']['product_number'],
+                                  x['lens']['name']): x['lens'] for x in json.load(f)}
+
+    def publish(self, lens_list: List[Lens]) -> int:
+        """カタログを新しいバージョンとして登録する。前のバージョンと内容が同じなら、そのバージョン番号を返す
+
+        Parameters
+        ----------
+        lens_list: List[Lens]
+            レンズ一覧
+
+        Returns
+        -------
+            バージョン番号
+        """
+        snapshot = sorted([{'key': lens_key(x), 'lens': {k: v for k, v in x.to_dict().items() if k != 'id'}}
+                           for x in lens_list], key=lambda x: x['key'])
+        self.write_id_map(lens_list)
+        text = json.dumps(snapshot, ensure_ascii=False, sort_keys=True)
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        version_list: List[Dict[str, any]] = self.manifest['version']
+        if len(version_list) > 0 and version_list[-1]['hash'] == digest:
+            return self.manifest['latest']
+
+        # 新しいバージョンの全データを書き出す
+        version = self.manifest['latest'] + 1
+        with open(os.path.join(self.directory, f'v{version}.json'), 'w') as f:
+            f.write(text)
+        new = {x['key']: x['lens'] for x in snapshot}
+
+        # 直前のバージョンと、全データが残っている直近のバージョンからのパッチを書き出す
+        patch_list: List[Dict[str, any]] = self.manifest['patch']
+        for item in version_list[-self.keep:]:
+            old = self.load_snapshot(item['version'])
+            if old is None:
+                continue
+            delta = calc_delta(old, new)
+            path = f'patch/{item["version"]}-{version}.json'
+            with open(os.path.join(self.directory, path), 'w') as f:
+                json.dump({'from': item['version'], 'to': version, **delta}, f, ensure_ascii=False,
+                          separators=(',', ':'))
+            patch_list.append({'from': item['version'], 'to': version, 'path': path,
+                               'size': os.path.getsize(os.path.join(self.directory, path))})
+
+        version_list.append({'version': version, 'hash': digest, 'count': len(lens_list),
+                             'created_at': int(time.time())})
+        self.manifest['latest'] = version
+        self.manifest['snapshot'] = f'v{version}.json'
+        self.prune()
+        with open(os.path.join(self.directory, MANIFEST_FILE_NAME), 'w') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+        return version
+
+    def write_id_map(self, lens_list: List[Lens]) -> None:
+        """最新のバージョンの、キー → レンズIDの対応を書き出す(内容が同じでもIDは変わりうるので毎回書き出す)"""
+        with open(os.path.join(self.directory, ID_MAP_FILE_NAME), 'w') as f:
+            json.dump({lens_key(x): x.id for x in lens_list}, f, ensure_ascii=False, separators=(',', ':'))
+
+    def prune(self) -> None:
+        """古い全データとパッチを削除する"""
+        version_list: List[Dict[str, any]] = self.manifest['version']
+        for item in version_list[:-self.keep]:
+            path = os.path.join(self.directory, f'v{item["version"]}.json')
+            if os.path.exists(path):
+                os.remove(path)
+        oldest = version_list[-self.history]['version'] if len(version_list) > self.history else 0
+        patch_list: List[Dict[str, any]] = []
+        for item in self.manifest['patch']:
+            if item['from'] < oldest:
+                path = os.path.join(self.directory, item['path'])
+                if os.path.exists(path):
+                    os.remove(path)
+            else:
+                patch_list.append(item)
+        self.manifest['patch'] = patch_list
+        self.manifest['version'] = [x for x in version_list if x['version'] >= oldest]
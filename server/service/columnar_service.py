@@ -0,0 +1,196 @@
+"""レンズデータの列指向バイナリ形式(.mftc)
+
+ファイルの構造(数値はすべてリトルエンディアン)::
+
+    ヘッダー(16バイト)
+        magic         4バイト  b'MFTC'
+        version       uint16   形式のバージョン(現在は1)
+        reserved      uint16   0
+        row_count     uint32   行数
+        column_count  uint32   列数
+    列ディレクトリ(72バイト × 列数)
+        name          32バイト 列名(UTF-8、NUL埋め)
+        type          uint8    列の型(下記)
+        reserved      7バイト  0
+        data_offset   uint64   データ部の開始位置(ファイル先頭から)
+        data_length   uint64   データ部のバイト数
+        dict_offset   uint64   辞書部の開始位置(辞書を持たない型では0)
+        dict_length   uint64   辞書部のバイト数(辞書を持たない型では0)
+    各列のデータ部・辞書部(それぞれ8バイト境界に揃える)
+
+列の型とデータ部の中身::
+
+    1 INT32       int32 × 行数
+    2 FLOAT64     float64 × 行数
+    3 BOOL        行iの値を (i // 8) バイト目の (i % 8) ビット目(LSB側から)に詰めたもの
+    4 DICT_UINT16 辞書の番号(uint16 × 行数)
+    5 DICT_UINT32 辞書の番号(uint32 × 行数)
+
+辞書部は uint32 の件数n、uint32 × (n + 1) の終端位置(文字列部の先頭からのバイト位置。先頭は0)、
+UTF-8の文字列を連結したもの、の順に並ぶ。
+"""
+import mmap
+import struct
+from dataclasses import fields
+from typing import List, Dict, Tuple, Union
+
+import numpy
+
+from constant import Lens
+
+MAGIC = b'MFTC'
+VERSION = 1
+HEADER_FORMAT = '<4sHHII'
+COLUMN_FORMAT = '<32sB7xQQQQ'
+
+TYPE_INT32 = 1
+TYPE_FLOAT64 = 2
+TYPE_BOOL = 3
+TYPE_DICT_UINT16 = 4
+TYPE_DICT_UINT32 = 5
+
+NUMPY_TYPE = {
+    TYPE_INT32: numpy.dtype('<i4'),
+    TYPE_FLOAT64: numpy.dtype('<f8'),
+    TYPE_DICT_UINT16: numpy.dtype('<u2'),
+    TYPE_DICT_UINT32: numpy.dtype('<u4'),
+}
+
+
+def write_columnar(lens_list: List[Lens], path: str) -> None:
+    """レンズデータを列指向バイナリ形式で書き出す"""
+    field_list = fields(Lens)
+    block_list: List[Tuple[str, int, bytes, bytes]] = []
+    for field in field_list:
+        value_list = [getattr(x, field.name) for x in lens_list]
+        if field.type == int:
+            block_list.append((field.name, TYPE_INT32, numpy.array(value_list, dtype='<i4').tobytes(), b''))
+        elif field.type == float:
+            block_list.append((field.name, TYPE_FLOAT64, numpy.array(value_list, dtype='<f8').tobytes(), b''))
+        elif field.type == bool:
+            data = numpy.packbits(numpy.array(value_list, dtype=bool), bitorder='little').tobytes()
+            block_list.append((field.name, TYPE_BOOL, data, b''))
+        else:
+            # 文字列は辞書に登録し、その番号を並べる
+            dictionary: Dict[str, int] = {}
+            code_list = [dictionary.setdefault(str(x), len(dictionary)) for x in value_list]
+            column_type = TYPE_DICT_UINT16 if len(dictionary) < 1 << 16 else TYPE_DICT_UINT32
+            data = numpy.array(code_list, dtype=NUMPY_TYPE[column_type]).tobytes()
+            block_list.append((field.name, column_type, data, encode_dictionary(list(dictionary.keys()))))
+
+    # データ部の位置を決めてから書き出す
+    offset = align(struct.calcsize(HEADER_FORMAT) + struct.calcsize(COLUMN_FORMAT) * len(block_list))
+    directory: List[bytes] = []
+    body: List[bytes] = []
+    for name, column_type, data, dictionary_data in block_list:
+        data_offset = offset
+        offset = align(offset + len(data))
+        dict_offset = offset if len(dictionary_data) > 0 else 0
+        offset = align(offset + len(dictionary_data))
+        directory.append(struct.pack(COLUMN_FORMAT, name.encode('utf-8'), column_type,
+                                     data_offset, len(data), dict_offset, len(dictionary_data)))
+        body.append(pad(data))
+        body.append(pad(dictionary_data))
+    with open(path, 'wb') as f:
+        header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, 0, len(lens_list), len(block_list))
+        f.write(pad(header + b''.join(directory)))
+        for x in body:
+            f.write(x)
+
+
+def align(offset: int) -> int:
+    return (offset + 7) // 8 * 8
+
+
+def pad(data: bytes) -> bytes:
+    return data + b'\0' * (align(len(data)) - len(data))
+
+
+def encode_dictionary(text_list: List[str]) -> bytes:
+    encoded = [x.encode('utf-8') for x in text_list]
+    end_list = numpy.cumsum([0] + [len(x) for x in encoded]).astype('<u4')
+    return struct.pack('<I', len(encoded)) + end_list.tobytes() + b''.join(encoded)
+
+
+class ColumnarReader:
+    """列指向バイナリ形式のファイルを、メモリマップして読み込む
+
+    数値列と辞書番号の列は、ファイルの内容をそのまま参照するnumpy配列(コピーなし)として返す。
+    真偽値の列はビットを展開する必要があるので、columnで取り出すとコピーになる。
+    columnで取り出した配列が残っているとcloseできないので、先に破棄しておくこと。
+    """
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self.row_count, column_count = struct.unpack_from(HEADER_FORMAT, self.buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{path}は列指向バイナリ形式のファイルではありません.')
+        if version != VERSION:
+            raise ValueError(f'{path}の形式のバージョン({version})には対応していません.')
+        self.column_dict: Dict[str, Tuple[int, int, int, int, int]] = {}
+        position = struct.calcsize(HEADER_FORMAT)
+        for _ in range(column_count):
+            name, column_type, data_offset, data_length, dict_offset, dict_length = \
+                struct.unpack_from(COLUMN_FORMAT, self.buffer, position)
+            self.column_dict[name.rstrip(b'\0').decode('utf-8')] = \
+                (column_type, data_offset, data_length, dict_offset, dict_length)
+            position += struct.calcsize(COLUMN_FORMAT)
+        self.dictionary_cache: Dict[str, List[str]] = {}
+
+    def __enter__(self) -> 'ColumnarReader':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.buffer.close()
+
+    @property
+    def column_name_list(self) -> List[str]:
+        return list(self.column_dict.keys())
+
+    def column(self, name: str) -> numpy.ndarray:
+        """列の値を取り出す(文字列の列は辞書の番号になる)"""
+        column_type, data_offset, _, _, _ = self.column_dict[name]
+        if column_type == TYPE_BOOL:
+            temp = numpy.frombuffer(self.buffer, dtype=numpy.uint8, count=(self.row_count + 7) // 8,
+                                    offset=data_offset)
+            return numpy.unpackbits(temp, bitorder='little')[0:self.row_count].astype(bool)
+        return numpy.frombuffer(self.buffer, dtype=NUMPY_TYPE[column_type], count=self.row_count,
+                                offset=data_offset)
+
+    def dictionary(self, name: str) -> List[str]:
+        """文字列の列の辞書を取り出す"""
+        if name not in self.dictionary_cache:
+            _, _, _, dict_offset, _ = self.column_dict[name]
+            count = struct.unpack_from('<I', self.buffer, dict_offset)[0]
+            end_list = numpy.frombuffer(self.buffer, dtype='<u4', count=count + 1, offset=dict_offset + 4)
+            start = dict_offset + 4 + (count + 1) * 4
+            self.dictionary_cache[name] = [self.buffer[start + end_list[i]:start + end_list[i + 1]].decode('utf-8')
+                                           for i in range(count)]
+        return self.dictionary_cache[name]
+
+    def value(self, name: str, row: int) -> Union[int, float, bool, str]:
+        """1つの値を取り出す"""
+        column_type = self.column_dict[name][0]
+        if column_type == TYPE_BOOL:
+            _, data_offset, _, _, _ = self.column_dict[name]
+            return bool(self.buffer[data_offset + row // 8] >> (row % 8) & 1)
+        temp = self.column(name)[row].item()
+        if column_type in [TYPE_DICT_UINT16, TYPE_DICT_UINT32]:
+            return self.dictionary(name)[temp]
+        return temp
+
+    def to_lens_list(self) -> List[Lens]:
+        """全行をレンズデータに戻す"""
+        column_list: Dict[str, List[any]] = {}
+        for name, (column_type, _, _, _, _) in self.column_dict.items():
+            temp = self.column(name).tolist()
+            if column_type in [TYPE_DICT_UINT16, TYPE_DICT_UINT32]:
+                dictionary = self.dictionary(name)
+                temp = [dictionary[x] for x in temp]
+            column_list[name] = temp
+        name_list = list(column_list.keys())
+        return [Lens(**dict(zip(name_list, x))) for x in zip(*column_list.values())]
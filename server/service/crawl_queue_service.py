@@ -0,0 +1,213 @@
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import List, Dict, Tuple, Optional, Callable
+
+from constant import Lens
+from service.i_database_service import IDataBaseService
+
+# リース(URLを取得する権利)の有効期間(秒)。この間にハートビートも完了報告も無ければ、他のワーカーに回す
+LEASE_SECONDS = 60.0
+
+# 失敗したURLを、何回まで取得し直すか
+MAX_ATTEMPT = 3
+
+# 取得できるURLが無いとき、次に確かめるまで待つ秒数
+POLL_INTERVAL = 1.0
+
+# 複数のプロセスで同じデータベースを読み書きするときの、ロックが解けるまで待つ秒数
+DATABASE_TIMEOUT = 60.0
+
+
+class CrawlTask:
+    """クロールキューから取得した、1件分の仕事"""
+
+    def __init__(self, record: Dict[str, any]):
+        self.id: int = record['id']
+        self.maker: str = record['maker']
+        self.url: str = record['url']
+        self.name: str = record['name']
+        self.attempt: int = record['attempt']
+        self.lease_token: str = record['lease_token']
+
+
+class CrawlQueueService:
+    """複数のワーカー(プロセス)で分担してレンズごとのページを取得するための、SQLite上の仕事の列
+
+    一覧ページから見つけたレンズのURLを enqueue で積み、ワーカーは次の流れで処理する::
+
+        claim      … 未処理か、リースの切れたURLを取り出し、一定時間(lease_seconds)の間だけ自分のものにする
+        heartbeat  … 処理に時間がかかるときは、リースを延ばす
+        ack / fail … 結果(レンズデータ)か失敗を報告する
+
+    取り出すたびに固有のリーストークンを振り、報告はトークンが一致するときだけ受け付ける。
+    ワーカーが落ちてリースが切れたURLは自動的に他のワーカーへ回り、遅れて届いた古い報告は捨てられるので、
+    URLごとの結果はちょうど1件だけ記録される。
+    """
+
+    def __init__(self, database: IDataBaseService):
+        self.database = database
+        self.database.many_query([
+            'CREATE TABLE IF NOT EXISTS crawl_queue ('  # クロールキュー
+            'id INTEGER PRIMARY KEY,'                   # 積んだ順番
+            'maker TEXT,'                               # メーカー(スクレイピング処理)の名前
+            'url TEXT,'                                 # レンズのURL
+            'name TEXT,'                                # レンズ名
+            "state TEXT DEFAULT 'pending',"             # pending(未処理)・leased(処理中)・done(完了)・failed(失敗)
+            'lease_token TEXT,'                         # 処理中のリーストークン
+            'lease_expire REAL,'                        # リースの期限(UNIX時間)
+            'attempt INTEGER DEFAULT 0,'                # 取り出した回数
+            'lens TEXT,'                                # 結果のレンズデータ(JSON。レンズが無いページならNULL)
+            'error TEXT,'                               # 最後に失敗したときのエラー
+            'UNIQUE (maker, url))',
+            'CREATE INDEX IF NOT EXISTS crawl_queue_state ON crawl_queue (state, lease_expire)',
+        ])
+
+    def clear(self) -> None:
+        """キューを空にする"""
+        self.database.query('DELETE FROM crawl_queue')
+
+    def enqueue(self, maker: str, task_list: List[Tuple[str, str]]) -> None:
+        """(レンズのURL, レンズ名)の一覧を積む
+
+        既に積んであるURLはそのままにする(完了したURLを取得し直さない)。失敗したURLは、取得し直せるよう未処理に戻す。
+        """
+        self.database.bulk_query([
+            'INSERT INTO crawl_queue (maker, url, name) VALUES (?, ?, ?) ON CONFLICT (maker, url) '
+            "DO UPDATE SET state='pending', attempt=0, error=NULL WHERE state='failed'"
+        ], [[(maker, url, name) for url, name in task_list]])
+
+    def claim(self, worker_id: str, limit: int = 1, lease_seconds: float = LEASE_SECONDS,
+              max_attempt: int = MAX_ATTEMPT) -> List[CrawlTask]:
+        """未処理か、リースの切れたURLを最大 limit 件取り出す
+
+        取り出しは1つのUPDATE文で行うので、複数のプロセスが同時に呼んでも同じURLを取り出すことはない。
+        リースの切れたURLのうち、取り出した回数が max_attempt に達したもの(ワーカーごと落ちるページなど、
+        fail が呼ばれないまま取り出し直され続けるもの)は、取り出さずに失敗にする。
+        """
+        now = time.time()
+        lease_token = f'{worker_id}:{uuid.uuid4().hex}'
+        self.database.many_query([
+            "UPDATE crawl_queue SET state='failed', error='lease expired' "
+            "WHERE state='leased' AND lease_expire < ? AND attempt >= ?",
+            "UPDATE crawl_queue SET state='leased', lease_token=?, lease_expire=?, attempt=attempt+1 "
+            'WHERE id IN (SELECT id FROM crawl_queue '
+            "WHERE state='pending' OR (state='leased' AND lease_expire < ? AND attempt < ?) ORDER BY id LIMIT ?)",
+        ], [(now, max_attempt), (lease_token, now + lease_seconds, now, max_attempt, limit)])
+        result = self.database.select('SELECT id, maker, url, name, attempt, lease_token FROM crawl_queue '
+                                      'WHERE lease_token=? ORDER BY id', (lease_token,))
+        return [CrawlTask(x) for x in result]
+
+    def heartbeat(self, task_list: List[CrawlTask], lease_seconds: float = LEASE_SECONDS) -> None:
+        """リースを延ばす(既に他のワーカーに回ったものは延ばさない)"""
+        expire = time.time() + lease_seconds
+        self.database.many_query(
+            ["UPDATE crawl_queue SET lease_expire=? WHERE id=? AND lease_token=? AND state='leased'"
+             for _ in task_list],
+            [(expire, x.id, x.lease_token) for x in task_list])
+
+    def ack(self, task: CrawlTask, lens: Optional[Lens]) -> bool:
+        """結果を報告する
+
+        Returns
+        -------
+            受け付けられたらTrue(リースが切れて他のワーカーに回っていたらFalse)
+        """
+        lens_json = lens.to_json(ensure_ascii=False) if lens is not None else None
+        self.database.query("UPDATE crawl_queue SET state='done', lens=?, error=NULL "
+                            "WHERE id=? AND lease_token=? AND state='leased'", (lens_json, task.id, task.lease_token))
+        result = self.database.select("SELECT id FROM crawl_queue WHERE id=? AND lease_token=? AND state='done'",
+                                      (task.id, task.lease_token))
+        return len(result) > 0
+
+    def fail(self, task: CrawlTask, error: str, max_attempt: int = MAX_ATTEMPT) -> None:
+        """失敗を報告する(取り出した回数が max_attempt 未満なら、未処理に戻して取得し直させる)"""
+        self.database.query(
+            "UPDATE crawl_queue SET state=CASE WHEN attempt < ? THEN 'pending' ELSE 'failed' END, error=? "
+            "WHERE id=? AND lease_token=? AND state='leased'", (max_attempt, error, task.id, task.lease_token))
+
+    def is_finished(self) -> bool:
+        """全てのURLが、完了か失敗になったか"""
+        result = self.database.select("SELECT COUNT(*) AS count FROM crawl_queue WHERE state IN ('pending', 'leased')")
+        return result[0]['count'] == 0
+
+    def find_stats(self) -> Dict[str, int]:
+        """状態ごとのURLの件数"""
+        output = {'pending': 0, 'leased': 0, 'done': 0, 'failed': 0}
+        for record in self.database.select('SELECT state, COUNT(*) AS count FROM crawl_queue GROUP BY state'):
+            output[record['state']] = record['count']
+        return output
+
+    def find_failed_list(self, maker: str) -> List[Dict[str, any]]:
+        """失敗したURLとエラーの一覧"""
+        return self.database.select("SELECT url, error FROM crawl_queue WHERE maker=? AND state='failed' ORDER BY id",
+                                    (maker,))
+
+    def load_result(self, maker: str) -> List[Tuple[str, Lens]]:
+        """あるメーカーについて、完了したURLと結果のレンズデータの一覧(積んだ順。レンズが無いページは除く)"""
+        result = self.database.select("SELECT url, lens FROM crawl_queue WHERE maker=? AND state='done' "
+                                      'AND lens IS NOT NULL ORDER BY id', (maker,))
+        return [(x['url'], Lens.from_json(x['lens'])) for x in result]
+
+
+def create_worker_id() -> str:
+    """ワーカーを見分けるためのID(ホスト名とプロセスID)"""
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def run_crawl_worker(queue: CrawlQueueService, handler: Callable[[CrawlTask], Optional[Lens]],
+                     worker_id: Optional[str] = None, lease_seconds: float = LEASE_SECONDS,
+                     poll_interval: float = POLL_INTERVAL) -> int:
+    """キューが空になるまで、URLを1件ずつ取り出して処理する
+
+    処理している間は、別スレッドで lease_seconds の1/3ごとにリースを延ばす。
+    他のワーカーが処理中のURLしか残っていないときは、それらが終わるか、リースが切れて回ってくるまで待つ。
+
+    Parameters
+    ----------
+    queue: CrawlQueueService
+        クロールキュー
+    handler: Callable[[CrawlTask], Optional[Lens]]
+        URLを取得・パースし、レンズデータ(レンズが無いページならNone)を返す関数。例外を投げたら失敗として報告する
+    worker_id: Optional[str]
+        ワーカーのID(省略時はホスト名とプロセスID)
+
+    Returns
+    -------
+        受け付けられた結果の件数
+    """
+    if worker_id is None:
+        worker_id = create_worker_id()
+    count = 0
+    while True:
+        task_list = queue.claim(worker_id, 1, lease_seconds)
+        if len(task_list) == 0:
+            if queue.is_finished():
+                return count
+            time.sleep(poll_interval)
+            continue
+        task = task_list[0]
+
+        stop_event = threading.Event()
+
+        def keep_lease() -> None:
+            while not stop_event.wait(lease_seconds / 3):
+                queue.heartbeat([task], lease_seconds)
+
+        heartbeat_thread = threading.Thread(target=keep_lease, name='crawl-heartbeat', daemon=True)
+        heartbeat_thread.start()
+        try:
+            lens = handler(task)
+        except Exception as e:
+            print(f'failed... [{task.url}] {e}')
+            queue.fail(task, str(e))
+            continue
+        finally:
+            stop_event.set()
+            heartbeat_thread.join()
+        if queue.ack(task, lens):
+            count += 1
+        else:
+            print(f'lease lost... [{task.url}]')
@@ -0,0 +1,163 @@
+import csv
+import glob
+import os
+from dataclasses import fields
+from typing import List, Dict, Iterator, Tuple, Optional, Callable
+
+from constant import Lens
+
+# ファイル名ごとのレンズマウント(mount列も、指定も無いときに使う)
+CSV_MOUNT_MAP: Dict[str, str] = {
+    'm4_3.csv': 'マイクロフォーサーズ',
+    'l_mount.csv': 'ライカL',
+}
+
+# 空欄を許す列
+OPTIONAL_COLUMN_LIST = ['product_number']
+
+# 真偽値として受け付ける文字列
+TRUE_TEXT_LIST = ['1', 'true', 'yes', '○']
+FALSE_TEXT_LIST = ['0', 'false', 'no', '×', '']
+
+
+class CsvError:
+    """CSVファイルの検証エラー(ファイル・行番号・列名の位置を持つ)"""
+
+    def __init__(self, path: str, line: int, column: str, message: str):
+        self.path = path
+        self.line = line
+        self.column = column
+        self.message = message
+
+    def __str__(self) -> str:
+        column = f' [{self.column}]' if self.column != '' else ''
+        return f'{self.path}:{self.line}{column}: {self.message}'
+
+
+def find_csv_path_list(path_list: List[str]) -> List[str]:
+    """ディレクトリ・globパターン・ファイルパスの一覧を、CSVファイルのパスの一覧(重複なし、名前順)にする"""
+    output: List[str] = []
+    for path in path_list:
+        if os.path.isdir(path):
+            output.extend(glob.glob(os.path.join(path, '*.csv')))
+        elif glob.has_magic(path):
+            output.extend(glob.glob(path, recursive=True))
+        else:
+            output.append(path)
+    return sorted(set(output))
+
+
+def convert_value(field_type: type, text: str) -> any:
+    """CSVの文字列を、Lensの項目の型に変換する(変換できなければValueErrorを投げる)"""
+    text = text.strip()
+    if field_type == str:
+        return text
+    if field_type == bool:
+        if text.lower() in TRUE_TEXT_LIST:
+            return True
+        if text.lower() in FALSE_TEXT_LIST:
+            return False
+        raise ValueError(f'真偽値ではありません({text}).')
+    if text == '':
+        raise ValueError('値が空です.')
+    try:
+        value = float(text)
+    except ValueError:
+        raise ValueError(f'数値ではありません({text}).')
+    if field_type == int:
+        if not value.is_integer():
+            raise ValueError(f'整数ではありません({text}).')
+        return int(value)
+    return value
+
+
+def iter_csv_lens(path: str, mount: Optional[str] = None,
+                  on_error: Optional[Callable[[CsvError], None]] = None) -> Iterator[Lens]:
+    """CSVファイルを1行ずつ読み込み、レンズデータとして返す(ファイル全体をメモリに載せない)
+
+    レンズマウントは mount 列 → 引数 mount → CSV_MOUNT_MAP(ファイル名) の順に決める。
+    id列は無視する(書き込み時に振り直す)。
+
+    Parameters
+    ----------
+    path: str
+        ファイルパス
+    mount: Optional[str]
+        mount列が無いときに使うレンズマウント
+    on_error: Optional[Callable[[CsvError], None]]
+        検証エラーを受け取る関数。省略時は最初のエラーでValueErrorを投げる。
+        指定した場合、エラーのある行は飛ばして続きを読む
+
+    Returns
+    -------
+        レンズデータ
+    """
+    def report(error: CsvError) -> None:
+        if on_error is None:
+            raise ValueError(str(error))
+        on_error(error)
+
+    field_type: Dict[str, type] = {x.name: x.type for x in fields(Lens) if x.name != 'id'}
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        column_list: List[str] = reader.fieldnames or []
+        default_mount = mount if mount is not None else CSV_MOUNT_MAP.get(os.path.basename(path))
+        missing = [x for x in field_type.keys() if x not in column_list and not (x == 'mount' and default_mount)]
+        if len(missing) > 0:
+            report(CsvError(path, 1, '', f'列がありません({", ".join(missing)}).'))
+            return
+        for column in column_list:
+            if column not in field_type and column != 'id':
+                report(CsvError(path, 1, column, '未知の列です.'))
+                return
+
+        for record in reader:
+            line = reader.line_num
+            if None in record:
+                report(CsvError(path, line, '', f'列の数が多すぎます({len(column_list) + len(record[None])}列).'))
+                continue
+            value_dict: Dict[str, any] = {}
+            valid = True
+            for column, column_type in field_type.items():
+                text = record.get(column)
+                if column == 'mount' and (text is None or text.strip() == ''):
+                    text = default_mount
+                if text is None:
+                    report(CsvError(path, line, column, '列の数が足りません.'))
+                    valid = False
+                    break
+                if text.strip() == '' and column_type == str and column not in OPTIONAL_COLUMN_LIST:
+                    report(CsvError(path, line, column, '値が空です.'))
+                    valid = False
+                    continue
+                try:
+                    value_dict[column] = convert_value(column_type, text)
+                except ValueError as e:
+                    report(CsvError(path, line, column, str(e)))
+                    valid = False
+            if valid:
+                yield Lens(**value_dict)
+
+
+def validate_csv(path_list: List[str], mount: Optional[str] = None,
+                 max_error: int = 100) -> Tuple[int, int, List[CsvError]]:
+    """CSVファイルを検証する(エラーは max_error 件まで集める)
+
+    Returns
+    -------
+        (正しい行数, エラーの件数, エラー一覧)
+    """
+    error_list: List[CsvError] = []
+    error_count = 0
+
+    def on_error(error: CsvError) -> None:
+        nonlocal error_count
+        error_count += 1
+        if len(error_list) < max_error:
+            error_list.append(error)
+
+    count = 0
+    for path in path_list:
+        for _ in iter_csv_lens(path, mount, on_error):
+            count += 1
+    return count, error_count, error_list
@@ -0,0 +1,32 @@
+from service.i_database_service import IDataBaseService
+
+# 選択できるデータベースの種類
+DATABASE_BACKEND_LIST = ['sqlite', 'memory', 'duckdb']
+
+
+def create_database_service(backend: str = 'sqlite', path: str = '') -> IDataBaseService:
+    """データベースの種類を指定して、IDataBaseServiceを作成する
+
+    Parameters
+    ----------
+    backend: str
+        sqlite: SQLiteのファイル(pathに保存する)
+        memory: メモリ上のSQLite(pathは共有キャッシュの名前。省略時は既定の名前)
+        duckdb: DuckDB(pathに保存する。省略時はメモリ上)
+    path: str
+        データベースのパス
+
+    Returns
+    -------
+        データベース
+    """
+    if backend == 'sqlite':
+        from service.sqlite_database_service import SqliteDataBaseService
+        return SqliteDataBaseService(path)
+    if backend == 'memory':
+        from service.memory_database_service import InMemoryDataBaseService
+        return InMemoryDataBaseService(path) if path != '' else InMemoryDataBaseService()
+    if backend == 'duckdb':
+        from service.duckdb_database_service import DuckDbDataBaseService
+        return DuckDbDataBaseService(path if path != '' else ':memory:')
+    raise ValueError(f'{backend}は対応していないデータベースの種類です.')
@@ -0,0 +1,199 @@
+import re
+from collections import defaultdict
+from dataclasses import fields, replace
+from difflib import SequenceMatcher
+from typing import List, Dict, Tuple, Set
+
+from constant import Lens
+from service.ulitity import normalize_search_text
+
+# ブロック内のレンズがこれより多いときは、名前順に並べて近いものだけを比べる
+MAX_BLOCK_SIZE = 16
+
+# 名前順に並べたとき、前後何件までを比べるか
+WINDOW_SIZE = 8
+
+# 値が空(文字列なら''、数値なら0)のときに、重複したレンズの値で補う項目
+# (フィルター径の-1は「フィルターを付けられない」という意味の値なので、補わない)
+MERGE_FIELD_LIST = [x.name for x in fields(Lens) if x.name not in ['id'] and x.type != bool]
+
+# ビルドの出力に表示する、要確認のレンズの組の数(類似度の高い順。全件はファイルに書き出す)
+FLAG_PRINT_COUNT = 20
+
+# 要確認のレンズの組を書き出すファイル
+POSSIBLE_DUPLICATE_PATH = 'possible_duplicate.tsv'
+
+# レンズの位置の組と、その類似度
+ScoredPair = Tuple[int, int, float]
+
+
+def normalize_product_number(text: str) -> str:
+    """型番を比較用に正規化する(大文字小文字・記号・空白の違いを無視する)"""
+    return re.sub(r'[^0-9a-z]', '', normalize_search_text(text))
+
+
+def normalize_lens_name(lens: Lens) -> str:
+    """レンズ名を比較用に正規化する(メーカー名の有無・「F/」の表記・記号の違いを無視する)"""
+    text = normalize_search_text(lens.name)
+    maker = normalize_search_text(lens.maker)
+    if maker != '':
+        text = text.replace(maker, ' ')
+    text = text.replace('f/', 'f')
+    return ' '.join(re.sub(r'[^0-9a-z.぀-ヿ一-鿿]+', ' ', text).split())
+
+
+def block_key_list(lens: Lens) -> List[Tuple]:
+    """重複の候補を絞り込むためのキー(同じキーを持つレンズ同士だけを比べる)"""
+    output: List[Tuple] = [('spec', lens.mount, normalize_search_text(lens.maker), lens.wide_focal_length,
+                            lens.telephoto_focal_length, round(lens.wide_f_number, 1),
+                            round(lens.telephoto_f_number, 1))]
+    product_number = normalize_product_number(lens.product_number)
+    if product_number != '':
+        output.append(('product_number', lens.mount, normalize_search_text(lens.maker), product_number))
+    return output
+
+
+def find_candidate_pair_set(lens_list: List[Lens], name_list: List[str]) -> Set[Tuple[int, int]]:
+    """重複の候補となる、レンズの位置の組(小さい方が先)の一覧"""
+    block: Dict[Tuple, List[int]] = defaultdict(list)
+    for i, lens in enumerate(lens_list):
+        for key in block_key_list(lens):
+            block[key].append(i)
+
+    output: Set[Tuple[int, int]] = set()
+    for index_list in block.values():
+        if len(index_list) <= 1:
+            continue
+        if len(index_list) <= MAX_BLOCK_SIZE:
+            for j in range(len(index_list)):
+                for k in range(j + 1, len(index_list)):
+                    output.add((index_list[j], index_list[k]))
+        else:
+            # 大きなブロックは、名前順に並べて近いものだけを比べる(件数に比例する回数で済む)
+            index_list = sorted(index_list, key=lambda x: name_list[x])
+            for j in range(len(index_list)):
+                for k in range(j + 1, min(j + 1 + WINDOW_SIZE, len(index_list))):
+                    a, b = index_list[j], index_list[k]
+                    output.add((a, b) if a < b else (b, a))
+    return output
+
+
+def find_duplicate_list(lens_list: List[Lens], merge_threshold: float = 0.9,
+                        flag_threshold: float = 0.75) -> Tuple[List[ScoredPair], List[ScoredPair]]:
+    """重複しているレンズの組を探す
+
+    同じメーカー・マウントで、正規化した型番が一致するか、名前がよく似ている(類似度が閾値以上)レンズの組を重複とみなす。
+    ただし、双方に型番があってそれが異なる場合は、別の製品(改良版など)の可能性があるので、要確認として返すに留める。
+
+    Parameters
+    ----------
+    lens_list: List[Lens]
+        レンズ一覧
+    merge_threshold: float
+        この類似度以上なら重複とみなす
+    flag_threshold: float
+        この類似度以上なら要確認とする
+
+    Returns
+    -------
+        (重複しているレンズの位置の組と類似度の一覧, 要確認のレンズの位置の組と類似度の一覧)
+    """
+    name_list = [normalize_lens_name(x) for x in lens_list]
+    product_number_list = [normalize_product_number(x.product_number) for x in lens_list]
+    duplicate_list: List[ScoredPair] = []
+    flag_list: List[ScoredPair] = []
+    matcher = SequenceMatcher(autojunk=False)
+    for a, b in sorted(find_candidate_pair_set(lens_list, name_list)):
+        if lens_list[a].mount != lens_list[b].mount:
+            continue
+        pn_a, pn_b = product_number_list[a], product_number_list[b]
+        if pn_a != '' and pn_a == pn_b:
+            duplicate_list.append((a, b, 1.0))
+            continue
+        if name_list[a] == name_list[b]:
+            score = 1.0
+        else:
+            # 安価な上限値で足切りしてから、類似度を求める
+            matcher.set_seqs(name_list[a], name_list[b])
+            if matcher.real_quick_ratio() < flag_threshold or matcher.quick_ratio() < flag_threshold:
+                continue
+            score = matcher.ratio()
+        if score < flag_threshold:
+            continue
+        if score >= merge_threshold and (pn_a == '' or pn_b == ''):
+            duplicate_list.append((a, b, score))
+        else:
+            flag_list.append((a, b, score))
+    return duplicate_list, flag_list
+
+
+def deduplicate(lens_list: List[Lens], merge_threshold: float = 0.9,
+                flag_threshold: float = 0.75) -> Tuple[List[Lens], List[Tuple[Lens, Lens, float]]]:
+    """重複しているレンズを1つにまとめる
+
+    重複の組をつないだグループごとに、最初に現れたレンズを残し、その空の項目を後のレンズの値で補う。
+    異なる型番を持つレンズは、同じグループにしない。
+
+    Returns
+    -------
+        (重複をまとめたレンズ一覧(元の順序を保つ), 要確認のレンズの組と類似度の一覧)
+    """
+    duplicate_list, flag_list = find_duplicate_list(lens_list, merge_threshold, flag_threshold)
+
+    # Union-Findでグループにまとめる(代表は位置の最も小さいもの)。
+    # 型番の無いレンズを介して、異なる型番を持つレンズ同士がつながらないよう、類似度の高い組から順にまとめる
+    parent = list(range(len(lens_list)))
+    group_product_number = [normalize_product_number(x.product_number) for x in lens_list]
+
+    def find(x: int) -> int:
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b, _ in sorted(duplicate_list, key=lambda x: -x[2]):
+        root_a, root_b = find(a), find(b)
+        if root_a == root_b:
+            continue
+        pn_a, pn_b = group_product_number[root_a], group_product_number[root_b]
+        if pn_a != '' and pn_b != '' and pn_a != pn_b:
+            continue
+        root, child = min(root_a, root_b), max(root_a, root_b)
+        parent[child] = root
+        group_product_number[root] = pn_a or pn_b
+
+    group: Dict[int, List[int]] = defaultdict(list)
+    for i in range(len(lens_list)):
+        group[find(i)].append(i)
+    output: List[Lens] = []
+    for i, lens in enumerate(lens_list):
+        if find(i) != i:
+            continue
+        update: Dict[str, any] = {}
+        for field in MERGE_FIELD_LIST:
+            if getattr(lens, field) not in ['', 0]:
+                continue
+            for j in group[i][1:]:
+                value = getattr(lens_list[j], field)
+                if value not in ['', 0]:
+                    update[field] = value
+                    break
+        output.append(replace(lens, **update) if len(update) > 0 else lens)
+    return output, [(lens_list[a], lens_list[b], score) for a, b, score in flag_list]
+
+
+def write_flag_list(flag_list: List[Tuple[Lens, Lens, float]],
+                    path: str = POSSIBLE_DUPLICATE_PATH) -> List[Tuple[Lens, Lens, float]]:
+    """要確認のレンズの組を、類似度の高い順にTSVファイルへ書き出す
+
+    Returns
+    -------
+        類似度の高い順に並べた、要確認のレンズの組と類似度の一覧
+    """
+    output = sorted(flag_list, key=lambda x: -x[2])
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('score\tmaker1\tname1\tproduct_number1\tmaker2\tname2\tproduct_number2\n')
+        for lens1, lens2, score in output:
+            f.write(f'{score:.3f}\t{lens1.maker}\t{lens1.name}\t{lens1.product_number}\t'
+                    f'{lens2.maker}\t{lens2.name}\t{lens2.product_number}\n')
+    return output
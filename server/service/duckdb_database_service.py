@@ -0,0 +1,88 @@
+from typing import List, Dict, Iterable
+
+from service.i_database_service import IDataBaseService
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+
+class DuckDbDataBaseService(IDataBaseService):
+    """DuckDB(列指向)のデータベース。集計など、全行を走査する分析用
+
+    duckdbパッケージは必須ではないので、使うときだけ別途インストールすること(pip install duckdb)。
+    SQLite固有の機能(FTS5・生成列・PRAGMA)は使えないため、dialectで区別する。
+    テーブルはParquetファイルとの間で読み書きできる。
+    """
+    dialect = 'duckdb'
+
+    def __init__(self, database_file_path: str = ':memory:', **kwargs):
+        super().__init__(**kwargs)
+        if duckdb is None:
+            raise ValueError('DuckDBを使うには、duckdbパッケージをインストールしてください.')
+        self.db_file_path = database_file_path
+        # DuckDBはファイルを排他的に開くので、接続は1つを使い回す
+        self.conn = duckdb.connect(database_file_path)
+
+    def select(self, query: str, parameter=()) -> List[Dict[str, any]]:
+        cur = self.conn.cursor()
+        try:
+            cur.execute(query, list(parameter))
+            columns = [description[0] for description in cur.description]
+            return [dict(zip(columns, row)) for row in cur.fetchall()]
+        finally:
+            cur.close()
+
+    def query(self, query: str, parameter=()) -> None:
+        self.many_query([query], [parameter])
+
+    def many_query(self, query: List[str], parameter=None) -> None:
+        if parameter is None:
+            parameter = []
+            for _ in range(0, len(query)):
+                parameter.append(())
+        if len(query) != len(parameter):
+            raise ValueError(f'クエリ({len(query)}件)とパラメーター({len(parameter)}件)の数が一致しません.')
+        cur = self.conn.cursor()
+        try:
+            cur.execute('BEGIN TRANSACTION')
+            try:
+                for q, p in zip(query, parameter):
+                    cur.execute(q, list(p))
+            except Exception:
+                cur.execute('ROLLBACK')
+                raise
+            cur.execute('COMMIT')
+        finally:
+            cur.close()
+
+    def bulk_query(self, query: List[str], parameter: List[Iterable[any]]) -> None:
+        if len(query) != len(parameter):
+            raise ValueError(f'クエリ({len(query)}件)とパラメーター({len(parameter)}件)の数が一致しません.')
+        cur = self.conn.cursor()
+        try:
+            cur.execute('BEGIN TRANSACTION')
+            try:
+                for q, p in zip(query, parameter):
+                    temp = [list(x) for x in p]
+                    if len(temp) > 0:
+                        cur.executemany(q, temp)
+            except Exception:
+                cur.execute('ROLLBACK')
+                raise
+            cur.execute('COMMIT')
+        finally:
+            cur.close()
+
+    def import_parquet(self, table: str, path: str) -> None:
+        """Parquetファイルの内容でテーブルを作り直す"""
+        self.many_query([f'DROP TABLE IF EXISTS {table}',
+                         f'CREATE TABLE {table} AS SELECT * FROM read_parquet(?)'], [(), (path,)])
+
+    def export_parquet(self, table: str, path: str) -> None:
+        """テーブルの内容をParquetファイルに書き出す"""
+        self.conn.execute(f"COPY {table} TO '{path.replace(chr(39), chr(39) * 2)}' (FORMAT PARQUET)")
+
+    def close(self) -> None:
+        self.conn.close()
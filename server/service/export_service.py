@@ -0,0 +1,80 @@
+import json
+import os
+from typing import List, Dict
+
+from constant import Lens
+from service.catalogue_version_service import CatalogueVersionService
+from service.columnar_service import write_columnar
+from service.facet_service import FacetService
+from service.lens_index_service import LensIndex, MOUNT_SLUG
+from service.query_cache_service import parse_query_string
+from service.skyline_service import SKYLINE_PRESET_LIST, calc_skyline
+
+
+def export_lens_data(lens_list: List[Lens], path: str = 'lens_data.json') -> None:
+    """Webアプリが読み込むレンズデータを書き出す"""
+    with open(path, 'w') as f:
+        f.write(Lens.schema().dumps(lens_list, many=True))
+
+
+def export_columnar_lens_data(lens_list: List[Lens], path: str = 'lens_data.mftc') -> None:
+    """レンズデータを列指向バイナリ形式で書き出す(形式はservice/columnar_service.pyを参照)"""
+    write_columnar(lens_list, path)
+
+
+def export_skyline_data(lens_list: List[Lens], path: str = 'skyline_data.json') -> None:
+    """事前定義したスカイラインを、マウントごとに計算して書き出す
+
+    出力は「プリセット名 → {dimension: 比較する項目, mount: {マウント名: レンズIDの一覧}}」の形式。
+    """
+    mount_list = sorted(set([x.mount for x in lens_list]))
+    output: Dict[str, Dict[str, any]] = {}
+    for name, dimension in SKYLINE_PRESET_LIST.items():
+        output[name] = {
+            'dimension': dimension,
+            'mount': {
+                mount: [x.id for x in calc_skyline([y for y in lens_list if y.mount == mount], dimension)]
+                for mount in mount_list
+            },
+        }
+    with open(path, 'w') as f:
+        json.dump(output, f, ensure_ascii=False)
+
+
+def export_sharded_lens_data(lens_list: List[Lens], directory: str = '.') -> None:
+    """レンズデータをマウントごとに分けて書き出し、絞り込み用の索引(lens_index.json)も書き出す
+
+    各シャードのレンズは索引での位置の順に並んでおり、シャード内のi番目のレンズの位置は start + i となる。
+    """
+    index = LensIndex(lens_list)
+    shard_path: Dict[str, str] = {}
+    for mount, (start, end) in index.mount_range.items():
+        shard_path[mount] = f'lens_data_{MOUNT_SLUG.get(mount, mount)}.json'
+        with open(os.path.join(directory, shard_path[mount]), 'w') as f:
+            f.write(Lens.schema().dumps(index.lens_list[start:end], many=True))
+    with open(os.path.join(directory, 'lens_index.json'), 'w') as f:
+        json.dump(index.to_dict(shard_path), f, ensure_ascii=False, separators=(',', ':'))
+
+
+def export_facet_data(lens_list: List[Lens], path: str = 'facet_data.json') -> None:
+    """項目ごとの値(区間)のレンズ数を、全レンズとマウントごとに書き出す(形式は FacetService.to_dict を参照)"""
+    with open(path, 'w') as f:
+        json.dump(FacetService(lens_list).to_dict(), f, ensure_ascii=False, separators=(',', ':'))
+
+
+def export_query_cache(lens_list: List[Lens], key_list: List[str], path: str = 'query_cache.json') -> None:
+    """共有URLのクエリ(正規化したもの)ごとの、絞り込んだ結果のレンズIDの一覧を書き出す
+
+    出力は {version: 1, query: {正規化したクエリ文字列: レンズIDの一覧(IDの順)}} の形式。
+    """
+    facet = FacetService(lens_list)
+    output: Dict[str, List[int]] = {}
+    for key in key_list:
+        output[key] = sorted([x.id for x in facet.filter(parse_query_string(key))])
+    with open(path, 'w') as f:
+        json.dump({'version': 1, 'query': output}, f, ensure_ascii=False, separators=(',', ':'))
+
+
+def export_catalogue_version(lens_list: List[Lens], directory: str = 'catalogue') -> int:
+    """カタログを新しいバージョンとして登録し、前のバージョンからのパッチを書き出す"""
+    return CatalogueVersionService(directory).publish(lens_list)
@@ -0,0 +1,147 @@
+from typing import List, Dict, Tuple, Callable, Iterable
+
+import numpy
+
+from constant import Lens
+from service.lens_index_service import LensIndex, MOUNT_SLUG, bitset_to_mask
+
+# クエリタイプ(Webアプリの model/query/*.ts)ごとの、絞り込んだ結果を表すビット集合を求める関数。
+# 条件はWebアプリの filter と同じ(値の単位もレンズデータと同じ)
+QUERY_TYPE_MAP: Dict[str, Callable[[LensIndex, float], int]] = {
+    'MaxWideFocalLength': lambda index, value: index.range_bitset('wide_focal_length', high=value),
+    'MinTelephotoFocalLength': lambda index, value: index.range_bitset('telephoto_focal_length', low=value),
+    'MaxWideFNumber': lambda index, value: index.range_bitset('wide_f_number', high=value),
+    'MaxTelephotoFNumber': lambda index, value: index.range_bitset('telephoto_f_number', high=value),
+    'MaxWideMinFocusDistance': lambda index, value: index.range_bitset('wide_min_focus_distance', high=value),
+    'MaxTelephotoMinFocusDistance': lambda index, value: index.range_bitset('telephoto_min_focus_distance',
+                                                                           high=value),
+    'MinMaxPhotographingMagnification': lambda index, value: index.range_bitset('max_photographing_magnification',
+                                                                               low=value),
+    'FilterDiameter': lambda index, value: index.range_bitset('filter_diameter', value, value),
+    'IsLensFilter': lambda index, value: index.boolean['is_lens_filter'],
+    'IsDripProof': lambda index, value: index.boolean['is_drip_proof'],
+    'HasImageStabilization': lambda index, value: index.boolean['has_image_stabilization'],
+    'IsInnerZoom': lambda index, value: index.boolean['is_inner_zoom'],
+    'IsPrime': lambda index, value: index.boolean['is_prime'],
+    'IsZoom': lambda index, value: index.boolean['is_zoom'],
+    'MaxOverallDiameter': lambda index, value: index.range_bitset('overall_diameter', high=value),
+    'MaxOverallLength': lambda index, value: index.range_bitset('overall_length', high=value),
+    'MaxWeight': lambda index, value: index.range_bitset('weight', high=value),
+    'MaxPrice': lambda index, value: index.range_bitset('price', high=value),
+    'FocalLengthRange': lambda index, value: index.range_bitset('focal_length_ratio', low=value),
+    'IsMicroFourThirds': lambda index, value: index.mount_bitset('マイクロフォーサーズ'),
+    'IsLeicaL': lambda index, value: index.mount_bitset('ライカL'),
+}
+
+# 値ごとに数える項目
+FACET_CATEGORY_LIST = ['maker', 'mount', 'filter_diameter']
+
+# 区間ごとに数える項目と、区間の境界(「下限以上・次の境界未満」を1区間とし、最後の区間は上限なし)。
+# 最初の境界より小さい値(価格の0=不明など)は unknown として数える
+FACET_BUCKET_MAP: Dict[str, List[float]] = {
+    'wide_focal_length': [0, 10, 14, 18, 25, 35, 50, 85, 135, 200, 300],
+    'telephoto_focal_length': [0, 10, 14, 18, 25, 35, 50, 85, 135, 200, 300],
+    'wide_f_number': [0, 1.4, 2, 2.8, 4, 5.6, 8],
+    'telephoto_f_number': [0, 1.4, 2, 2.8, 4, 5.6, 8],
+    'weight': [0, 100, 200, 300, 500, 750, 1000, 1500],
+    'price': [1, 50000, 100000, 150000, 200000, 300000, 500000],
+}
+
+# 絞り込みの条件(クエリタイプ名, 値)
+Query = Tuple[str, float]
+
+
+def format_number(value: float) -> str:
+    """区間の名前に使う数値の表記(整数なら小数点以下を付けない)"""
+    return str(int(value)) if float(value).is_integer() else str(value)
+
+
+def bucket_label_list(edge_list: List[float]) -> List[str]:
+    """区間の名前の一覧(「下限-上限」。最後は「下限-」、最初の境界より小さい値は unknown)"""
+    output = ['unknown'] if edge_list[0] > 0 else []
+    for i, low in enumerate(edge_list):
+        high = format_number(edge_list[i + 1]) if i + 1 < len(edge_list) else ''
+        output.append(f'{format_number(low)}-{high}')
+    return output
+
+
+class FacetService:
+    """絞り込み条件ごとに、各項目の値(区間)のレンズ数(ファセット)を数える
+
+    絞り込みは LensIndex のビット集合の論理積で行い、項目ごとの数は、各レンズの値(区間)の番号の配列から
+    絞り込んだ位置だけを取り出して numpy.bincount で数える。どちらも件数に比例する1回の配列演算なので、
+    問い合わせのたびに数え直しても軽い。
+    「ある値の数」は、今の条件にその値での絞り込みを加えたときに残るレンズの数を表す。
+    """
+
+    def __init__(self, lens_list: List[Lens]):
+        self.index = LensIndex(lens_list)
+        self.size = len(self.index.lens_list)
+
+        # 項目ごとの、値(区間)の名前の一覧と、位置ごとの値(区間)の番号
+        self.code: Dict[str, Tuple[List[str], numpy.ndarray]] = {}
+        for field in FACET_CATEGORY_LIST:
+            value_list, code_list = numpy.unique(numpy.array([getattr(x, field) for x in self.index.lens_list]),
+                                                 return_inverse=True)
+            self.code[field] = ([format_number(x) if field == 'filter_diameter' else str(x) for x in value_list],
+                                code_list)
+        for field, edge_list in FACET_BUCKET_MAP.items():
+            value_list = numpy.array([getattr(x, field) for x in self.index.lens_list], dtype=float)
+            code_list = numpy.searchsorted(numpy.array(edge_list, dtype=float), value_list, side='right')
+            if edge_list[0] <= 0:
+                # unknown の区間が無いので、番号を詰める
+                code_list = numpy.maximum(code_list - 1, 0)
+            self.code[field] = (bucket_label_list(edge_list), code_list)
+
+        # 真偽値の項目の、位置ごとの値
+        self.flag: Dict[str, numpy.ndarray] = {
+            field: bitset_to_mask(bitset, self.size) for field, bitset in self.index.boolean.items()
+        }
+
+    def filter_bitset(self, query_list: Iterable[Query] = ()) -> int:
+        """絞り込んだ結果を表すビット集合(条件が無ければ全てのレンズ)"""
+        bitset = (1 << self.size) - 1
+        for query_type, value in query_list:
+            if query_type not in QUERY_TYPE_MAP:
+                raise ValueError(f'未知のクエリタイプです({query_type}).')
+            bitset &= QUERY_TYPE_MAP[query_type](self.index, value)
+        return bitset
+
+    def filter(self, query_list: Iterable[Query] = ()) -> List[Lens]:
+        """絞り込んだ結果のレンズ一覧(マウント・IDの順)"""
+        return self.index.to_lens_list(self.filter_bitset(query_list))
+
+    def count(self, query_list: Iterable[Query] = ()) -> Dict[str, any]:
+        """絞り込んだ結果の、項目ごとの値(区間)のレンズ数
+
+        Returns
+        -------
+            {'count': 絞り込んだ結果の件数, 'facet': {項目名: {値(区間)の名前: レンズ数}},
+             'flag': {真偽値の項目名: 真であるレンズ数}}
+        """
+        return self.count_bitset(self.filter_bitset(query_list))
+
+    def count_bitset(self, bitset: int) -> Dict[str, any]:
+        """ビット集合で表したレンズの、項目ごとの値(区間)のレンズ数(形式は count と同じ)"""
+        mask = bitset_to_mask(bitset, self.size)
+        facet: Dict[str, Dict[str, int]] = {}
+        for field, (label_list, code_list) in self.code.items():
+            count_list = numpy.bincount(code_list[mask], minlength=len(label_list))
+            facet[field] = {label: int(count) for label, count in zip(label_list, count_list)}
+        return {
+            'count': int(numpy.count_nonzero(mask)),
+            'facet': facet,
+            'flag': {field: int(numpy.count_nonzero(flag & mask)) for field, flag in self.flag.items()},
+        }
+
+    def to_dict(self) -> Dict[str, any]:
+        """書き出し用の辞書(全レンズと、マウントごとのファセット)"""
+        return {
+            'version': 1,
+            'bucket': FACET_BUCKET_MAP,
+            'all': self.count(),
+            'mount': {
+                MOUNT_SLUG.get(mount, mount): self.count_bitset(self.index.mount_bitset(mount))
+                for mount in self.index.mount_range.keys()
+            },
+        }
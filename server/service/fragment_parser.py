@@ -0,0 +1,98 @@
+from typing import List, Optional, Tuple, Iterator
+
+from lxml import etree, html
+
+# 一度にパーサーへ渡す文字数
+CHUNK_SIZE = 16 * 1024
+
+# 単純セレクター(タグ名, クラス名の一覧, ID)。タグ名・IDが空なら制限しない
+SimpleSelector = Tuple[str, List[str], str]
+
+
+def parse_selector(selector: str) -> List[SimpleSelector]:
+    """「tag」「tag.class」「.class」「tag#id」と、それらをカンマで並べたセレクターを解析する"""
+    output: List[SimpleSelector] = []
+    for part in selector.split(','):
+        part = part.strip()
+        if part == '' or any([x in part for x in ' >+~[:']):
+            raise ValueError(f'対応していないセレクターです({selector}).')
+        element_id = ''
+        if '#' in part:
+            part, element_id = part.split('#', 1)
+        token_list = part.split('.')
+        output.append((token_list[0].lower(), [x for x in token_list[1:] if x != ''], element_id))
+    return output
+
+
+def is_match(element: etree.ElementBase, selector_list: List[SimpleSelector]) -> bool:
+    if not isinstance(element.tag, str):
+        # コメントなど
+        return False
+    for tag, class_list, element_id in selector_list:
+        if tag != '' and element.tag.lower() != tag:
+            continue
+        if element_id != '' and element.get('id') != element_id:
+            continue
+        if len(class_list) > 0:
+            element_class_list = (element.get('class') or '').split()
+            if not all([x in element_class_list for x in class_list]):
+                continue
+        return True
+    return False
+
+
+def parse_fragment(text: str, selector: str, first: bool = True) -> Optional[str]:
+    """HTMLを先頭から少しずつパースし、セレクターに合う要素だけをHTMLの断片として取り出す
+
+    ページ全体のDOMを作らずに済むよう、パースし終えた要素のうち、取り出す要素の外にあるものは中身を捨てていく。
+    first がTrueなら、最初に合った要素が閉じた時点でパースを打ち切る。
+    first がFalseなら、合った要素(他の合った要素の中にあるものを除く)を文書の順に全て集め、1つのdivに並べて返す。
+
+    Parameters
+    ----------
+    text: str
+        ページのHTML
+    selector: str
+        セレクター(対応する形式は parse_selector を参照)
+    first: bool
+        最初に合った要素だけを取り出すか
+
+    Returns
+    -------
+        取り出した要素のHTML(合う要素が無ければNone)
+    """
+    selector_list = parse_selector(selector)
+    parser = etree.HTMLPullParser(events=('start', 'end'))
+    target: Optional[etree.ElementBase] = None
+    fragment_list: List[str] = []
+    for event, element in iter_event(parser, text):
+        if event == 'start':
+            if target is None and is_match(element, selector_list):
+                target = element
+            continue
+        if target is not None:
+            if element is not target:
+                # 取り出す要素の中身なので、まだ捨てない
+                continue
+            fragment_list.append(html.tostring(element, encoding='unicode', with_tail=False))
+            if first:
+                return fragment_list[0]
+            target = None
+        # 取り出す要素の外で閉じた要素は、中身と、それより前の兄弟要素を捨てる
+        element.clear(keep_tail=False)
+        parent = element.getparent()
+        if parent is not None:
+            while element.getprevious() is not None:
+                del parent[0]
+    if len(fragment_list) == 0:
+        return None
+    return '<div>' + ''.join(fragment_list) + '</div>'
+
+
+def iter_event(parser: etree.HTMLPullParser, text: str) -> Iterator[Tuple[str, etree.ElementBase]]:
+    """HTMLを CHUNK_SIZE 文字ずつパーサーに渡し、パースのイベントを返す(呼び出し側が止めれば、残りはパースしない)"""
+    for offset in range(0, len(text), CHUNK_SIZE):
+        parser.feed(text[offset:offset + CHUNK_SIZE])
+        yield from parser.read_events()
+    parser.close()
+    yield from parser.read_events()
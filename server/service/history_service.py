@@ -0,0 +1,141 @@
+import time
+from dataclasses import fields
+from typing import List, Dict, Tuple, Optional
+
+from constant import Lens
+from service.i_database_service import IDataBaseService
+from service.ulitity import lens_key, make_lens_key
+
+# 履歴を記録する項目(IDはビルドごとに振り直され、メーカー名・マウント・型番はキーなので除く)
+HISTORY_FIELD_LIST = [x.name for x in fields(Lens) if x.name not in ['id', 'maker', 'mount', 'product_number']]
+
+# カタログに存在するかどうかを表す疑似的な項目名(1なら存在、0なら削除された)
+EXISTS_FIELD = '_exists'
+
+
+class HistoryService:
+    """レンズの価格・スペックの変更履歴(追記のみ)
+
+    ビルドごとに全行を保存するのではなく、前回から値が変わった項目だけを記録する。
+    各項目の最新値は lens_history_latest に持っておき、差分の判定に使う。
+    レンズは、メーカー名・マウント・型番(無い場合はレンズ名)で対応付ける(キーは make_lens_key と同じ)。
+    """
+
+    def __init__(self, database: IDataBaseService):
+        self.database = database
+        self.database.many_query([
+            'CREATE TABLE IF NOT EXISTS lens_history ('  # 変更履歴
+            'id INTEGER PRIMARY KEY,'                    # ID
+            'maker TEXT,'                                # メーカー名
+            'mount TEXT,'                                # レンズマウント
+            'product_number TEXT,'                       # 型番(無い場合はレンズ名)
+            'field TEXT,'                                # 項目名
+            'value,'                                     # 変更後の値
+            'recorded_at INTEGER)',                      # 記録日時(UNIX時間)
+            'CREATE INDEX IF NOT EXISTS lens_history_lens '
+            'ON lens_history (maker, mount, product_number, field, recorded_at)',
+            'CREATE INDEX IF NOT EXISTS lens_history_recorded_at ON lens_history (recorded_at)',
+            'CREATE TABLE IF NOT EXISTS lens_history_latest ('  # 各項目の最新値
+            'maker TEXT,'
+            'mount TEXT,'
+            'product_number TEXT,'
+            'field TEXT,'
+            'value,'
+            'PRIMARY KEY (maker, mount, product_number, field))',
+        ])
+
+    def record(self, lens_list: List[Lens], recorded_at: Optional[int] = None) -> int:
+        """ビルド結果を、前回からの変更分だけまとめて記録する
+
+        Parameters
+        ----------
+        lens_list: List[Lens]
+            今回のビルドで得られたレンズ一覧
+        recorded_at: Optional[int]
+            記録日時(UNIX時間)。省略時は現在時刻
+
+        Returns
+        -------
+            記録した変更の件数
+        """
+        if recorded_at is None:
+            recorded_at = int(time.time())
+
+        # (レンズのキー, 項目名) → 最新値と、レンズのキー → (メーカー名, マウント, 型番)
+        latest: Dict[Tuple[str, str], any] = {}
+        identity: Dict[str, Tuple[str, str, str]] = {}
+        for record in self.database.select('SELECT maker, mount, product_number, field, value '
+                                           'FROM lens_history_latest'):
+            key = make_lens_key(record['maker'], record['mount'], record['product_number'], '')
+            latest[(key, record['field'])] = record['value']
+            identity[key] = (record['maker'], record['mount'], record['product_number'])
+
+        # 値の変わった項目を集める
+        change_list: List[Tuple[Tuple[str, str, str], str, any]] = []
+        key_set = set()
+        for lens in lens_list:
+            key = lens_key(lens)
+            lens_identity = (lens.maker, lens.mount, lens.product_number or lens.name)
+            key_set.add(key)
+            if latest.get((key, EXISTS_FIELD)) != 1:
+                change_list.append((lens_identity, EXISTS_FIELD, 1))
+            for field in HISTORY_FIELD_LIST:
+                value = getattr(lens, field)
+                if (key, field) not in latest or latest[(key, field)] != value:
+                    change_list.append((lens_identity, field, value))
+
+        # 今回のビルドに無かったレンズは削除されたものとする
+        for (key, field), value in latest.items():
+            if field == EXISTS_FIELD and value == 1 and key not in key_set:
+                change_list.append((identity[key], EXISTS_FIELD, 0))
+
+        if len(change_list) == 0:
+            return 0
+        query: List[str] = []
+        parameter: List[any] = []
+        for (maker, mount, product_number), field, value in change_list:
+            query.append('INSERT INTO lens_history (maker, mount, product_number, field, value, recorded_at) '
+                         'VALUES (?, ?, ?, ?, ?, ?)')
+            parameter.append((maker, mount, product_number, field, value, recorded_at))
+            query.append('INSERT OR REPLACE INTO lens_history_latest (maker, mount, product_number, field, value) '
+                         'VALUES (?, ?, ?, ?, ?)')
+            parameter.append((maker, mount, product_number, field, value))
+        self.database.many_query(query, parameter)
+        return len(change_list)
+
+    def find_field_history(self, maker: str, product_number: str, field: str = 'price',
+                           since: Optional[int] = None, until: Optional[int] = None,
+                           mount: Optional[str] = None) -> List[Tuple[int, any]]:
+        """あるレンズの、ある項目の値の推移を返す
+
+        Parameters
+        ----------
+        maker: str
+            メーカー名
+        product_number: str
+            型番(無い場合はレンズ名)
+        field: str
+            項目名
+        since: Optional[int]
+            この日時(UNIX時間)以降の変更に限る
+        until: Optional[int]
+            この日時(UNIX時間)以前の変更に限る
+        mount: Optional[str]
+            レンズマウント(同じ型番のレンズを複数のマウント向けに出している場合に指定する)
+
+        Returns
+        -------
+            (記録日時, 値)の一覧。古い順
+        """
+        result = self.database.select('SELECT recorded_at, value FROM lens_history '
+                                      'WHERE maker=? AND product_number=? AND field=? AND (? IS NULL OR mount=?) '
+                                      'AND recorded_at >= ? AND recorded_at <= ? ORDER BY recorded_at, id',
+                                      (maker, product_number, field, mount, mount,
+                                       since if since is not None else 0,
+                                       until if until is not None else 2 ** 62))
+        return [(x['recorded_at'], x['value']) for x in result]
+
+    def find_changes_since(self, since: int) -> List[Dict[str, any]]:
+        """ある日時(UNIX時間)以降の全変更を、古い順に返す"""
+        return self.database.select('SELECT maker, mount, product_number, field, value, recorded_at FROM lens_history '
+                                    'WHERE recorded_at >= ? ORDER BY recorded_at, id', (since,))
@@ -0,0 +1,33 @@
+from abc import ABCMeta, abstractmethod
+from typing import List, Dict, Iterable
+
+
+class IAsyncDataBaseService(metaclass=ABCMeta):
+    """IDataBaseService の非同期版(asyncioのイベントループから await で呼び出す)"""
+    # SQLの方言(IDataBaseService.dialect と同じ)
+    dialect = 'sqlite'
+
+    @abstractmethod
+    async def select(self, query: str, parameter=()) -> List[Dict[str, any]]:
+        pass
+
+    async def query(self, query: str, parameter=()) -> None:
+        await self.many_query([query], [parameter])
+
+    @abstractmethod
+    async def many_query(self, query: List[str], parameter=None) -> None:
+        pass
+
+    @abstractmethod
+    async def bulk_query(self, query: List[str], parameter: List[Iterable[any]]) -> None:
+        pass
+
+    @abstractmethod
+    async def close(self) -> None:
+        pass
+
+    async def __aenter__(self) -> 'IAsyncDataBaseService':
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        await self.close()
@@ -1,8 +1,11 @@
 from abc import ABCMeta, abstractmethod
-from typing import List, Dict
+from typing import List, Dict, Iterable
 
 
 class IDataBaseService(metaclass=ABCMeta):
+    # SQLの方言(SQLite固有の機能(FTS5・生成列など)を使えるかどうかの判定に使う)
+    dialect = 'sqlite'
+
     @abstractmethod
     def __init__(self, **kwargs):
         pass
@@ -18,3 +21,17 @@ class IDataBaseService(metaclass=ABCMeta):
     @abstractmethod
     def many_query(self, query: List[str], parameter=None) -> None:
         pass
+
+    def bulk_query(self, query: List[str], parameter: List[Iterable[any]]) -> None:
+        """各クエリを、対応するパラメーターの一覧の件数分だけ実行する(全体で1トランザクション)
+
+        パラメーターの一覧にはイテレーターも渡せる(SQLiteでは、メモリに溜めずに順に書き込む)。
+        """
+        temp_query: List[str] = []
+        temp_parameter: List[any] = []
+        for q, p in zip(query, parameter):
+            # イテレーターは1度しか読めないので、クエリとパラメーターの両方に使う前にリストにする
+            p = list(p)
+            temp_query.extend([q for _ in p])
+            temp_parameter.extend(p)
+        self.many_query(temp_query, temp_parameter)
@@ -0,0 +1,17 @@
+from abc import ABCMeta, abstractmethod
+
+from constant import Lens
+
+
+class ILensListener(metaclass=ABCMeta):
+    """lensテーブルへの書き込みを受け取るためのインターフェース"""
+
+    @abstractmethod
+    def on_save(self, lens: Lens) -> None:
+        """レンズが追加・更新された際に呼ばれる(lens.idは採番済み)"""
+        pass
+
+    @abstractmethod
+    def on_delete_all(self) -> None:
+        """全レンズが削除された際に呼ばれる"""
+        pass
@@ -0,0 +1,138 @@
+import base64
+from typing import List, Dict, Tuple, Callable, Optional
+
+import numpy
+
+from constant import Lens
+
+# マウント名と、出力ファイル名などに使う短い名前
+MOUNT_SLUG: Dict[str, str] = {
+    'マイクロフォーサーズ': 'mft',
+    'ライカL': 'l',
+}
+
+# ビット集合として持つ真偽値の項目(Webアプリのboolean処理なクエリタイプに対応する)
+BOOLEAN_FIELD_LIST: Dict[str, Callable[[Lens], bool]] = {
+    'is_drip_proof': lambda x: x.is_drip_proof,
+    'has_image_stabilization': lambda x: x.has_image_stabilization,
+    'is_inner_zoom': lambda x: x.is_inner_zoom,
+    'is_prime': lambda x: x.wide_focal_length == x.telephoto_focal_length,
+    'is_zoom': lambda x: x.wide_focal_length != x.telephoto_focal_length,
+    'is_lens_filter': lambda x: x.filter_diameter >= 1,
+}
+
+# 値の順に並べた位置の一覧として持つ数値の項目
+NUMERIC_FIELD_LIST: Dict[str, Callable[[Lens], float]] = {
+    'wide_focal_length': lambda x: x.wide_focal_length,
+    'telephoto_focal_length': lambda x: x.telephoto_focal_length,
+    'focal_length_ratio': lambda x: x.telephoto_focal_length / x.wide_focal_length if x.wide_focal_length > 0 else 0,
+    'wide_f_number': lambda x: x.wide_f_number,
+    'telephoto_f_number': lambda x: x.telephoto_f_number,
+    'wide_min_focus_distance': lambda x: x.wide_min_focus_distance,
+    'telephoto_min_focus_distance': lambda x: x.telephoto_min_focus_distance,
+    'max_photographing_magnification': lambda x: x.max_photographing_magnification,
+    'filter_diameter': lambda x: x.filter_diameter,
+    'overall_diameter': lambda x: x.overall_diameter,
+    'overall_length': lambda x: x.overall_length,
+    'weight': lambda x: x.weight,
+    'price': lambda x: x.price,
+}
+
+
+class LensIndex:
+    """絞り込み用の索引
+
+    レンズを(マウント, ID)の順に並べ、その並び順(位置)を単位として、
+    真偽値の項目はビット集合(位置iのビットが立っていれば真)、
+    数値の項目は「値の昇順に並べた値の一覧」と「それに対応する位置の一覧」として持つ。
+    マウントごとのレンズは連続した位置を占めるので、マウントは位置の範囲で表せる。
+    """
+
+    def __init__(self, lens_list: List[Lens]):
+        self.lens_list = sorted(lens_list, key=lambda x: (x.mount, x.id))
+
+        # マウントごとの位置の範囲
+        self.mount_range: Dict[str, Tuple[int, int]] = {}
+        for i, lens in enumerate(self.lens_list):
+            start, _ = self.mount_range.get(lens.mount, (i, i))
+            self.mount_range[lens.mount] = (start, i + 1)
+
+        # 真偽値の項目
+        self.boolean: Dict[str, int] = {}
+        for field, func in BOOLEAN_FIELD_LIST.items():
+            self.boolean[field] = mask_to_bitset(numpy.array([func(x) for x in self.lens_list], dtype=bool))
+
+        # 数値の項目
+        self.numeric: Dict[str, Tuple[numpy.ndarray, numpy.ndarray]] = {}
+        for field, func in NUMERIC_FIELD_LIST.items():
+            value_list = numpy.array([func(x) for x in self.lens_list], dtype=float)
+            position_list = numpy.argsort(value_list, kind='stable')
+            self.numeric[field] = (value_list[position_list], position_list)
+
+    def mount_bitset(self, mount: str) -> int:
+        """指定したマウントのレンズを表すビット集合"""
+        if mount not in self.mount_range:
+            return 0
+        start, end = self.mount_range[mount]
+        return ((1 << (end - start)) - 1) << start
+
+    def range_bitset(self, field: str, low: Optional[float] = None, high: Optional[float] = None) -> int:
+        """数値の項目が low 以上 high 以下のレンズを表すビット集合(Noneの側は制限しない)"""
+        value_list, position_list = self.numeric[field]
+        start = 0 if low is None else numpy.searchsorted(value_list, low, side='left')
+        end = len(value_list) if high is None else numpy.searchsorted(value_list, high, side='right')
+        mask = numpy.zeros(len(self.lens_list), dtype=bool)
+        mask[position_list[start:end]] = True
+        return mask_to_bitset(mask)
+
+    def to_lens_list(self, bitset: int) -> List[Lens]:
+        """ビット集合をレンズ一覧に戻す"""
+        return [self.lens_list[x] for x in bitset_to_position_list(bitset, len(self.lens_list))]
+
+    def to_dict(self, shard_path: Dict[str, str]) -> Dict[str, any]:
+        """書き出し用の辞書に変換する(ビット集合は、リトルエンディアンのバイト列をBase64にしたもの)"""
+        return {
+            'version': 1,
+            'count': len(self.lens_list),
+            'shard': {
+                MOUNT_SLUG.get(mount, mount): {
+                    'mount': mount,
+                    'path': shard_path[mount],
+                    'start': start,
+                    'end': end,
+                } for mount, (start, end) in self.mount_range.items()
+            },
+            'boolean': {field: encode_bitset(bitset, len(self.lens_list)) for field, bitset in self.boolean.items()},
+            'numeric': {
+                field: {
+                    'value': value_list.tolist(),
+                    'position': position_list.tolist(),
+                } for field, (value_list, position_list) in self.numeric.items()
+            },
+        }
+
+
+def mask_to_bitset(mask: numpy.ndarray) -> int:
+    """真偽値の配列をビット集合(位置iの値が真ならiビット目が立った整数)に変換する"""
+    return int.from_bytes(numpy.packbits(mask, bitorder='little').tobytes(), 'little')
+
+
+def bitset_to_mask(bitset: int, size: int) -> numpy.ndarray:
+    """ビット集合を、長さ size の真偽値の配列に変換する"""
+    temp = numpy.frombuffer(bitset.to_bytes((size + 7) // 8, 'little'), dtype=numpy.uint8)
+    return numpy.unpackbits(temp, bitorder='little')[0:size].astype(bool)
+
+
+def bitset_to_position_list(bitset: int, size: int) -> List[int]:
+    """ビット集合から、立っているビットの位置の一覧を取り出す"""
+    return numpy.nonzero(bitset_to_mask(bitset, size))[0].tolist()
+
+
+def encode_bitset(bitset: int, size: int) -> str:
+    """ビット集合をBase64文字列に変換する"""
+    return base64.b64encode(bitset.to_bytes((size + 7) // 8, 'little')).decode('ascii')
+
+
+def decode_bitset(text: str) -> int:
+    """Base64文字列をビット集合に戻す"""
+    return int.from_bytes(base64.b64decode(text), 'little')
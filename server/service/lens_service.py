@@ -1,12 +1,37 @@
-from typing import List, Tuple
+from dataclasses import fields, replace
+from typing import List, Tuple, Dict, Optional, Callable, Iterable, Iterator
 
 from constant import Lens
 from service.i_database_service import IDataBaseService
+from service.i_lens_listener import ILensListener
+from service.ulitity import normalize_search_text
+
+# lensテーブルから読み出す列(lens_ftsとのJOIN時に列名が衝突しないよう、テーブル名で修飾している)
+LENS_COLUMNS = ', '.join([f'lens.{x.name}' for x in fields(Lens)])
+
+# 全文検索の対象とする列
+SEARCH_COLUMNS = ['name', 'maker', 'product_number']
+
+# lensテーブルの生成列(他の列から自動で計算され、インデックスが張られる)。列名 → (型, 計算式)
+DERIVED_COLUMNS: Dict[str, Tuple[str, str]] = {
+    # ズーム倍率(望遠端/広角端)
+    'zoom_ratio': ('REAL', 'CASE WHEN wide_focal_length > 0 '
+                           'THEN telephoto_focal_length * 1.0 / wide_focal_length ELSE 0 END'),
+    # 単焦点レンズなら1
+    'is_prime': ('INTEGER', 'CASE WHEN wide_focal_length = telephoto_focal_length THEN 1 ELSE 0 END'),
+    # 焦点距離の幅(mm)
+    'focal_span': ('INTEGER', 'telephoto_focal_length - wide_focal_length'),
+    # 開放F値がズーム全域で一定でないなら1
+    'has_variable_aperture': ('INTEGER', 'CASE WHEN wide_f_number <> telephoto_f_number THEN 1 ELSE 0 END'),
+    # 1gあたりの価格(円)。価格か重量が不明ならNULL
+    'price_per_gram': ('REAL', 'CASE WHEN price > 0 AND weight > 0 THEN price * 1.0 / weight ELSE NULL END'),
+}
 
 
 class LensService:
     def __init__(self, database: IDataBaseService):
         self.database = database
+        self.listeners: List[ILensListener] = []
         self.database.query(
             'CREATE TABLE IF NOT EXISTS lens ('       # レンズ定義
             'id INTEGER PRIMARY KEY,'                 # ID
@@ -30,20 +55,144 @@ class LensService:
             'price INTEGER,'                          # 定価(円)
             'mount TEXT)')                            # レンズマウント
 
+        # 生成列・全文検索はSQLite固有の機能なので、それ以外のデータベースでは使わずに済ませる
+        self.use_sqlite_feature = self.database.dialect == 'sqlite'
+        if not self.use_sqlite_feature:
+            return
+
+        # 生成列を足し、インデックスを張る(既存のデータベースにも後から追加できるよう、ALTER TABLEで足す)
+        column_list = [x['name'] for x in self.database.select('PRAGMA table_xinfo(lens)')]
+        query: List[str] = []
+        for column, (column_type, expression) in DERIVED_COLUMNS.items():
+            if column not in column_list:
+                query.append(f'ALTER TABLE lens ADD COLUMN {column} {column_type} '
+                             f'GENERATED ALWAYS AS ({expression}) VIRTUAL')
+            query.append(f'CREATE INDEX IF NOT EXISTS lens_{column} ON lens ({column})')
+        self.database.many_query(query)
+
+        # 全文検索用のインデックス(日本語のレンズ名にも対応するため、trigramで分割する)
+        result = self.database.select("SELECT name FROM sqlite_master WHERE type='table' AND name='lens_fts'")
+        self.database.query('CREATE VIRTUAL TABLE IF NOT EXISTS lens_fts USING fts5('
+                            'name, maker, product_number, tokenize=\'trigram\')')
+        if len(result) == 0:
+            self.rebuild_search_index()
+
+    def add_listener(self, listener: ILensListener) -> None:
+        """書き込みの通知先を登録する"""
+        self.listeners.append(listener)
+
     def get_data_count(self) -> int:
-        result = self.database.select('SELECT COUNT(*) FROM lens')
-        return result[0]['COUNT(*)']
+        result = self.database.select('SELECT COUNT(*) AS count FROM lens')
+        return result[0]['count']
 
     def find_all(self) -> List[Lens]:
-        result = self.database.select('SELECT id, maker, name, product_number,'
-                                      'wide_focal_length, telephoto_focal_length,'
-                                      'wide_f_number, telephoto_f_number,'
-                                      'wide_min_focus_distance,telephoto_min_focus_distance,'
-                                      'max_photographing_magnification, filter_diameter, '
-                                      'is_drip_proof, has_image_stabilization, is_inner_zoom, overall_diameter, '
-                                      'overall_length, weight, price, mount FROM lens ORDER BY id')
+        result = self.database.select(f'SELECT {LENS_COLUMNS} FROM lens ORDER BY id')
+        return [Lens.from_dict(x) for x in result]
+
+    def find_by_derived_range(self, column: str, low: Optional[float] = None,
+                              high: Optional[float] = None) -> List[Lens]:
+        """生成列の値が low 以上 high 以下のレンズを、インデックスを使って取得する
+
+        Parameters
+        ----------
+        column: str
+            生成列の名前(DERIVED_COLUMNSのキー)
+        low: Optional[float]
+            下限(Noneなら制限しない)
+        high: Optional[float]
+            上限(Noneなら制限しない)
+
+        Returns
+        -------
+            該当するレンズ一覧(ID順)
+        """
+        if column not in DERIVED_COLUMNS:
+            raise ValueError(f'{column}は生成列ではありません.')
+        # 生成列が無いデータベースでは、計算式をそのまま使う
+        target = f'lens.{column}' if self.use_sqlite_feature else f'({DERIVED_COLUMNS[column][1]})'
+        conditions: List[str] = [f'{target} IS NOT NULL']
+        parameter: List[any] = []
+        if low is not None:
+            conditions.append(f'{target} >= ?')
+            parameter.append(low)
+        if high is not None:
+            conditions.append(f'{target} <= ?')
+            parameter.append(high)
+        result = self.database.select(f'SELECT {LENS_COLUMNS} FROM lens '
+                                      f'WHERE {" AND ".join(conditions)} ORDER BY lens.id', parameter)
+        return [Lens.from_dict(x) for x in result]
+
+    def search(self, text: str, limit: int = 20) -> List[Lens]:
+        """レンズ名・メーカー名・型番の断片からレンズを検索する
+
+        空白で区切った各語をすべて含むレンズを、関連度の高い順に返す。
+        語頭に一致する語が多いものほど上位に来る(前方一致を優先する)。
+
+        Parameters
+        ----------
+        text: str
+            検索文字列(例：「NOKTON 25」「H-ES12060」)
+        limit: int
+            最大件数
+
+        Returns
+        -------
+            検索結果
+        """
+        words = normalize_search_text(text).split()
+        if len(words) == 0:
+            return []
+        if not self.use_sqlite_feature:
+            return self.search_without_index(words, limit)
+
+        # trigramは3文字未満の語を検索できないため、それらはLIKEで絞り込む
+        target = "(' ' || lens_fts.name || ' ' || lens_fts.maker || ' ' || lens_fts.product_number)"
+        long_words = [x for x in words if len(x) >= 3]
+        conditions: List[str] = []
+        parameter: List[any] = []
+        if len(long_words) > 0:
+            conditions.append('lens_fts MATCH ?')
+            parameter.append(' '.join(['"' + x.replace('"', '""') + '"' for x in long_words]))
+        for word in words:
+            if len(word) < 3:
+                conditions.append(f"{target} LIKE ? ESCAPE '\\'")
+                parameter.append('%' + escape_like(word) + '%')
+
+        # 語頭に一致した語の数 → BM25 の順に並べる
+        prefix_score = ' + '.join([f"({target} LIKE ? ESCAPE '\\')" for _ in words])
+        order = [f'({prefix_score}) DESC']
+        if len(long_words) > 0:
+            order.append('bm25(lens_fts, 5.0, 1.0, 3.0)')
+        order.append('lens.id')
+        parameter.extend(['% ' + escape_like(x) + '%' for x in words])
+        parameter.append(limit)
+
+        result = self.database.select(f'SELECT {LENS_COLUMNS} FROM lens_fts JOIN lens ON lens.id = lens_fts.rowid '
+                                      f'WHERE {" AND ".join(conditions)} '
+                                      f'ORDER BY {", ".join(order)} LIMIT ?', parameter)
+        return [Lens.from_dict(x) for x in result]
+
+    def search_without_index(self, words: List[str], limit: int) -> List[Lens]:
+        """全文検索用のインデックスを使わず、LIKEだけで検索する(SQLite以外のデータベース用)"""
+        target = "(' ' || lower(name) || ' ' || lower(maker) || ' ' || lower(product_number))"
+        conditions = [f"{target} LIKE ? ESCAPE '\\'" for _ in words]
+        prefix_score = ' + '.join([f"CASE WHEN {target} LIKE ? ESCAPE '\\' THEN 1 ELSE 0 END" for _ in words])
+        parameter: List[any] = ['%' + escape_like(x) + '%' for x in words]
+        parameter.extend(['% ' + escape_like(x) + '%' for x in words])
+        parameter.append(limit)
+        result = self.database.select(f'SELECT {LENS_COLUMNS} FROM lens WHERE {" AND ".join(conditions)} '
+                                      f'ORDER BY ({prefix_score}) DESC, lens.id LIMIT ?', parameter)
         return [Lens.from_dict(x) for x in result]
 
+    def rebuild_search_index(self) -> None:
+        """全文検索用のインデックスを、lensテーブルの内容から作り直す"""
+        query: List[str] = ['DELETE FROM lens_fts']
+        parameter: List[any] = [()]
+        for lens in self.find_all():
+            query.append(INSERT_SEARCH_INDEX_QUERY)
+            parameter.append(search_index_parameter(lens.id, lens))
+        self.database.many_query(query, parameter)
+
     def save(self, lens: Lens) -> None:
         lens_list = self.find_all()
         if len([x for x in lens_list if x.id == lens.id]) == 0:
@@ -55,13 +204,141 @@ class LensService:
                 temp2[index] = self.get_data_count() + 1
             temp3 = ','.join(temp1)
             temp4 = ','.join(['?' for _ in temp1])
-            self.database.query(f'INSERT INTO lens ({temp3}) VALUES ({temp4})', temp2)
+            lens_id = temp2[temp1.index('id')]
+            query: List[str] = [f'INSERT INTO lens ({temp3}) VALUES ({temp4})']
+            parameter: List[any] = [temp2]
+            if self.use_sqlite_feature:
+                query.append(INSERT_SEARCH_INDEX_QUERY)
+                parameter.append(search_index_parameter(lens_id, lens))
+            self.database.many_query(query, parameter)
+            for listener in self.listeners:
+                listener.on_save(replace(lens, id=lens_id))
         else:
             lens_items: List[Tuple[str, any]] = [x for x in lens.to_dict().items() if x[0] != 'id']
             temp1: List[str] = [f'{x[0]}=?' for x in lens_items]
             temp2: List[any] = [x[1] for x in lens_items]
             temp3 = ','.join(temp1)
-            self.database.query(f'UPDATE lens SET {temp3} WHERE id={lens.id}', temp2)
+            query: List[str] = [f'UPDATE lens SET {temp3} WHERE id={lens.id}']
+            parameter: List[any] = [temp2]
+            if self.use_sqlite_feature:
+                query.extend(['DELETE FROM lens_fts WHERE rowid=?', INSERT_SEARCH_INDEX_QUERY])
+                parameter.extend([(lens.id,), search_index_parameter(lens.id, lens)])
+            self.database.many_query(query, parameter)
+            for listener in self.listeners:
+                listener.on_save(lens)
+
+    def save_all(self, lens_list: List[Lens], replace_all: bool = False) -> List[int]:
+        """レンズをまとめて追加する(1トランザクション)
+
+        saveと違い既存の行の更新はせず、全件を新規に追加する。
+        IDが0のレンズには、現在の最大ID以降の番号を順に振る。
+
+        Parameters
+        ----------
+        lens_list: List[Lens]
+            追加するレンズ一覧
+        replace_all: bool
+            Trueなら、既存のレンズを全て削除してから追加する(削除と追加は同じトランザクションで行う)。
+            このときIDは、lens_listの順に1から振り直す
+
+        Returns
+        -------
+            追加したレンズのID一覧
+        """
+        if len(lens_list) == 0 and not replace_all:
+            return []
+        if replace_all:
+            next_id = 1
+        else:
+            next_id = self.database.select('SELECT COALESCE(MAX(id), 0) AS max_id FROM lens')[0]['max_id'] + 1
+        saved_list: List[Lens] = []
+        for lens in lens_list:
+            if lens.id == 0 or replace_all:
+                saved_list.append(replace(lens, id=next_id))
+                next_id += 1
+            else:
+                saved_list.append(lens)
+                next_id = max(next_id, lens.id + 1)
+
+        column_list = [x.name for x in fields(Lens)]
+        query: List[str] = []
+        parameter: List[List[any]] = []
+        if replace_all:
+            query.append('DELETE FROM lens')
+            parameter.append([()])
+            if self.use_sqlite_feature:
+                query.append('DELETE FROM lens_fts')
+                parameter.append([()])
+        query.append(f'INSERT INTO lens ({",".join(column_list)}) VALUES ({",".join(["?" for _ in column_list])})')
+        parameter.append([[getattr(x, c) for c in column_list] for x in saved_list])
+        if self.use_sqlite_feature:
+            query.append(INSERT_SEARCH_INDEX_QUERY)
+            parameter.append([search_index_parameter(x.id, x) for x in saved_list])
+        self.database.bulk_query(query, parameter)
+        if replace_all:
+            for listener in self.listeners:
+                listener.on_delete_all()
+        for lens in saved_list:
+            for listener in self.listeners:
+                listener.on_save(lens)
+        return [x.id for x in saved_list]
+
+    def bulk_load(self, lens_source: Callable[[], Iterable[Lens]]) -> int:
+        """大量のレンズを、メモリに溜めずに1トランザクションで追加する
+
+        lensテーブルと全文検索用インデックスへの書き込みで、lens_source を2回呼んで先頭から読み直す。
+        IDは現在の最大ID以降の番号を、読み込んだ順に振り直す。
+        件数が多いので、書き込みの通知先(listener)には通知しない。
+
+        Parameters
+        ----------
+        lens_source: Callable[[], Iterable[Lens]]
+            呼ぶたびに同じレンズの列を先頭から返す関数(ファイルを読み直す関数など)
+
+        Returns
+        -------
+            追加した件数
+        """
+        start_id = self.database.select('SELECT COALESCE(MAX(id), 0) AS max_id FROM lens')[0]['max_id'] + 1
+        column_list = [x.name for x in fields(Lens)]
+        count = 0
+
+        def iter_lens_parameter() -> Iterator[List[any]]:
+            nonlocal count
+            for i, lens in enumerate(lens_source()):
+                count = i + 1
+                yield [start_id + i if c == 'id' else getattr(lens, c) for c in column_list]
+
+        def iter_search_index_parameter() -> Iterator[List[any]]:
+            for i, lens in enumerate(lens_source()):
+                yield search_index_parameter(start_id + i, lens)
+
+        query: List[str] = [f'INSERT INTO lens ({",".join(column_list)}) '
+                            f'VALUES ({",".join(["?" for _ in column_list])})']
+        parameter: List[Iterable[List[any]]] = [iter_lens_parameter()]
+        if self.use_sqlite_feature:
+            query.append(INSERT_SEARCH_INDEX_QUERY)
+            parameter.append(iter_search_index_parameter())
+        self.database.bulk_query(query, parameter)
+        return count
 
     def delete_all(self) -> None:
-        self.database.query('DELETE FROM lens')
+        if self.use_sqlite_feature:
+            self.database.many_query(['DELETE FROM lens', 'DELETE FROM lens_fts'])
+        else:
+            self.database.query('DELETE FROM lens')
+        for listener in self.listeners:
+            listener.on_delete_all()
+
+
+INSERT_SEARCH_INDEX_QUERY = f'INSERT INTO lens_fts (rowid, {", ".join(SEARCH_COLUMNS)}) VALUES (?, ?, ?, ?)'
+
+
+def search_index_parameter(lens_id: int, lens: Lens) -> List[any]:
+    """全文検索用インデックスに書き込む値を作成する(表記揺れを吸収するため正規化しておく)"""
+    return [lens_id] + [normalize_search_text(str(getattr(lens, x))) for x in SEARCH_COLUMNS]
+
+
+def escape_like(text: str) -> str:
+    """LIKE句のワイルドカード文字をエスケープする"""
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
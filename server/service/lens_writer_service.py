@@ -0,0 +1,80 @@
+import queue
+import threading
+from typing import List, Optional, Callable
+
+# キューの終わりを表す値
+END_OF_QUEUE = None
+
+
+class LensWriter:
+    """スクレイピングしたレンズを、別スレッドでまとめてデータベースに書き込む
+
+    putしたレンズは上限付きのキューに入り、書き込み用のスレッドが batch_size 件ずつ
+    (または flush_interval 秒待っても溜まらなければその時点の分を)save_all(LensService.save_allなど)で書き込む。
+    キューが一杯のときはputが待たされるので、メモリ使用量はスクレイピングの件数によらず一定に保たれる。
+    書き込み用のスレッドで起きた例外は、次のputかcloseで呼び出し元に投げ直す。
+    """
+
+    def __init__(self, save_all: Callable[[List[any]], any], batch_size: int = 50, max_queue_size: int = 200,
+                 flush_interval: float = 1.0):
+        self.save_all = save_all
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: 'queue.Queue[any]' = queue.Queue(maxsize=max_queue_size)
+        self.error: Optional[BaseException] = None
+        self.count = 0
+        self.thread = threading.Thread(target=self.run, name='lens-writer', daemon=True)
+        self.thread.start()
+
+    def __enter__(self) -> 'LensWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        # 呼び出し元で例外が起きた場合は、そちらを優先して投げる
+        self.stop()
+        if exc_type is None:
+            self.raise_error()
+
+    def put(self, record: any) -> None:
+        """レンズ(save_allに渡す値)を書き込み待ちのキューに入れる"""
+        self.raise_error()
+        self.queue.put(record)
+
+    def close(self) -> None:
+        """キューに残ったレンズを書き込み終えるまで待つ"""
+        self.stop()
+        self.raise_error()
+
+    def stop(self) -> None:
+        if self.thread.is_alive():
+            self.queue.put(END_OF_QUEUE)
+            self.thread.join()
+
+    def raise_error(self) -> None:
+        if self.error is not None:
+            raise self.error
+
+    def run(self) -> None:
+        batch: List[any] = []
+        finished = False
+        while not finished:
+            try:
+                record = self.queue.get(timeout=self.flush_interval)
+                if record is END_OF_QUEUE:
+                    finished = True
+                else:
+                    batch.append(record)
+                    if len(batch) < self.batch_size:
+                        continue
+            except queue.Empty:
+                pass
+            if len(batch) == 0:
+                continue
+            # 書き込みに失敗した後も、putが詰まらないようキューは読み捨て続ける
+            if self.error is None:
+                try:
+                    self.save_all(batch)
+                    self.count += len(batch)
+                except BaseException as e:
+                    self.error = e
+            batch = []
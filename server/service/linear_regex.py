@@ -0,0 +1,349 @@
+import time
+from functools import lru_cache
+from typing import List, Tuple, Optional, Callable
+
+# 命令の種類
+CHAR = 0   # 1文字がarg1(文字の判定関数)に合えば次の命令へ
+SPLIT = 1  # arg1とarg2の両方へ分岐する(arg1を優先する)
+JUMP = 2   # arg1へ移る
+SAVE = 3   # 今の位置を、arg1番目の記録欄に記録する
+MATCH = 4  # マッチした
+
+# 期限を確かめる間隔(文字数)
+DEADLINE_CHECK_INTERVAL = 64
+
+# 文字の判定関数
+CharPredicate = Callable[[str], bool]
+
+# 構文木のノード。(種類, 値...)
+Node = Tuple
+
+
+class RegexBudgetExceeded(Exception):
+    """マッチングが、与えられた時間の予算内に終わらなかった"""
+    pass
+
+
+def is_digit(c: str) -> bool:
+    return c.isdecimal()
+
+
+def is_word(c: str) -> bool:
+    return c.isalnum() or c == '_'
+
+
+def is_space(c: str) -> bool:
+    return c.isspace()
+
+
+# \d・\w・\s と、その否定
+CLASS_ESCAPE_MAP = {
+    'd': (is_digit, False),
+    'D': (is_digit, True),
+    'w': (is_word, False),
+    'W': (is_word, True),
+    's': (is_space, False),
+    'S': (is_space, True),
+}
+
+
+class Parser:
+    """正規表現の構文解析器
+
+    対応する構文は、文字・エスケープ(\\d \\w \\s とその否定、記号)・文字クラス([...] [^...] 範囲 a-z)・
+    任意の1文字(.、改行以外)・* + ?(最長一致)・グループ((...) (?:...))・選択(|)。
+    後方参照・先読み・回数指定({m,n})など、線形時間で扱えない・使っていない構文はValueErrorにする。
+    """
+
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        self.position = 0
+        self.group_count = 0
+
+    def parse(self) -> Node:
+        node = self.parse_alternation()
+        if self.position < len(self.pattern):
+            raise self.error('対応する「(」がありません')
+        return node
+
+    def error(self, message: str) -> ValueError:
+        return ValueError(f'{message}({self.pattern!r}の{self.position}文字目).')
+
+    def peek(self) -> Optional[str]:
+        return self.pattern[self.position] if self.position < len(self.pattern) else None
+
+    def next(self) -> str:
+        c = self.pattern[self.position]
+        self.position += 1
+        return c
+
+    def parse_alternation(self) -> Node:
+        branch_list = [self.parse_concatenation()]
+        while self.peek() == '|':
+            self.next()
+            branch_list.append(self.parse_concatenation())
+        return ('alt', branch_list) if len(branch_list) > 1 else branch_list[0]
+
+    def parse_concatenation(self) -> Node:
+        item_list: List[Node] = []
+        while self.peek() is not None and self.peek() not in '|)':
+            item_list.append(self.parse_repeat())
+        return ('cat', item_list)
+
+    def parse_repeat(self) -> Node:
+        node = self.parse_atom()
+        while self.peek() is not None and self.peek() in '*+?{':
+            c = self.next()
+            if c == '{':
+                raise self.error('回数指定には対応していません')
+            if self.peek() in ['?', '+']:
+                raise self.error('最短一致・強欲な量指定子には対応していません')
+            node = ({'*': 'star', '+': 'plus', '?': 'quest'}[c], node)
+        return node
+
+    def parse_atom(self) -> Node:
+        c = self.next()
+        if c == '(':
+            if self.peek() == '?':
+                self.next()
+                if self.peek() != ':':
+                    raise self.error('先読み・名前付きグループなどには対応していません')
+                self.next()
+                node = self.parse_alternation()
+            else:
+                self.group_count += 1
+                index = self.group_count
+                node = ('group', index, self.parse_alternation())
+            if self.peek() != ')':
+                raise self.error('「)」がありません')
+            self.next()
+            return node
+        if c == '[':
+            return ('char', self.parse_class())
+        if c == '.':
+            return ('char', lambda x: x != '\n')
+        if c == '\\':
+            return ('char', self.parse_escape())
+        if c in '^$':
+            raise self.error('アンカーには対応していません')
+        if c in '*+?{':
+            raise self.error('量指定子の前に文字がありません')
+        return ('char', c)
+
+    def parse_escape(self) -> any:
+        """エスケープ(\\の次の文字)を、判定関数か1文字にする"""
+        if self.peek() is None:
+            raise self.error('「\\」で終わっています')
+        c = self.next()
+        if c in CLASS_ESCAPE_MAP:
+            func, negate = CLASS_ESCAPE_MAP[c]
+            return (lambda x: not func(x)) if negate else func
+        if c.isalnum():
+            raise self.error(f'\\{c}には対応していません')
+        return c
+
+    def parse_class(self) -> CharPredicate:
+        """文字クラス([の次から]まで)を判定関数にする"""
+        negate = False
+        if self.peek() == '^':
+            self.next()
+            negate = True
+        char_set = set()
+        range_list: List[Tuple[str, str]] = []
+        func_list: List[CharPredicate] = []
+        first = True
+        while True:
+            if self.peek() is None:
+                raise self.error('「]」がありません')
+            c = self.next()
+            if c == ']' and not first:
+                break
+            first = False
+            if c == '\\':
+                item = self.parse_escape()
+                if callable(item):
+                    func_list.append(item)
+                    continue
+                c = item
+            if self.peek() == '-' and self.position + 1 < len(self.pattern) and self.pattern[self.position + 1] != ']':
+                self.next()
+                end = self.next()
+                if end == '\\':
+                    end = self.parse_escape()
+                    if callable(end):
+                        raise self.error('範囲の終わりに文字クラスは使えません')
+                range_list.append((c, end))
+            else:
+                char_set.add(c)
+        char_set = frozenset(char_set)
+
+        def predicate(x: str) -> bool:
+            hit = x in char_set or any([low <= x <= high for low, high in range_list]) \
+                or any([func(x) for func in func_list])
+            return hit != negate
+
+        return predicate
+
+
+class Program:
+    """正規表現をコンパイルした命令列"""
+
+    def __init__(self, pattern: str):
+        parser = Parser(pattern)
+        tree = parser.parse()
+        self.group_count = parser.group_count
+        self.op: List[int] = []
+        self.arg1: List[any] = []
+        self.arg2: List[any] = []
+        self.emit(SAVE, 0)
+        self.compile(tree)
+        self.emit(SAVE, 1)
+        self.emit(MATCH)
+
+    def emit(self, op: int, arg1: any = None, arg2: any = None) -> int:
+        self.op.append(op)
+        self.arg1.append(arg1)
+        self.arg2.append(arg2)
+        return len(self.op) - 1
+
+    def compile(self, node: Node) -> None:
+        kind = node[0]
+        if kind == 'char':
+            value = node[1]
+            self.emit(CHAR, value if callable(value) else value.__eq__)
+        elif kind == 'cat':
+            for child in node[1]:
+                self.compile(child)
+        elif kind == 'alt':
+            # SPLIT L1, next → L1: 1つ目 → JUMP 末尾 → next: 残り
+            jump_list: List[int] = []
+            for child in node[1][:-1]:
+                split = self.emit(SPLIT)
+                self.arg1[split] = len(self.op)
+                self.compile(child)
+                jump_list.append(self.emit(JUMP))
+                self.arg2[split] = len(self.op)
+            self.compile(node[1][-1])
+            for jump in jump_list:
+                self.arg1[jump] = len(self.op)
+        elif kind == 'group':
+            self.emit(SAVE, node[1] * 2)
+            self.compile(node[2])
+            self.emit(SAVE, node[1] * 2 + 1)
+        elif kind == 'star':
+            split = self.emit(SPLIT)
+            self.arg1[split] = len(self.op)
+            self.compile(node[1])
+            self.emit(JUMP, split)
+            self.arg2[split] = len(self.op)
+        elif kind == 'plus':
+            start = len(self.op)
+            self.compile(node[1])
+            self.emit(SPLIT, start, len(self.op) + 1)
+        elif kind == 'quest':
+            split = self.emit(SPLIT)
+            self.arg1[split] = len(self.op)
+            self.compile(node[1])
+            self.arg2[split] = len(self.op)
+
+    def search(self, text: str, start: int, deadline: Optional[float]) -> Optional[Tuple]:
+        """start 以降で最も左にあるマッチを探し、記録欄(グループごとの開始・終了位置)を返す(無ければNone)
+
+        Pike VMで、スレッド(命令の位置と記録欄の組)を優先度の順に並べて1文字ずつ同時に進める。
+        同じ命令の位置にいるスレッドは優先度の高い方だけを残すので、1文字あたりの処理は命令数以下で済む。
+        スレッドの優先度はバックトラック型のエンジン(re)が試す順と同じなので、結果もreと一致する。
+        """
+        op, arg1, arg2 = self.op, self.arg1, self.arg2
+        size = len(op)
+        mark = [-1] * size
+        empty = (None,) * ((self.group_count + 1) * 2)
+        generation = 0
+
+        def add_thread(thread_list: List[Tuple[int, Tuple]], pc: int, capture: Tuple, position: int) -> None:
+            # SPLIT・JUMP・SAVEを辿り、CHAR・MATCHに着いたスレッドを優先度の順に追加する
+            stack = [(pc, capture)]
+            while len(stack) > 0:
+                pc, capture = stack.pop()
+                if mark[pc] == generation:
+                    continue
+                mark[pc] = generation
+                code = op[pc]
+                if code == JUMP:
+                    stack.append((arg1[pc], capture))
+                elif code == SPLIT:
+                    stack.append((arg2[pc], capture))
+                    stack.append((arg1[pc], capture))
+                elif code == SAVE:
+                    index = arg1[pc]
+                    stack.append((pc + 1, capture[:index] + (position,) + capture[index + 1:]))
+                else:
+                    thread_list.append((pc, capture))
+
+        length = len(text)
+        thread_list: List[Tuple[int, Tuple]] = []
+        add_thread(thread_list, 0, empty, start)
+        matched: Optional[Tuple] = None
+        position = start
+        while True:
+            if deadline is not None and (position - start) % DEADLINE_CHECK_INTERVAL == 0 \
+                    and time.perf_counter() > deadline:
+                raise RegexBudgetExceeded()
+            c = text[position] if position < length else None
+            generation += 1
+            next_list: List[Tuple[int, Tuple]] = []
+            for pc, capture in thread_list:
+                if op[pc] == MATCH:
+                    # これより優先度の低いスレッドは捨てる
+                    matched = capture
+                    break
+                if c is not None and arg1[pc](c):
+                    add_thread(next_list, pc + 1, capture, position + 1)
+            if c is None:
+                return matched
+            position += 1
+            if matched is None:
+                # まだマッチしていなければ、次の位置から始まるスレッドを最も低い優先度で加える
+                add_thread(next_list, 0, empty, position)
+            elif len(next_list) == 0:
+                return matched
+            thread_list = next_list
+
+    def find_group_list(self, text: str, deadline: Optional[float] = None) -> List[Optional[str]]:
+        """重ならないマッチを左から順に探し、各マッチのグループの文字列を並べた一覧を返す(re.finditerと同じ)"""
+        output: List[Optional[str]] = []
+        start = 0
+        while start <= len(text):
+            capture = self.search(text, start, deadline)
+            if capture is None:
+                break
+            for i in range(1, self.group_count + 1):
+                begin, end = capture[i * 2], capture[i * 2 + 1]
+                output.append(text[begin:end] if begin is not None and end is not None else None)
+            start = capture[1] if capture[1] > capture[0] else capture[1] + 1
+        return output
+
+
+@lru_cache(maxsize=256)
+def compile_pattern(pattern: str) -> Program:
+    """正規表現をコンパイルする(同じパターンは使い回す)"""
+    return Program(pattern)
+
+
+def find_group_list(text: str, pattern: str, budget: Optional[float] = None) -> List[Optional[str]]:
+    """線形時間で、正規表現の各マッチのグループの文字列を並べた一覧を返す
+
+    Parameters
+    ----------
+    text: str
+        対象の文字列
+    pattern: str
+        正規表現(対応する構文は Parser を参照)
+    budget: Optional[float]
+        時間の予算(秒)。超えたらRegexBudgetExceededを投げる。Noneなら制限しない
+
+    Returns
+    -------
+        グループの文字列の一覧(マッチしなかったグループはNone)
+    """
+    deadline = time.perf_counter() + budget if budget is not None else None
+    return compile_pattern(pattern).find_group_list(text, deadline)
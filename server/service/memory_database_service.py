@@ -0,0 +1,22 @@
+from sqlite3 import connect, Connection
+
+from service.sqlite_database_service import SqliteDataBaseService
+
+
+class InMemoryDataBaseService(SqliteDataBaseService):
+    """メモリ上のSQLiteデータベース(テストや、使い捨ての再構築用)
+
+    共有キャッシュモードで開くので、呼び出しごとに接続し直しても同じデータベースを参照できる。
+    接続が1つも無くなるとデータベースが消えてしまうため、closeするまで接続を1つ持ち続ける。
+    同じnameを指定したインスタンス同士は、同じデータベースを共有する。
+    """
+
+    def __init__(self, name: str = 'mft_db_tool', **kwargs):
+        super().__init__(f'file:{name}?mode=memory&cache=shared', **kwargs)
+        self.keeper = self.connect()
+
+    def connect(self) -> Connection:
+        return connect(self.db_file_path, timeout=self.timeout, uri=True)
+
+    def close(self) -> None:
+        self.keeper.close()
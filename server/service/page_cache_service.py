@@ -0,0 +1,285 @@
+import hashlib
+import time
+from typing import List, Dict, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+from service.i_database_service import IDataBaseService
+
+# ページキャッシュの容量の上限(バイト)の既定値
+PAGE_CACHE_MAX_SIZE = 256 * 1024 * 1024
+
+# 古い形式(URLごとに本文を持つ)のpage_cacheテーブルから移すときに、一度に読む行数
+MIGRATION_CHUNK_SIZE = 1000
+
+
+class PageCacheService:
+    """スクレイピングしたページのキャッシュ
+
+    本文は内容のハッシュをキーにして1度だけ保存し(page_body)、URLからハッシュへの対応(page_url)を別に持つ。
+    URLの違う同じ本文(定型のページや、#以降・クエリ文字列だけが違うURL)は、本文を共有する。
+    本文ごとに参照しているURLの数を数え、どのURLからも参照されなくなった本文は削除する。
+    URLは canonicalize_url で正規化してから引く(#以降はサーバーに送られないので除く)。
+    容量(保存した本文の合計サイズ)が上限を超えたら、最後に読み書きした日時が古いURLから削除する(LRU)。
+    クロール(ビルド)ごとにIDを振り、最新のクロールで使われなかったページは collect_garbage でまとめて削除する。
+    削除で空いた領域は、vacuum で少しずつ(一度に max_page ページずつ)ファイルから切り詰める。
+    ホストごとに、キャッシュのヒット数・ミス数を記録する。
+    """
+
+    def __init__(self, database: IDataBaseService, max_size: int = PAGE_CACHE_MAX_SIZE):
+        self.database = database
+        self.max_size = max_size
+        self.total_size: Optional[int] = None
+        self.database.many_query([
+            'CREATE TABLE IF NOT EXISTS page_body ('         # ページの本文(内容ごとに1つ)
+            'hash TEXT PRIMARY KEY,'                         # 本文のハッシュ(SHA-256)
+            'text TEXT,'                                     # 本文
+            'size INTEGER,'                                  # 本文のバイト数
+            'ref_count INTEGER)',                            # 本文を参照しているURLの数
+            'CREATE TABLE IF NOT EXISTS page_url ('          # URLごとの本文
+            'url TEXT PRIMARY KEY,'                          # 正規化したURL
+            'hash TEXT,'                                     # 本文のハッシュ
+            'host TEXT,'                                     # ホスト名
+            'last_access INTEGER,'                           # 最後に読み書きした日時(UNIX時間)
+            'crawl_id INTEGER)',                             # 最後に読み書きしたクロールのID
+            'CREATE INDEX IF NOT EXISTS page_url_last_access ON page_url (last_access)',
+            'CREATE INDEX IF NOT EXISTS page_url_hash ON page_url (hash)',
+            'CREATE TABLE IF NOT EXISTS page_cache_crawl ('  # クロールの一覧
+            'id INTEGER PRIMARY KEY,'                        # ID
+            'started_at INTEGER)',                           # 開始日時(UNIX時間)
+            'CREATE TABLE IF NOT EXISTS page_cache_stats ('  # ホストごとのヒット数・ミス数
+            'host TEXT PRIMARY KEY,'
+            'hit INTEGER,'
+            'miss INTEGER)',
+        ])
+
+        # 古い形式のpage_cacheテーブルがあれば、本文とURLの対応に分けて移す
+        if len(self.database.select('SELECT name FROM sqlite_master WHERE type=? AND name=?',
+                                    ('table', 'page_cache'))) > 0:
+            self.migrate()
+
+        # 削除で空いた領域を少しずつ切り詰められるよう、auto_vacuumをINCREMENTALにする(既存のファイルはVACUUMで作り直す)
+        if self.database.dialect == 'sqlite' and self.database.select('PRAGMA auto_vacuum')[0]['auto_vacuum'] != 2:
+            self.database.many_query(['PRAGMA auto_vacuum=INCREMENTAL', 'VACUUM'])
+
+        result = self.database.select('SELECT COALESCE(MAX(id), 0) AS crawl_id FROM page_cache_crawl')
+        self.crawl_id: int = result[0]['crawl_id']
+
+    def migrate(self) -> int:
+        """古い形式のpage_cacheテーブルの行を、page_body・page_url に移してから削除する
+
+        正規化すると同じになるURLが複数あれば、最後に読み書きしたものを残す。
+
+        Returns
+        -------
+            移したURLの数
+        """
+        column_list = [x['name'] for x in self.database.select('PRAGMA table_info(page_cache)')]
+        # 後から足した列が無い(ごく古い)テーブルでは、今の日時・クロール0として移す
+        now = int(time.time())
+        last_access = 'last_access' if 'last_access' in column_list else str(now)
+        crawl_id = 'crawl_id' if 'crawl_id' in column_list else '0'
+        record_map: Dict[str, Tuple[str, int, int]] = {}
+        last_url = ''
+        while True:
+            record_list = self.database.select(
+                f'SELECT url, text, COALESCE({last_access}, {now}) AS last_access, COALESCE({crawl_id}, 0) AS crawl_id '
+                'FROM page_cache WHERE url > ? ORDER BY url LIMIT ?', (last_url, MIGRATION_CHUNK_SIZE))
+            if len(record_list) == 0:
+                break
+            body_list: List[Tuple[str, str, int]] = []
+            for record in record_list:
+                text: str = record['text']
+                digest = get_hash(text)
+                body_list.append((digest, text, len(text.encode('utf-8'))))
+                url = canonicalize_url(record['url'])
+                if url not in record_map or record_map[url][1] <= record['last_access']:
+                    record_map[url] = (digest, record['last_access'], record['crawl_id'])
+            self.database.bulk_query(['INSERT OR IGNORE INTO page_body (hash, text, size, ref_count) '
+                                      'VALUES (?, ?, ?, 0)'], [body_list])
+            last_url = record_list[-1]['url']
+        self.database.bulk_query(
+            ['INSERT OR REPLACE INTO page_url (url, hash, host, last_access, crawl_id) VALUES (?, ?, ?, ?, ?)',
+             'DROP TABLE page_cache'],
+            [[(url, digest, get_host(url), access, crawl) for url, (digest, access, crawl) in record_map.items()],
+             [()]])
+        self.update_ref_count()
+        return len(record_map)
+
+    def update_ref_count(self) -> None:
+        """本文ごとの参照数を数え直し、どのURLからも参照されない本文を削除する"""
+        self.database.many_query([
+            'UPDATE page_body SET ref_count=(SELECT COUNT(*) FROM page_url WHERE page_url.hash=page_body.hash)',
+            'DELETE FROM page_body WHERE ref_count=0',
+        ])
+        self.total_size = None
+
+    def start_crawl(self) -> int:
+        """新しいクロールを始める(以降に読み書きしたページは、このクロールで使われたものとして記録される)"""
+        self.crawl_id += 1
+        self.database.query('INSERT INTO page_cache_crawl (id, started_at) VALUES (?, ?)',
+                            (self.crawl_id, int(time.time())))
+        return self.crawl_id
+
+    def get(self, url: str) -> Optional[str]:
+        """キャッシュからページの本文を取り出す(無ければNone)"""
+        url = canonicalize_url(url)
+        result = self.database.select('SELECT page_body.text FROM page_url '
+                                      'JOIN page_body ON page_body.hash=page_url.hash WHERE page_url.url=?', (url,))
+        hit = len(result) > 0
+        query: List[str] = ['INSERT INTO page_cache_stats (host, hit, miss) VALUES (?, ?, ?) '
+                            'ON CONFLICT (host) DO UPDATE SET hit=hit+excluded.hit, miss=miss+excluded.miss']
+        parameter: List[any] = [(get_host(url), 1 if hit else 0, 0 if hit else 1)]
+        if hit:
+            query.append('UPDATE page_url SET last_access=?, crawl_id=? WHERE url=?')
+            parameter.append((int(time.time()), self.crawl_id, url))
+        self.database.many_query(query, parameter)
+        return result[0]['text'] if hit else None
+
+    def put(self, url: str, text: str) -> None:
+        """ページの本文をキャッシュに入れ、容量が上限を超えたら古いものから削除する
+
+        同じ本文が既にあれば本文は保存し直さず、URLからの参照を足すだけにする。
+        """
+        url = canonicalize_url(url)
+        digest = get_hash(text)
+        size = len(text.encode('utf-8'))
+        total_size = self.get_total_size()
+        if len(self.database.select('SELECT hash FROM page_body WHERE hash=?', (digest,))) == 0:
+            total_size += size
+        old_hash = self.find_hash(url)
+        query: List[str] = ['UPDATE page_url SET last_access=?, crawl_id=? WHERE url=?']
+        parameter: List[any] = [(int(time.time()), self.crawl_id, url)]
+        if old_hash != digest:
+            query = [
+                'INSERT INTO page_body (hash, text, size, ref_count) VALUES (?, ?, ?, 1) '
+                'ON CONFLICT (hash) DO UPDATE SET ref_count=ref_count+1',
+                'INSERT OR REPLACE INTO page_url (url, hash, host, last_access, crawl_id) VALUES (?, ?, ?, ?, ?)',
+            ]
+            parameter = [(digest, text, size), (url, digest, get_host(url), int(time.time()), self.crawl_id)]
+            if old_hash is not None:
+                # 前の本文への参照を外し、どこからも参照されなくなったら削除する
+                total_size -= self.find_orphan_size(old_hash)
+                query.extend(['UPDATE page_body SET ref_count=ref_count-1 WHERE hash=?',
+                              'DELETE FROM page_body WHERE hash=? AND ref_count<=0'])
+                parameter.extend([(old_hash,), (old_hash,)])
+        self.database.many_query(query, parameter)
+        self.total_size = total_size
+        if self.total_size > self.max_size:
+            self.evict(self.total_size - self.max_size)
+
+    def find_hash(self, url: str) -> Optional[str]:
+        result = self.database.select('SELECT hash FROM page_url WHERE url=?', (url,))
+        return result[0]['hash'] if len(result) > 0 else None
+
+    def find_orphan_size(self, digest: str) -> int:
+        """参照を1つ外したら削除される本文なら、そのバイト数(削除されないなら0)"""
+        result = self.database.select('SELECT size FROM page_body WHERE hash=? AND ref_count<=1', (digest,))
+        return result[0]['size'] if len(result) > 0 else 0
+
+    def get_total_size(self) -> int:
+        """キャッシュの合計サイズ(保存している本文のバイト数の合計)"""
+        if self.total_size is None:
+            self.total_size = self.database.select('SELECT COALESCE(SUM(size), 0) AS size FROM page_body')[0]['size']
+        return self.total_size
+
+    def get_logical_size(self) -> int:
+        """本文を共有しなかった場合の、キャッシュの合計サイズ(URLごとの本文のバイト数の合計)"""
+        return self.database.select('SELECT COALESCE(SUM(page_body.size), 0) AS size FROM page_url '
+                                    'JOIN page_body ON page_body.hash=page_url.hash')[0]['size']
+
+    def evict(self, size: int) -> int:
+        """最後に読み書きした日時が古いURLから削除し、合計 size バイト以上の本文を削除する
+
+        本文は、それを参照するURLが全て削除されたときに削除される。
+
+        Returns
+        -------
+            削除したURLの数
+        """
+        url_list: List[str] = []
+        ref_count: Dict[str, int] = {x['hash']: x['ref_count']
+                                     for x in self.database.select('SELECT hash, ref_count FROM page_body')}
+        freed = 0
+        for record in self.database.select('SELECT page_url.url, page_url.hash, page_body.size FROM page_url '
+                                           'JOIN page_body ON page_body.hash=page_url.hash '
+                                           'ORDER BY page_url.last_access, page_url.url'):
+            if freed >= size:
+                break
+            url_list.append(record['url'])
+            ref_count[record['hash']] -= 1
+            if ref_count[record['hash']] == 0:
+                freed += record['size']
+        self.database.many_query(['DELETE FROM page_url WHERE url=?' for _ in url_list], [(x,) for x in url_list])
+        self.update_ref_count()
+        return len(url_list)
+
+    def collect_garbage(self) -> int:
+        """最新のクロールで使われなかったページを削除する(クロールを最後まで終えてから呼ぶこと)
+
+        Returns
+        -------
+            削除したURLの数
+        """
+        result = self.database.select('SELECT COUNT(*) AS count FROM page_url WHERE crawl_id < ?', (self.crawl_id,))
+        self.database.query('DELETE FROM page_url WHERE crawl_id < ?', (self.crawl_id,))
+        self.update_ref_count()
+        return result[0]['count']
+
+    def vacuum(self, max_page: int = 1024) -> int:
+        """削除で空いた領域を、最大 max_page ページ分だけファイルから切り詰める
+
+        Returns
+        -------
+            切り詰めたページ数
+        """
+        if self.database.dialect != 'sqlite':
+            return 0
+        before = self.database.select('PRAGMA freelist_count')[0]['freelist_count']
+        self.database.select(f'PRAGMA incremental_vacuum({int(max_page)})')
+        after = self.database.select('PRAGMA freelist_count')[0]['freelist_count']
+        return before - after
+
+    def find_stats(self) -> List[Dict[str, any]]:
+        """ホストごとの、キャッシュしたURLの数・本文の数・本文の合計サイズ(バイト)・ヒット数・ミス数・ヒット率
+
+        本文の数・合計サイズは、そのホストのURLが参照している本文を1つずつ数える(ホストをまたいで共有する本文は、
+        それぞれのホストで数える)。
+        """
+        output: Dict[str, Dict[str, any]] = {}
+        for record in self.database.select('SELECT host, COUNT(*) AS entries FROM page_url GROUP BY host'):
+            output[record['host']] = {'host': record['host'], 'entries': record['entries'], 'bodies': 0, 'size': 0,
+                                      'hit': 0, 'miss': 0}
+        for record in self.database.select('SELECT host, COUNT(*) AS bodies, SUM(size) AS size '
+                                           'FROM (SELECT DISTINCT page_url.host, page_body.hash, page_body.size '
+                                           'FROM page_url JOIN page_body ON page_body.hash=page_url.hash) '
+                                           'GROUP BY host'):
+            output[record['host']]['bodies'] = record['bodies']
+            output[record['host']]['size'] = record['size']
+        for record in self.database.select('SELECT host, hit, miss FROM page_cache_stats'):
+            temp = output.setdefault(record['host'], {'host': record['host'], 'entries': 0, 'bodies': 0, 'size': 0})
+            temp['hit'] = record['hit']
+            temp['miss'] = record['miss']
+        for temp in output.values():
+            total = temp['hit'] + temp['miss']
+            temp['hit_rate'] = temp['hit'] / total if total > 0 else 0.0
+        return sorted(output.values(), key=lambda x: x['host'])
+
+
+def get_host(url: str) -> str:
+    """URLのホスト名"""
+    return urlsplit(url).hostname or ''
+
+
+def get_hash(text: str) -> str:
+    """ページの本文のハッシュ(SHA-256)"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def canonicalize_url(url: str) -> str:
+    """キャッシュのキーにするURL
+
+    #以降(フラグメント)はサーバーに送られず、同じページが返るので除く。スキームとホスト名は小文字にし、
+    パスが空なら / にする。クエリ文字列はサーバーに送られるので、そのまま残す。
+    """
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or '/', parts.query, ''))
@@ -0,0 +1,179 @@
+import cProfile
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from types import FrameType
+from typing import Iterator, Optional, List
+
+# サンプリングの間隔(秒)
+SAMPLING_INTERVAL = 0.005
+
+# 割り当てレポートに載せる件数
+ALLOCATION_TOP_N = 30
+
+# 割り当て中のメモリを調べる間隔(秒)と、前回のスナップショットよりこの割合以上増えたら撮り直す閾値
+PEAK_SAMPLING_INTERVAL = 0.05
+PEAK_SNAPSHOT_MARGIN = 0.1
+
+
+class StackSampler:
+    """一定間隔で全スレッドのスタックを記録し、フレームグラフ用の collapsed stack 形式にまとめる
+
+    cProfileは呼び出したスレッドしか計測できないため、書き込み用のスレッドなどの時間はこちらで見る。
+    """
+
+    def __init__(self, interval: float = SAMPLING_INTERVAL):
+        self.interval = interval
+        self.counter: Counter = Counter()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='stack-sampler', daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        self.thread.join()
+
+    def run(self) -> None:
+        own_id = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            name_dict = {x.ident: x.name for x in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                self.counter[collapse_stack(name_dict.get(thread_id, str(thread_id)), frame)] += 1
+
+    def write(self, path: str) -> None:
+        with open(path, 'w') as f:
+            for stack, count in self.counter.most_common():
+                f.write(f'{stack} {count}\n')
+
+
+class PeakSnapshotSampler:
+    """一定間隔で割り当て中のメモリの量を調べ、最も多かったときに近いtracemallocのスナップショットを残す
+
+    段階の終了時点のスナップショットには、途中で解放された一時的な割り当て(ピークを押し上げたもの)が残らないため。
+    スナップショットは重いので、前回撮ったときより PEAK_SNAPSHOT_MARGIN 以上増えたときだけ撮り直す。
+    """
+
+    def __init__(self, interval: float = PEAK_SAMPLING_INTERVAL, margin: float = PEAK_SNAPSHOT_MARGIN):
+        self.interval = interval
+        self.margin = margin
+        self.snapshot: Optional[tracemalloc.Snapshot] = None
+        self.size = 0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='peak-sampler', daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        self.thread.join()
+
+    def run(self) -> None:
+        while not self.stop_event.wait(self.interval):
+            self.sample()
+
+    def sample(self, force: bool = False) -> None:
+        """割り当て中のメモリが前回のスナップショットより十分多ければ(forceなら多いだけで)、撮り直す"""
+        current, _ = tracemalloc.get_traced_memory()
+        if current > self.size * (1 if force else 1 + self.margin):
+            self.snapshot = tracemalloc.take_snapshot()
+            self.size = current
+
+
+def collapse_stack(thread_name: str, frame: Optional[FrameType]) -> str:
+    """スタックを「スレッド名;呼び出し元;…;呼び出し先」の形式にする"""
+    name_list: List[str] = []
+    while frame is not None:
+        code = frame.f_code
+        name_list.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join([thread_name] + name_list[::-1])
+
+
+class ProfileService:
+    """ビルドの段階(メーカーごとのスクレイピングなど)ごとに、CPU時間とメモリ割り当てを計測する
+
+    段階ごとに、directory に次のファイルを書き出す::
+
+        {段階名}.pstats     cProfileの結果(python -m pstats や snakeviz で読める)
+        {段階名}.collapsed  全スレッドのサンプリング結果(flamegraph.pl や speedscope で読める)
+        {段階名}.alloc.txt  段階の開始時点と比べて、ピーク付近で割り当てられていたメモリの上位と、
+                            終了時点で残っているメモリの上位(tracemallocによる)
+
+    enabled が False のときは何もしない。
+    """
+
+    def __init__(self, directory: str = 'profile', enabled: bool = True):
+        self.directory = directory
+        self.enabled = enabled
+        if enabled:
+            os.makedirs(directory, exist_ok=True)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """with文の中の処理を、1つの段階として計測する"""
+        if not self.enabled:
+            yield
+            return
+        sampler = StackSampler()
+        peak_sampler = PeakSnapshotSampler()
+        profiler = cProfile.Profile()
+        tracemalloc.start(25)
+        start_snapshot = tracemalloc.take_snapshot()
+        start = time.perf_counter()
+        sampler.start()
+        peak_sampler.start()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            peak_sampler.stop()
+            sampler.stop()
+            elapsed = time.perf_counter() - start
+            # 終了時点が最も多ければ、それをピーク付近のスナップショットとする
+            peak_sampler.sample(force=True)
+            end_snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            path = os.path.join(self.directory, name)
+            profiler.dump_stats(f'{path}.pstats')
+            sampler.write(f'{path}.collapsed')
+            self.write_allocation_report(f'{path}.alloc.txt', name, start_snapshot,
+                                         peak_sampler.snapshot or end_snapshot, end_snapshot, elapsed, peak)
+            print(f'[profile] {name}: {elapsed:.2f}s, peak {peak / 1024 / 1024:.1f}MB')
+
+    @staticmethod
+    def write_allocation_report(path: str, name: str, start_snapshot: tracemalloc.Snapshot,
+                                peak_snapshot: tracemalloc.Snapshot, end_snapshot: tracemalloc.Snapshot,
+                                elapsed: float, peak: int) -> None:
+        """段階の開始時点と比べて、ピーク付近と終了時点で増えていたメモリの上位を書き出す"""
+        filter_list = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ]
+        start_snapshot = start_snapshot.filter_traces(filter_list)
+        peak_statistics = peak_snapshot.filter_traces(filter_list).compare_to(start_snapshot, 'lineno')
+        end_statistics = end_snapshot.filter_traces(filter_list).compare_to(start_snapshot, 'lineno')
+        with open(path, 'w') as f:
+            f.write(f'stage: {name}\n')
+            f.write(f'elapsed: {elapsed:.3f}s\n')
+            f.write(f'peak: {peak / 1024:.1f}KB\n')
+            f.write(f'retained: {sum([x.size_diff for x in end_statistics]) / 1024:.1f}KB\n')
+            for title, statistics in [('allocated near the peak', peak_statistics),
+                                      ('retained at the end', end_statistics)]:
+                f.write(f'\n[{title}]\n')
+                for i, stat in enumerate([x for x in statistics if x.size_diff > 0][:ALLOCATION_TOP_N]):
+                    frame = stat.traceback[0]
+                    f.write(f'#{i + 1} {frame.filename}:{frame.lineno}: {stat.size_diff / 1024:+.1f}KB '
+                            f'({stat.count_diff:+d} blocks)\n')
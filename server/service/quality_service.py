@@ -0,0 +1,297 @@
+import os
+import time
+from dataclasses import fields
+from operator import attrgetter
+from typing import List, Dict, Tuple, Optional
+
+import numpy
+
+from constant import Lens
+from service.columnar_service import ColumnarReader, TYPE_DICT_UINT16, TYPE_DICT_UINT32
+from service.i_database_service import IDataBaseService
+from service.ulitity import make_lens_key
+
+# 数値の項目(IDはビルドごとに振り直されるので除く)
+NUMERIC_FIELD_LIST = [x.name for x in fields(Lens) if x.type in [int, float] and x.name != 'id']
+
+# 文字列の項目
+TEXT_FIELD_LIST = [x.name for x in fields(Lens) if x.type == str]
+
+# 空であってはならない文字列の項目
+REQUIRED_FIELD_LIST = ['maker', 'name', 'mount']
+
+# 項目ごとの値の範囲(下限, 上限)。範囲外(NaNを含む)なら誤りとする。単位はレンズデータと同じ
+FIELD_RANGE_MAP: Dict[str, Tuple[float, float]] = {
+    'wide_focal_length': (4, 2000),
+    'telephoto_focal_length': (4, 2000),
+    'wide_f_number': (0.7, 45),
+    'telephoto_f_number': (0.7, 45),
+    'wide_min_focus_distance': (10, 20000),
+    'telephoto_min_focus_distance': (10, 20000),
+    'max_photographing_magnification': (0.01, 10),
+    'filter_diameter': (20, 150),
+    'overall_diameter': (10, 300),
+    'overall_length': (5, 700),
+    'weight': (10, 10000),
+    'price': (1000, 10000000),
+}
+
+# 「該当なし・不明」を表す値(フィルター径の-1=ねじ込み式のフィルターが付かない、価格の0=不明)。
+# 範囲の検査からは外し、パースの失敗でも使われる値なので注意として数える
+SENTINEL_VALUE_MAP: Dict[str, float] = {
+    'filter_diameter': -1,
+    'price': 0,
+}
+
+# 広角端 ≦ 望遠端 でなければならない項目の組
+ORDERED_FIELD_LIST: List[Tuple[str, str]] = [
+    ('wide_focal_length', 'telephoto_focal_length'),
+    ('wide_f_number', 'telephoto_f_number'),
+]
+
+# メーカーごとの外れ値を探す項目(対数を取り、中央値からの隔たりを中央絶対偏差で割った値で判定する)
+OUTLIER_FIELD_LIST = ['weight', 'price', 'overall_diameter', 'overall_length', 'wide_min_focus_distance']
+
+# 外れ値とみなす、中央値からの隔たり(中央絶対偏差から推定した標準偏差の何倍か)
+OUTLIER_THRESHOLD = 5.0
+
+# 外れ値を探すのに必要な、メーカーごとのレンズ数
+OUTLIER_MIN_COUNT = 10
+
+# 前回のビルドから変わると不自然な項目と、許す変化の割合(0なら変わってはならない)
+DIFF_TOLERANCE_MAP: Dict[str, float] = {
+    'wide_focal_length': 0,
+    'telephoto_focal_length': 0,
+    'wide_f_number': 0,
+    'telephoto_f_number': 0,
+    'weight': 0.1,
+    'overall_diameter': 0.1,
+    'overall_length': 0.1,
+    'price': 0.5,
+}
+
+# あるメーカーのレンズ数が、前回のビルドと比べてこの割合を下回ったらビルドを止める
+MIN_MAKER_COUNT_RATIO = 0.5
+
+# 隔離したレンズの割合がこれを超えたらビルドを止める(パーサーがまとめて壊れた場合などへの備え)
+MAX_QUARANTINE_RATIO = 0.05
+
+# 項目ごとの列(数値はfloat64、文字列はobject)
+Column = Dict[str, numpy.ndarray]
+
+
+def to_column(lens_list: List[Lens]) -> Column:
+    """レンズ一覧を、項目ごとの列に並べ替える"""
+    # 1件ずつ全項目をまとめて取り出し、(件数 × 項目数)の配列を作ってから列に分ける
+    numeric_getter = attrgetter(*NUMERIC_FIELD_LIST)
+    numeric = numpy.array([numeric_getter(x) for x in lens_list], dtype=float).reshape(-1, len(NUMERIC_FIELD_LIST))
+    output: Column = {field: numpy.ascontiguousarray(numeric[:, i]) for i, field in enumerate(NUMERIC_FIELD_LIST)}
+    text_getter = attrgetter(*TEXT_FIELD_LIST)
+    # 末尾に番兵の行を足して、0件でも(0 × 項目数)の配列にする
+    text = numpy.array([text_getter(x) for x in lens_list] + [(None,) * len(TEXT_FIELD_LIST)], dtype=object)[:-1]
+    for i, field in enumerate(TEXT_FIELD_LIST):
+        output[field] = text[:, i]
+    return output
+
+
+def load_previous_column(path: str = 'lens_data.mftc') -> Optional[Column]:
+    """前回のビルドで書き出した列指向バイナリ形式のファイルを、項目ごとの列として読み込む(無ければNone)"""
+    if not os.path.exists(path):
+        return None
+    with ColumnarReader(path) as reader:
+        output: Column = {}
+        for name in reader.column_name_list:
+            column_type = reader.column_dict[name][0]
+            if column_type in [TYPE_DICT_UINT16, TYPE_DICT_UINT32]:
+                dictionary = numpy.array(reader.dictionary(name) + [None], dtype=object)[:-1]
+                output[name] = dictionary[reader.column(name)]
+            elif name in NUMERIC_FIELD_LIST:
+                # ファイルを閉じられるように、コピーしておく
+                output[name] = reader.column(name).astype(float)
+    return output
+
+
+def column_lens_key(column: Column) -> List[str]:
+    """位置ごとの、ビルドをまたいでレンズを対応付けるキー(履歴・カタログのパッチと同じ make_lens_key)"""
+    return [make_lens_key(*x) for x in zip(column['maker'].tolist(), column['mount'].tolist(),
+                                           column['product_number'].tolist(), column['name'].tolist())]
+
+
+class QualityReport:
+    """検査の結果
+
+    rule は「検査の種類:項目名」の形の名前から、(誤りか, 引っかかった位置のマスク)への辞書。
+    誤り(error)に引っかかったレンズは隔離し、注意(warning)だけのレンズは書き出しに含める。
+    fatal_list は、行ごとではなくカタログ全体の問題で、1件でもあればビルドを止める。
+    """
+
+    def __init__(self, lens_list: List[Lens], rule: Dict[str, Tuple[bool, numpy.ndarray]], fatal_list: List[str]):
+        self.lens_list = lens_list
+        self.rule = rule
+        self.fatal_list = fatal_list
+        size = len(lens_list)
+        self.error_mask = numpy.zeros(size, dtype=bool)
+        self.warning_mask = numpy.zeros(size, dtype=bool)
+        for is_error, mask in rule.values():
+            if is_error:
+                self.error_mask |= mask
+            else:
+                self.warning_mask |= mask
+
+    @property
+    def passed_lens_list(self) -> List[Lens]:
+        """誤りの無いレンズの一覧"""
+        return [self.lens_list[i] for i in numpy.flatnonzero(~self.error_mask)]
+
+    @property
+    def quarantine_list(self) -> List[Tuple[Lens, List[str]]]:
+        """隔離するレンズと、その理由(検査の名前)の一覧"""
+        return self.find_issue_list(self.error_mask, True)
+
+    @property
+    def warning_list(self) -> List[Tuple[Lens, List[str]]]:
+        """注意の付いたレンズと、その理由(検査の名前)の一覧"""
+        return self.find_issue_list(self.warning_mask, False)
+
+    def find_issue_list(self, mask: numpy.ndarray, is_error: bool) -> List[Tuple[Lens, List[str]]]:
+        position_list = numpy.flatnonzero(mask)
+        reason_list: List[List[str]] = [[] for _ in position_list]
+        for name, (rule_is_error, rule_mask) in self.rule.items():
+            if rule_is_error != is_error:
+                continue
+            for i in numpy.flatnonzero(rule_mask[position_list]):
+                reason_list[i].append(name)
+        return [(self.lens_list[x], y) for x, y in zip(position_list, reason_list)]
+
+    def find_count(self) -> Dict[str, int]:
+        """検査ごとの、引っかかったレンズ数(引っかかったものだけ)"""
+        return {name: int(mask.sum()) for name, (_, mask) in self.rule.items() if mask.any()}
+
+    def validate(self, max_quarantine_ratio: float = MAX_QUARANTINE_RATIO) -> None:
+        """ビルドを続けてよいかを確かめる(だめならValueErrorを投げる)"""
+        if len(self.fatal_list) > 0:
+            raise ValueError(f'カタログの検査に失敗しました({" / ".join(self.fatal_list)}).')
+        quarantine_count = int(self.error_mask.sum())
+        if quarantine_count > len(self.lens_list) * max_quarantine_ratio:
+            raise ValueError(f'隔離したレンズが{len(self.lens_list)}件中{quarantine_count}件あり、'
+                             f'上限の割合({max_quarantine_ratio})を超えています.')
+
+
+def check_quality(lens_list: List[Lens], previous: Optional[Column] = None) -> QualityReport:
+    """カタログ全体を、項目ごとの列に対する配列演算でまとめて検査する
+
+    行ごとの検査は、範囲(FIELD_RANGE_MAP)・広角端 ≦ 望遠端(ORDERED_FIELD_LIST)・必須の文字列(誤り)と、
+    不明を表す値(SENTINEL_VALUE_MAP)・メーカーごとの外れ値・前回のビルドからの不自然な変化(注意)。
+    外れ値と変化は、真っ当なレンズ(超望遠レンズの質量や、値下げなど)でも起こり得るので、隔離はしない。
+    カタログ全体の検査として、前回のビルドと比べてレンズ数が大きく減ったメーカーが無いかも確かめる。
+
+    Parameters
+    ----------
+    lens_list: List[Lens]
+        レンズ一覧
+    previous: Optional[Column]
+        前回のビルドの列(load_previous_column の結果。Noneなら前回との比較はしない)
+
+    Returns
+    -------
+        検査の結果
+    """
+    column = to_column(lens_list)
+    rule: Dict[str, Tuple[bool, numpy.ndarray]] = {}
+
+    # 範囲と、不明を表す値
+    for field, (low, high) in FIELD_RANGE_MAP.items():
+        value = column[field]
+        in_range = (value >= low) & (value <= high)
+        if field in SENTINEL_VALUE_MAP:
+            sentinel = value == SENTINEL_VALUE_MAP[field]
+            rule[f'unknown:{field}'] = (False, sentinel)
+            in_range |= sentinel
+        rule[f'range:{field}'] = (True, ~in_range)
+
+    # 広角端 ≦ 望遠端
+    for wide_field, telephoto_field in ORDERED_FIELD_LIST:
+        rule[f'order:{wide_field}'] = (True, ~(column[wide_field] <= column[telephoto_field]))
+
+    # 必須の文字列
+    for field in REQUIRED_FIELD_LIST:
+        rule[f'empty:{field}'] = (True, (column[field] == '') | (column[field] == None))  # noqa: E711
+
+    # メーカーごとの外れ値(範囲外・不明の値は、中央値の計算にも使わない)
+    maker_list, maker_code = numpy.unique(column['maker'].astype(str), return_inverse=True)
+    order = numpy.argsort(maker_code, kind='stable')
+    boundary = numpy.searchsorted(maker_code[order], numpy.arange(len(maker_list) + 1))
+    for field in OUTLIER_FIELD_LIST:
+        valid = ~rule[f'range:{field}'][1]
+        if field in SENTINEL_VALUE_MAP:
+            valid &= ~rule[f'unknown:{field}'][1]
+        log_value = numpy.log(numpy.where(valid, column[field], 1.0))
+        outlier = numpy.zeros(len(lens_list), dtype=bool)
+        for start, end in zip(boundary, boundary[1:]):
+            position = order[start:end]
+            position = position[valid[position]]
+            if len(position) < OUTLIER_MIN_COUNT:
+                continue
+            temp = log_value[position]
+            median = numpy.median(temp)
+            deviation = numpy.abs(temp - median)
+            scale = numpy.median(deviation) * 1.4826
+            if scale > 0:
+                outlier[position] = deviation > scale * OUTLIER_THRESHOLD
+        rule[f'outlier:{field}'] = (False, outlier)
+
+    fatal_list: List[str] = []
+    if previous is not None and len(previous['maker']) > 0:
+        # 前回のビルドの同じレンズと比べる
+        previous_index = {x: i for i, x in enumerate(column_lens_key(previous))}
+        position = numpy.fromiter((previous_index.get(x, -1) for x in column_lens_key(column)), dtype=numpy.int64,
+                                  count=len(lens_list))
+        found = position >= 0
+        for field, tolerance in DIFF_TOLERANCE_MAP.items():
+            value = column[field]
+            previous_value = previous[field][numpy.where(found, position, 0)]
+            changed = found & (numpy.abs(value - previous_value) > numpy.abs(previous_value) * tolerance)
+            if field in SENTINEL_VALUE_MAP:
+                sentinel = SENTINEL_VALUE_MAP[field]
+                changed &= (value != sentinel) & (previous_value != sentinel)
+            rule[f'diff:{field}'] = (False, changed)
+
+        # メーカーごとのレンズ数
+        count = dict(zip(maker_list.tolist(), numpy.bincount(maker_code, minlength=len(maker_list)).tolist()))
+        for maker, previous_count in zip(*numpy.unique(previous['maker'].astype(str), return_counts=True)):
+            if count.get(maker, 0) < previous_count * MIN_MAKER_COUNT_RATIO:
+                fatal_list.append(f'{maker}のレンズが{previous_count}件から{count.get(maker, 0)}件に減っています')
+
+    return QualityReport(lens_list, rule, fatal_list)
+
+
+class QualityService:
+    """検査で隔離したレンズの記録
+
+    隔離したレンズはデータベースにもWebアプリ用のデータにも含めず、理由とともにこのテーブルに残す。
+    ビルドごとに作り直すので、最新のビルドで隔離したものだけが残る。
+    """
+
+    def __init__(self, database: IDataBaseService):
+        self.database = database
+        self.database.query('CREATE TABLE IF NOT EXISTS lens_quarantine ('  # 隔離したレンズ
+                            'id INTEGER PRIMARY KEY,'                       # ID
+                            'maker TEXT,'                                   # メーカー名
+                            'name TEXT,'                                    # レンズ名
+                            'reason TEXT,'                                  # 理由(検査の名前をカンマ区切りで)
+                            'lens TEXT,'                                    # レンズの情報(JSON)
+                            'recorded_at INTEGER)')                         # 記録日時(UNIX時間)
+
+    def save_all(self, quarantine_list: List[Tuple[Lens, List[str]]]) -> None:
+        """隔離したレンズを記録し直す"""
+        recorded_at = int(time.time())
+        self.database.bulk_query(['DELETE FROM lens_quarantine',
+                                  'INSERT INTO lens_quarantine (maker, name, reason, lens, recorded_at) '
+                                  'VALUES (?, ?, ?, ?, ?)'],
+                                 [[()], [(x.maker, x.name, ','.join(y), x.to_json(ensure_ascii=False), recorded_at)
+                                         for x, y in quarantine_list]])
+
+    def find_all(self) -> List[Tuple[Lens, List[str]]]:
+        """隔離したレンズと、その理由の一覧"""
+        return [(Lens.from_json(x['lens']), x['reason'].split(','))
+                for x in self.database.select('SELECT lens, reason FROM lens_quarantine ORDER BY id')]
@@ -0,0 +1,251 @@
+import json
+import math
+import os
+import re
+import time
+from decimal import Decimal
+from itertools import chain
+from typing import List, Dict, Optional, Iterable
+from urllib.parse import parse_qsl
+
+from service.facet_service import QUERY_TYPE_MAP, Query
+from service.i_database_service import IDataBaseService
+
+# Webアプリのクエリタイプの一覧(constant.ts の QueryTypeList と同じ順。共有URLのクエリもこの順に並ぶ)
+QUERY_TYPE_LIST: List[str] = list(QUERY_TYPE_MAP.keys())
+
+# 値を使わないクエリタイプ(constant.ts の BooleanQueryTypeList)。正規化では値を0にそろえる
+BOOLEAN_QUERY_TYPE_LIST = ['IsDripProof', 'HasImageStabilization', 'IsInnerZoom', 'IsPrime', 'IsZoom',
+                           'IsMicroFourThirds', 'IsLeicaL', 'IsLensFilter']
+
+# 結果を事前に計算しておくクエリ(共有URLのクエリ文字列。検索回数の多いクエリに加えて計算する)
+QUERY_CACHE_PRESET_LIST: List[str] = [
+    '?IsMicroFourThirds=0',
+    '?IsLeicaL=0',
+    '?IsPrime=0&IsMicroFourThirds=0',
+    '?IsZoom=0&IsMicroFourThirds=0',
+    '?HasImageStabilization=0&IsMicroFourThirds=0',
+    '?IsDripProof=0&IsMicroFourThirds=0',
+    '?IsPrime=0&IsLeicaL=0',
+    '?IsZoom=0&IsLeicaL=0',
+]
+
+# 検索回数の多いものから、結果を事前に計算しておくクエリの数
+QUERY_CACHE_POPULAR_COUNT = 100
+
+# アクセスログ(Common/Combined Log Format)の1行の、リクエストのURL("GET /?MaxWeight=300 HTTP/1.1" の部分)
+ACCESS_LOG_PATTERN = re.compile(r'"(?:GET|HEAD) (\S+)[^"]*"')
+
+# JavaScriptの parseFloat が読み飛ばす、先頭の空白文字
+JS_WHITESPACE = '\t\n\v\f\r \u00a0\u1680\u2000\u2001\u2002\u2003\u2004\u2005\u2006\u2007\u2008\u2009' \
+                '\u200a\u2028\u2029\u202f\u205f\u3000\ufeff'
+
+# JavaScriptの parseFloat が読み取る、文字列の先頭の数値
+JS_FLOAT_PATTERN = re.compile(r'[+-]?(?:Infinity|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)')
+
+
+def parse_js_float(text: str) -> Optional[float]:
+    """JavaScriptの parseFloat と同じく、文字列の先頭の数値を読み取る(読み取れなければNone)"""
+    match = JS_FLOAT_PATTERN.match(text.lstrip(JS_WHITESPACE))
+    if match is None:
+        return None
+    return float(match.group().replace('Infinity', 'inf'))
+
+
+def format_js_number(value: float) -> str:
+    """JavaScriptで数値を文字列にしたときの表記(Number.prototype.toString と同じ)"""
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return 'Infinity' if value > 0 else '-Infinity'
+    if value == 0:
+        return '0'
+    # repr は元の値に戻る最短の桁を返すので、その桁と小数点の位置から、JavaScriptの規則で並べ直す
+    _, digit_tuple, exponent = Decimal(repr(abs(value))).as_tuple()
+    digits = ''.join([str(x) for x in digit_tuple]).rstrip('0')
+    point = exponent + len(digit_tuple)
+    if len(digits) <= point <= 21:
+        text = digits + '0' * (point - len(digits))
+    elif 0 < point <= 21:
+        text = digits[0:point] + '.' + digits[point:]
+    elif -6 < point <= 0:
+        text = '0.' + '0' * -point + digits
+    else:
+        text = digits[0] + ('.' + digits[1:] if len(digits) > 1 else '') + f'e{point - 1:+d}'
+    return ('-' if value < 0 else '') + text
+
+
+def parse_query_string(text: str) -> List[Query]:
+    """共有URLのクエリ文字列を、Webアプリ(App.tsx)と同じ規則で絞り込みの条件の一覧にする
+
+    クエリタイプごとに、名前がそのままのパラメーターを、無ければ名前を小文字にしたパラメーターを読む
+    (同じ名前が複数あれば最初のもの)。値は parseFloat で読み、読み取れなければその条件は無視する。
+    知らない名前のパラメーターも無視する。条件は QUERY_TYPE_LIST の順に並ぶ。
+    """
+    # Webアプリは location.search の先頭の1文字を除き、URLSearchParams はさらに先頭の?を1つ除く
+    for _ in range(2):
+        if text.startswith('?'):
+            text = text[1:]
+    param: Dict[str, str] = {}
+    for name, value in parse_qsl(text, keep_blank_values=True):
+        param.setdefault(name, value)
+    output: List[Query] = []
+    for query_type in QUERY_TYPE_LIST:
+        value = param.get(query_type)
+        if value is None:
+            value = param.get(query_type.lower())
+            if value is None:
+                continue
+        temp = parse_js_float(value)
+        if temp is not None:
+            output.append((query_type, temp))
+    return output
+
+
+def to_query_string(query_list: Iterable[Query]) -> str:
+    """絞り込みの条件の一覧を、Webアプリ(utility.ts の queryListToqueryString)と同じ表記のクエリ文字列にする"""
+    return '?' + '&'.join([f'{query_type}={format_js_number(value)}' for query_type, value in query_list])
+
+
+def canonicalize_query(text: str) -> str:
+    """共有URLのクエリ文字列を正規化する
+
+    並び順・名前の大文字小文字・値の表記(2.80 と 2.8 など)が違っても、Webアプリで同じ絞り込みになるクエリは
+    同じ文字列になる。結果は、Webアプリがそのクエリを読み込んだ後にURLに書き戻すクエリ文字列と同じ
+    (ただし、真偽値のクエリタイプの値は0にそろえる)。
+    """
+    return to_query_string([(query_type, 0.0 if query_type in BOOLEAN_QUERY_TYPE_LIST else value)
+                            for query_type, value in parse_query_string(text)])
+
+
+def find_log_query(line: str) -> Optional[str]:
+    """アクセスログの1行(またはURL・クエリ文字列だけの行)から、クエリ文字列を取り出す(無ければNone)"""
+    match = ACCESS_LOG_PATTERN.search(line)
+    target = match.group(1) if match is not None else line.strip()
+    if '?' not in target:
+        return None
+    return '?' + target.split('?', 1)[1].split('#', 1)[0]
+
+
+def find_query_cache_key_list(popular_key_list: List[str],
+                              preset_list: Iterable[str] = QUERY_CACHE_PRESET_LIST) -> List[str]:
+    """結果を事前に計算しておくクエリ(正規化したもの)の一覧
+
+    事前定義したクエリと、検索回数の多いクエリを重複なく並べる。条件の無いクエリ(全レンズ)は含めない。
+    """
+    output: List[str] = []
+    # 記録した後に正規化の規則が変わっていてもよいよう、検索回数の多いクエリも正規化し直す
+    for key in [canonicalize_query(x) for x in chain(preset_list, popular_key_list)]:
+        if key != '?' and key not in output:
+            output.append(key)
+    return output
+
+
+class QueryCacheService:
+    """共有URLのクエリに対する、事前に計算した結果(query_cache.json)の引き当て
+
+    クエリは canonicalize_query で正規化してから引き当て、正規化したクエリごとにヒット数・ミス数を記録する。
+    記録は次のビルドで、結果を事前に計算しておくクエリ(検索回数の多いもの)を選ぶのに使う。
+    数はメモリ上で数え、flush でまとめてデータベースに書き込む。
+    Webアプリは静的に配信しているので、実際の検索は record_log でアクセスログから読み込んで数える。
+    """
+
+    def __init__(self, database: IDataBaseService, path: str = 'query_cache.json'):
+        self.database = database
+        self.path = path
+        self.result_map: Optional[Dict[str, List[int]]] = None
+        # 正規化したクエリごとの、書き込んでいない[ヒット数, ミス数]
+        self.counter: Dict[str, List[int]] = {}
+        self.database.query('CREATE TABLE IF NOT EXISTS query_cache_stats ('  # クエリごとのヒット数・ミス数
+                            'query_key TEXT PRIMARY KEY,'                     # 正規化したクエリ文字列
+                            'hit INTEGER,'
+                            'miss INTEGER,'
+                            'last_access INTEGER)')                           # 最後に引き当てた日時(UNIX時間)
+
+    def load(self) -> Dict[str, List[int]]:
+        """事前に計算した結果(正規化したクエリ → レンズIDの一覧)。ファイルが無ければ空"""
+        if self.result_map is None:
+            self.result_map = {}
+            if os.path.exists(self.path):
+                with open(self.path) as f:
+                    self.result_map = json.load(f)['query']
+        return self.result_map
+
+    def get(self, text: str) -> Optional[List[int]]:
+        """クエリ文字列に対する、事前に計算した結果のレンズIDの一覧(無ければNone)
+
+        条件の無いクエリは全レンズなので、引き当てずNoneを返す(ヒット数・ミス数にも数えない)。
+        """
+        key = canonicalize_query(text)
+        if key == '?':
+            return None
+        return self.get_key(key)
+
+    def get_key(self, key: str) -> Optional[List[int]]:
+        """正規化したクエリに対する、事前に計算した結果のレンズIDの一覧(無ければNone)"""
+        id_list = self.load().get(key)
+        count = self.counter.setdefault(key, [0, 0])
+        count[0 if id_list is not None else 1] += 1
+        return id_list
+
+    def record_log(self, path: str) -> int:
+        """アクセスログを読み、検索(条件のあるクエリ)ごとに引き当てて、ヒット数・ミス数を記録する
+
+        同じログを2回読むと2回数えるので、ローテートしたログは1ファイルずつ1回だけ読むこと。
+        条件の無いクエリや、Webアプリのクエリタイプを含まないクエリ(静的ファイルの ?v=1 など)は数えない。
+
+        Returns
+        -------
+            数えた検索の数
+        """
+        count = 0
+        with open(path, encoding='utf-8', errors='replace') as f:
+            for line in f:
+                text = find_log_query(line)
+                if text is None:
+                    continue
+                key = canonicalize_query(text)
+                if key != '?':
+                    self.get_key(key)
+                    count += 1
+        self.flush()
+        return count
+
+    def flush(self) -> None:
+        """メモリ上で数えたヒット数・ミス数をデータベースに書き込む"""
+        if len(self.counter) == 0:
+            return
+        now = int(time.time())
+        self.database.many_query(
+            ['INSERT INTO query_cache_stats (query_key, hit, miss, last_access) VALUES (?, ?, ?, ?) '
+             'ON CONFLICT (query_key) DO UPDATE SET hit=hit+excluded.hit, miss=miss+excluded.miss, '
+             'last_access=excluded.last_access' for _ in self.counter],
+            [(key, hit, miss, now) for key, (hit, miss) in self.counter.items()])
+        self.counter = {}
+
+    def find_popular_key_list(self, limit: int = QUERY_CACHE_POPULAR_COUNT) -> List[str]:
+        """検索回数(ヒット数 + ミス数)の多い順に、正規化したクエリを最大 limit 件"""
+        return [x['query_key'] for x in self.database.select(
+            'SELECT query_key FROM query_cache_stats ORDER BY hit + miss DESC, query_key LIMIT ?', (limit,))]
+
+    def find_stats(self) -> List[Dict[str, any]]:
+        """検索回数の多い順の、正規化したクエリごとのヒット数・ミス数・ヒット率"""
+        output: List[Dict[str, any]] = []
+        for record in self.database.select('SELECT query_key, hit, miss FROM query_cache_stats '
+                                           'ORDER BY hit + miss DESC, query_key'):
+            total = record['hit'] + record['miss']
+            output.append({'query_key': record['query_key'], 'hit': record['hit'], 'miss': record['miss'],
+                           'hit_rate': record['hit'] / total if total > 0 else 0.0})
+        return output
+
+    def reset(self) -> int:
+        """記録したヒット数・ミス数を消す
+
+        Returns
+        -------
+            消したクエリの数
+        """
+        result = self.database.select('SELECT COUNT(*) AS count FROM query_cache_stats')
+        self.database.query('DELETE FROM query_cache_stats')
+        self.counter = {}
+        return result[0]['count']
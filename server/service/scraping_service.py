@@ -1,12 +1,15 @@
 from decimal import Decimal
-from typing import List, MutableMapping, Optional, Dict, Tuple
+from typing import List, MutableMapping, Optional, Dict, Tuple, Iterator, Container, Callable
 
 from pandas import DataFrame
 from requests_html import HTMLSession, BaseParser, Element, HTML
 
 from constant import Lens
+from service.csv_ingest_service import find_csv_path_list, iter_csv_lens
+from service.fragment_parser import parse_fragment
 from service.i_database_service import IDataBaseService
-from service.ulitity import regex, load_csv_lens
+from service.page_cache_service import PageCacheService, canonicalize_url
+from service.ulitity import regex
 
 
 class DomObject:
@@ -40,23 +43,75 @@ class DomObject:
 
 
 class ScrapingService:
-    """スクレイピング用のラッパークラス"""
+    """スクレイピング用のラッパークラス
 
-    def __init__(self, database: IDataBaseService):
+    url_map を渡すと、URLの先頭がキーに一致するページは、値に置き換えたURLから取得する
+    (手元のスタブサーバーで動作を確かめるためのもの。キャッシュには元のURLで入れる)。
+    """
+
+    def __init__(self, database: IDataBaseService, cache: Optional[PageCacheService] = None,
+                 url_map: Optional[Dict[str, str]] = None):
         self.session = HTMLSession()
         self.database = database
-        self.database.query('CREATE TABLE IF NOT EXISTS page_cache (url TEXT PRIMARY KEY, text TEXT)')
+        self.cache = cache if cache is not None else PageCacheService(database)
+        self.url_map: Dict[str, str] = url_map if url_map is not None else {}
+
+    def rewrite_url(self, url: str) -> str:
+        for prefix, replacement in self.url_map.items():
+            if url.startswith(prefix):
+                return replacement + url[len(prefix):]
+        return url
+
+    def get_text(self, url: str) -> str:
+        """ページのHTML(キャッシュに無ければ取得して、キャッシュに入れる)
+
+        URLは正規化してから引き、取得する(#以降だけが違うURLは、同じページとして1度だけ取得する)。
+        """
+        url = canonicalize_url(url)
+        cache_text = self.cache.get(url)
+        if cache_text is not None:
+            return cache_text
+        temp: HTML = self.session.get(self.rewrite_url(url)).html
+        print(f'caching... [{url}]')
+        text = temp.raw_html.decode(temp.encoding)
+        self.cache.put(url, text)
+        return text
 
     def get_page(self, url: str) -> DomObject:
-        cache_data = self.database.select('SELECT text from page_cache WHERE url=?', (url,))
-        if len(cache_data) == 0:
-            temp: HTML = self.session.get(url).html
-            print(f'caching... [{url}]')
-            self.database.query('INSERT INTO page_cache (url, text) VALUES (?, ?)',
-                                (url, temp.raw_html.decode(temp.encoding)))
-            return DomObject(temp)
-        else:
-            return DomObject(HTML(html=cache_data[0]['text']))
+        return DomObject(HTML(html=self.get_text(url)))
+
+    def get_fragment(self, url: str, selector: str, first: bool = True) -> Optional[DomObject]:
+        """ページのうち、セレクターに合う要素だけをパースして返す(ページ全体のDOMは作らない)
+
+        Parameters
+        ----------
+        url: str
+            ページのURL
+        selector: str
+            「tag」「tag.class」「tag#id」と、それらをカンマで並べたセレクター
+        first: bool
+            Trueなら最初に合った要素だけ(閉じた時点でパースを打ち切る)、Falseなら合った要素を全て文書の順に取り出す
+
+        Returns
+        -------
+            取り出した要素を含むDOMオブジェクト(find・find_allで要素を探せる)。合う要素が無ければNone
+        """
+        fragment = parse_fragment(self.get_text(url), selector, first)
+        if fragment is None:
+            return None
+        return DomObject(HTML(html=fragment))
+
+
+def th_td_to_dict(page: Optional[DomObject]) -> Dict[str, str]:
+    """ページ内のth要素とtd要素を、出現順に組にして辞書にする"""
+    output: Dict[str, str] = {}
+    if page is None:
+        return output
+    for th_element, td_element in zip(page.find_all('th'), page.find_all('td')):
+        if th_element is None or td_element is None:
+            continue
+        output[th_element.text] = td_element.text
+    return output
 
 
 def dict_to_lens_for_p(record: Dict[str, str]) -> Lens:
@@ -163,17 +218,19 @@ def dict_to_lens_for_p(record: Dict[str, str]) -> Lens:
     )
 
 
-def get_p_lens_list(scraping: ScrapingService) -> List[Lens]:
+def iter_p_lens(scraping: ScrapingService, skip_url: Container[str] = ()) -> Iterator[Tuple[str, Lens]]:
     """Panasonic製レンズの情報を取得する
 
     Parameters
     ----------
     scraping: ScrapingService
         データスクレイピング用クラス
+    skip_url: Container[str]
+        取得済みのため飛ばす、レンズのURLの一覧
 
     Returns
     -------
-        スクレイピング後のレンズデータ一覧
+        (レンズのURL, スクレイピング後のレンズデータ)。1件パースするごとに返す
     """
     # 情報ページを開く
     page = scraping.get_page('https://panasonic.jp/dc/comparison.html')
@@ -191,7 +248,16 @@ def get_p_lens_list(scraping: ScrapingService) -> List[Lens]:
         break
 
     # tableタグの各行を、Lens型のデータに変換する
-    return [dict_to_lens_for_p(x) for x in df.to_dict(orient='records')]
+    # 1ページに全レンズが載っているので、ページ内の位置をレンズ名で表す
+    for record in df.to_dict(orient='records'):
+        lens_url = f'https://panasonic.jp/dc/comparison.html#{record["レンズ名"]}'
+        if lens_url not in skip_url:
+            yield lens_url, dict_to_lens_for_p(record)
+
+
+def get_p_lens_list(scraping: ScrapingService) -> List[Lens]:
+    """Panasonic製レンズの情報を、一覧としてまとめて取得する"""
+    return [lens for _, lens in iter_p_lens(scraping)]
 
 
 def dict_to_lens_for_p_l(record: Dict[str, str]) -> Lens:
@@ -298,17 +364,19 @@ def dict_to_lens_for_p_l(record: Dict[str, str]) -> Lens:
     )
 
 
-def get_p_l_lens_list(scraping: ScrapingService) -> List[Lens]:
+def iter_p_l_lens(scraping: ScrapingService, skip_url: Container[str] = ()) -> Iterator[Tuple[str, Lens]]:
     """Panasonic製レンズの情報を取得する
 
     Parameters
     ----------
     scraping: ScrapingService
         データスクレイピング用クラス
+    skip_url: Container[str]
+        取得済みのため飛ばす、レンズのURLの一覧
 
     Returns
     -------
-        スクレイピング後のレンズデータ一覧
+        (レンズのURL, スクレイピング後のレンズデータ)。1件パースするごとに返す
     """
     # 情報ページを開く
     page = scraping.get_page('https://panasonic.jp/dc/comparison.html')
@@ -332,7 +400,16 @@ def get_p_l_lens_list(scraping: ScrapingService) -> List[Lens]:
         break
 
     # tableタグの各行を、Lens型のデータに変換する
-    return [dict_to_lens_for_p_l(x) for x in df.to_dict(orient='records')]
+    # 1ページに全レンズが載っているので、ページ内の位置をレンズ名で表す
+    for record in df.to_dict(orient='records'):
+        lens_url = f'https://panasonic.jp/dc/comparison.html#{record["レンズ名"]}'
+        if lens_url not in skip_url:
+            yield lens_url, dict_to_lens_for_p_l(record)
+
+
+def get_p_l_lens_list(scraping: ScrapingService) -> List[Lens]:
+    """Panasonic製レンズの情報を、一覧としてまとめて取得する"""
+    return [lens for _, lens in iter_p_l_lens(scraping)]
 
 
 def dict_to_lens_for_o(record: Dict[str, str], record2: Dict[str, str]) -> Lens:
@@ -463,56 +540,75 @@ def dict_to_lens_for_o(record: Dict[str, str], record2: Dict[str, str]) -> Lens:
     )
 
 
-def get_o_lens_list(scraping: ScrapingService) -> List[Lens]:
+def iter_o_lens(scraping: ScrapingService, skip_url: Container[str] = ()) -> Iterator[Tuple[str, Lens]]:
     """OLYMPUS製レンズの情報を取得する
 
     Parameters
     ----------
     scraping: ScrapingService
         データスクレイピング用クラス
+    skip_url: Container[str]
+        取得済みのため飛ばす、レンズのURLの一覧
 
     Returns
     -------
-        スクレイピング後のレンズデータ一覧
+        (レンズのURL, スクレイピング後のレンズデータ)。1件パースするごとに返す
     """
 
-    # レンズのURL一覧を取得する
+    for lens_url, lens_name in find_o_lens_url_list(scraping):
+        if lens_url in skip_url:
+            continue
+        yield lens_url, parse_o_lens(scraping, lens_url, lens_name)
+
+
+def find_o_lens_url_list(scraping: ScrapingService) -> List[Tuple[str, str]]:
+    """OLYMPUS製レンズの一覧ページから、(レンズのURL, レンズ名)の一覧を取得する"""
     page = scraping.get_page('https://www.olympus-imaging.jp/product/dslr/mlens/index.html')
-    lens_list: List[Tuple[str, str]] = []
+    output: List[Tuple[str, str]] = []
     for a_element in page.find_all('h2.productName > a'):
         lens_name = a_element.text.split('/')[0].replace('\n', '')
         if 'M.ZUIKO' not in lens_name:
             continue
         lens_product_number = a_element.attrs['href'].replace('/product/dslr/mlens/', '').replace('/index.html', '')
-        lens_list.append((lens_name, lens_product_number))
-
-    # レンズごとに情報を取得する
-    output: List[Lens] = []
-    for lens_name, lens_product_number in lens_list:
-        # ざっくり情報を取得する
-        spec_url = f'https://www.olympus-imaging.jp/product/dslr/mlens/{lens_product_number}/spec.html'
-        page = scraping.get_page(spec_url)
-        temp_dict: Dict[str, str] = {}
-        for th_element, td_element in zip(page.find_all('th'), page.find_all('td')):
-            if th_element is None or td_element is None:
-                continue
-            temp_dict[th_element.text] = td_element.text
-        temp_dict['レンズ名'] = lens_name
-        temp_dict['品番'] = lens_product_number
-
-        index_url = f'https://www.olympus-imaging.jp/product/dslr/mlens/{lens_product_number}/index.html'
-        page = scraping.get_page(index_url)
-        temp_dict2: Dict[str, str] = {}
-        for th_element, td_element in zip(page.find_all('th'), page.find_all('td')):
-            if th_element is None or td_element is None:
-                continue
-            temp_dict2[th_element.text] = td_element.text
-
-        # 詳細な情報を取得する
-        output.append(dict_to_lens_for_o(temp_dict, temp_dict2))
+        output.append((f'https://www.olympus-imaging.jp/product/dslr/mlens/{lens_product_number}/spec.html',
+                       lens_name))
     return output
 
 
+def parse_o_lens(scraping: ScrapingService, lens_url: str, lens_name: str) -> Lens:
+    """OLYMPUS製レンズの個別ページから、レンズの情報を取得する
+
+    Parameters
+    ----------
+    scraping: ScrapingService
+        データスクレイピング用クラス
+    lens_url: str
+        レンズのURL(find_o_lens_url_list で取得したもの)
+    lens_name: str
+        レンズ名
+
+    Returns
+    -------
+        スクレイピング後のレンズデータ
+    """
+    # ざっくり情報を取得する
+    lens_product_number = lens_url.split('/')[-2]
+    temp_dict = th_td_to_dict(scraping.get_fragment(lens_url, 'th, td', first=False))
+    temp_dict['レンズ名'] = lens_name
+    temp_dict['品番'] = lens_product_number
+
+    index_url = f'https://www.olympus-imaging.jp/product/dslr/mlens/{lens_product_number}/index.html'
+    temp_dict2 = th_td_to_dict(scraping.get_fragment(index_url, 'th, td', first=False))
+
+    # 詳細な情報を取得する
+    return dict_to_lens_for_o(temp_dict, temp_dict2)
+
+
+def get_o_lens_list(scraping: ScrapingService) -> List[Lens]:
+    """OLYMPUS製レンズの情報を、一覧としてまとめて取得する"""
+    return [lens for _, lens in iter_o_lens(scraping)]
+
+
 def dict_to_lens_for_s(record: Dict[str, str]) -> Lens:
     """辞書型をレンズデータに変換する
 
@@ -613,53 +709,80 @@ def dict_to_lens_for_s(record: Dict[str, str]) -> Lens:
     )
 
 
-def get_s_lens_list(scraping: ScrapingService) -> List[Lens]:
+def iter_s_lens(scraping: ScrapingService, skip_url: Container[str] = ()) -> Iterator[Tuple[str, Lens]]:
     """SIGMA製レンズの情報を取得する
 
     Parameters
     ----------
     scraping: ScrapingService
         データスクレイピング用クラス
+    skip_url: Container[str]
+        取得済みのため飛ばす、レンズのURLの一覧
 
     Returns
     -------
-        スクレイピング後のレンズデータ一覧
+        (レンズのURL, スクレイピング後のレンズデータ)。1件パースするごとに返す
     """
 
-    # レンズのURL一覧を取得する
+    for lens_url, lens_name in find_s_lens_url_list(scraping):
+        if lens_url in skip_url:
+            continue
+        yield lens_url, parse_s_lens(scraping, lens_url, lens_name)
+
+
+def find_s_lens_url_list(scraping: ScrapingService) -> List[Tuple[str, str]]:
+    """SIGMA製レンズの一覧ページから、(レンズのURL, レンズ名)の一覧を取得する"""
     page = scraping.get_page('https://www.sigma-global.com/jp/lenses/#/all/micro-four-thirds/')
-    lens_list: List[Tuple[str, str]] = []
+    output: List[Tuple[str, str]] = []
     for li_element in page.find_all('li.micro-four-thirds'):
         lens_link = 'https://www.sigma-global.com/' + li_element.find('a').attrs['href']
         if 'product' not in lens_link:
             continue
-        lens_name = li_element.text.splitlines()[1]
-        lens_list.append((lens_name, lens_link))
-
-    # レンズごとに情報を取得する
-    output: List[Lens] = []
-    for lens_name, lens_link in lens_list:
-        # ざっくり情報を取得する
-        page = scraping.get_page(lens_link + 'specifications/')
-        temp_dict: Dict[str, str] = {}
-        th_text = ''
-        for tr_element in page.find('table').find_all('tr'):
-            th_elements = tr_element.find_all('th')
-            if len(th_elements) > 0:
-                th_text = th_elements[0].text
-            td_elements = tr_element.find_all('td')
-            if len(td_elements) == 1:
-                temp_dict[th_text] = td_elements[0].text
-            elif len(td_elements) == 2:
-                temp_dict[th_text + ' ' + td_elements[0].text] = td_elements[1].text
-        temp_dict['レンズ名'] = lens_name
-        temp_dict['品番'] = lens_link.split('/')[-2]
-
-        # 詳細な情報を取得する
-        output.append(dict_to_lens_for_s(temp_dict))
+        output.append((lens_link, li_element.text.splitlines()[1]))
     return output
 
 
+def parse_s_lens(scraping: ScrapingService, lens_url: str, lens_name: str) -> Lens:
+    """SIGMA製レンズの個別ページから、レンズの情報を取得する
+
+    Parameters
+    ----------
+    scraping: ScrapingService
+        データスクレイピング用クラス
+    lens_url: str
+        レンズのURL(find_s_lens_url_list で取得したもの)
+    lens_name: str
+        レンズ名
+
+    Returns
+    -------
+        スクレイピング後のレンズデータ
+    """
+    # ざっくり情報を取得する
+    table_element = scraping.get_fragment(lens_url + 'specifications/', 'table')
+    temp_dict: Dict[str, str] = {}
+    th_text = ''
+    for tr_element in table_element.find_all('tr'):
+        th_elements = tr_element.find_all('th')
+        if len(th_elements) > 0:
+            th_text = th_elements[0].text
+        td_elements = tr_element.find_all('td')
+        if len(td_elements) == 1:
+            temp_dict[th_text] = td_elements[0].text
+        elif len(td_elements) == 2:
+            temp_dict[th_text + ' ' + td_elements[0].text] = td_elements[1].text
+    temp_dict['レンズ名'] = lens_name
+    temp_dict['品番'] = lens_url.split('/')[-2]
+
+    # 詳細な情報を取得する
+    return dict_to_lens_for_s(temp_dict)
+
+
+def get_s_lens_list(scraping: ScrapingService) -> List[Lens]:
+    """SIGMA製レンズの情報を、一覧としてまとめて取得する"""
+    return [lens for _, lens in iter_s_lens(scraping)]
+
+
 def dict_to_lens_for_s_l(record: Dict[str, str]) -> Lens:
     """辞書型をレンズデータに変換する
 
@@ -769,57 +892,84 @@ def dict_to_lens_for_s_l(record: Dict[str, str]) -> Lens:
     )
 
 
-def get_s_l_lens_list(scraping: ScrapingService) -> List[Lens]:
+def iter_s_l_lens(scraping: ScrapingService, skip_url: Container[str] = ()) -> Iterator[Tuple[str, Lens]]:
     """SIGMA製レンズの情報を取得する
 
     Parameters
     ----------
     scraping: ScrapingService
         データスクレイピング用クラス
+    skip_url: Container[str]
+        取得済みのため飛ばす、レンズのURLの一覧
 
     Returns
     -------
-        スクレイピング後のレンズデータ一覧
+        (レンズのURL, スクレイピング後のレンズデータ)。1件パースするごとに返す
     """
 
-    # レンズのURL一覧を取得する
+    for lens_url, lens_name in find_s_l_lens_url_list(scraping):
+        if lens_url in skip_url:
+            continue
+        yield lens_url, parse_s_l_lens(scraping, lens_url, lens_name)
+
+
+def find_s_l_lens_url_list(scraping: ScrapingService) -> List[Tuple[str, str]]:
+    """SIGMA製レンズの一覧ページから、(レンズのURL, レンズ名)の一覧を取得する"""
     page = scraping.get_page('https://www.sigma-global.com/jp/lenses/#/all/l-mount/')
-    lens_list: List[Tuple[str, str]] = []
+    output: List[Tuple[str, str]] = []
     for li_element in page.find_all('li.l-mount'):
         lens_link = 'https://www.sigma-global.com/' + li_element.find('a').attrs['href']
         if 'product' not in lens_link:
             continue
-        lens_name = li_element.text.splitlines()[1]
-        lens_list.append((lens_name, lens_link))
-
-    # レンズごとに情報を取得する
-    output: List[Lens] = []
-    for lens_name, lens_link in lens_list:
-        # ざっくり情報を取得する
-        page = scraping.get_page(lens_link + 'specifications/')
-        temp_dict: Dict[str, str] = {}
-        th_text = ''
-        for tr_element in page.find('table').find_all('tr'):
-            th_elements = tr_element.find_all('th')
-            if len(th_elements) > 0:
-                th_text = th_elements[0].text
-            td_elements = tr_element.find_all('td')
-            if len(td_elements) == 1:
-                temp_dict[th_text] = td_elements[0].text
-            elif len(td_elements) == 2:
-                temp_dict[th_text + ' ' + td_elements[0].text] = td_elements[1].text
-        temp_dict['レンズ名'] = lens_name
-        temp_dict['品番'] = lens_link.split('/')[-2]
-
-        page = scraping.get_page(lens_link + 'features/')
-        if '防塵防滴' in page.full_text:
-            temp_dict['防塵防滴'] = '○'
-
-        # 詳細な情報を取得する
-        output.append(dict_to_lens_for_s_l(temp_dict))
+        output.append((lens_link, li_element.text.splitlines()[1]))
     return output
 
 
+def parse_s_l_lens(scraping: ScrapingService, lens_url: str, lens_name: str) -> Lens:
+    """SIGMA製レンズの個別ページから、レンズの情報を取得する
+
+    Parameters
+    ----------
+    scraping: ScrapingService
+        データスクレイピング用クラス
+    lens_url: str
+        レンズのURL(find_s_l_lens_url_list で取得したもの)
+    lens_name: str
+        レンズ名
+
+    Returns
+    -------
+        スクレイピング後のレンズデータ
+    """
+    # ざっくり情報を取得する
+    table_element = scraping.get_fragment(lens_url + 'specifications/', 'table')
+    temp_dict: Dict[str, str] = {}
+    th_text = ''
+    for tr_element in table_element.find_all('tr'):
+        th_elements = tr_element.find_all('th')
+        if len(th_elements) > 0:
+            th_text = th_elements[0].text
+        td_elements = tr_element.find_all('td')
+        if len(td_elements) == 1:
+            temp_dict[th_text] = td_elements[0].text
+        elif len(td_elements) == 2:
+            temp_dict[th_text + ' ' + td_elements[0].text] = td_elements[1].text
+    temp_dict['レンズ名'] = lens_name
+    temp_dict['品番'] = lens_url.split('/')[-2]
+
+    page = scraping.get_page(lens_url + 'features/')
+    if '防塵防滴' in page.full_text:
+        temp_dict['防塵防滴'] = '○'
+
+    # 詳細な情報を取得する
+    return dict_to_lens_for_s_l(temp_dict)
+
+
+def get_s_l_lens_list(scraping: ScrapingService) -> List[Lens]:
+    """SIGMA製レンズの情報を、一覧としてまとめて取得する"""
+    return [lens for _, lens in iter_s_l_lens(scraping)]
+
+
 def dict_to_lens_for_l_l(record: Dict[str, str]) -> Lens:
     """辞書型をレンズデータに変換する
 
@@ -954,21 +1104,32 @@ def dict_to_lens_for_l_l(record: Dict[str, str]) -> Lens:
     )
 
 
-def get_l_l_lens_list(scraping: ScrapingService) -> List[Lens]:
+def iter_l_l_lens(scraping: ScrapingService, skip_url: Container[str] = ()) -> Iterator[Tuple[str, Lens]]:
     """ライカ製レンズの情報を取得する
 
     Parameters
     ----------
     scraping: ScrapingService
         データスクレイピング用クラス
+    skip_url: Container[str]
+        取得済みのため飛ばす、レンズのURLの一覧
 
     Returns
     -------
-        スクレイピング後のレンズデータ一覧
+        (レンズのURL, スクレイピング後のレンズデータ)。1件パースするごとに返す
     """
 
-    # レンズのURL一覧を取得する
-    lens_list: List[Tuple[str, str]] = []
+    for lens_url, lens_name in find_l_l_lens_url_list(scraping):
+        if lens_url in skip_url:
+            continue
+        lens = parse_l_l_lens(scraping, lens_url, lens_name)
+        if lens is not None:
+            yield lens_url, lens
+
+
+def find_l_l_lens_url_list(scraping: ScrapingService) -> List[Tuple[str, str]]:
+    """ライカ製レンズの一覧ページから、(レンズのURL, レンズ名)の一覧を取得する"""
+    output: List[Tuple[str, str]] = []
     page_list = [
         'https://us.leica-camera.com/Photography/Leica-SL/SL-Lenses/Prime-Lenses',
         'https://us.leica-camera.com/Photography/Leica-SL/SL-Lenses/Vario-Lenses'
@@ -987,23 +1148,67 @@ def get_l_l_lens_list(scraping: ScrapingService) -> List[Lens]:
                 continue
             lens_name = h2_element.text.replace('\n', '').replace(span_element.text, '')
             lens_url = 'https://us.leica-camera.com' + a_element.attrs['href']
-            lens_list.append((lens_name, lens_url))
-
-    # レンズの情報を取得する
-    output: List[Lens] = []
-    for lens_name, lens_url in lens_list:
-        page = scraping.get_page(lens_url)
-        temp: Dict[str, str] = {'レンズ名': lens_name}
-        section_element = page.find('section.tech-specs')
-        if section_element is not None:
-            for tr_element in section_element.find_all('tr'):
-                td_elements = tr_element.find_all('td')
-                if len(td_elements) < 2:
-                    continue
-                temp[td_elements[0].text] = td_elements[1].text
-            output.append(dict_to_lens_for_l_l(temp))
+            output.append((lens_url, lens_name))
     return output
 
 
+def parse_l_l_lens(scraping: ScrapingService, lens_url: str, lens_name: str) -> Optional[Lens]:
+    """ライカ製レンズの個別ページから、レンズの情報を取得する
+
+    Parameters
+    ----------
+    scraping: ScrapingService
+        データスクレイピング用クラス
+    lens_url: str
+        レンズのURL(find_l_l_lens_url_list で取得したもの)
+    lens_name: str
+        レンズ名
+
+    Returns
+    -------
+        スクレイピング後のレンズデータ(仕様の表が無いページならNone)
+    """
+    temp: Dict[str, str] = {'レンズ名': lens_name}
+    section_element = scraping.get_fragment(lens_url, 'section.tech-specs')
+    if section_element is None:
+        return None
+    for tr_element in section_element.find_all('tr'):
+        td_elements = tr_element.find_all('td')
+        if len(td_elements) < 2:
+            continue
+        temp[td_elements[0].text] = td_elements[1].text
+    return dict_to_lens_for_l_l(temp)
+
+
+def get_l_l_lens_list(scraping: ScrapingService) -> List[Lens]:
+    """ライカ製レンズの情報を、一覧としてまとめて取得する"""
+    return [lens for _, lens in iter_l_l_lens(scraping)]
+
+
+# 一覧ページとレンズごとのページに分けて取得するメーカー(スクレイピング処理)の、
+# (一覧ページから(レンズのURL, レンズ名)の一覧を取得する関数, レンズごとのページから情報を取得する関数)。
+# レンズごとのページは、クロールキュー(CrawlQueueService)を介して複数のワーカーで分担して取得できる
+LENS_PAGE_SCRAPER_MAP: Dict[str, Tuple[Callable[[ScrapingService], List[Tuple[str, str]]],
+                                       Callable[[ScrapingService, str, str], Optional[Lens]]]] = {
+    'olympus_mft': (find_o_lens_url_list, parse_o_lens),
+    'sigma_mft': (find_s_lens_url_list, parse_s_lens),
+    'sigma_l': (find_s_l_lens_url_list, parse_s_l_lens),
+    'leica_l': (find_l_l_lens_url_list, parse_l_l_lens),
+}
+
+
+def iter_other_lens(skip_url: Container[str] = ()) -> Iterator[Tuple[str, Lens]]:
+    """その他のレンズの情報を、csvディレクトリにあるCSVファイルから1件ずつ取得する
+
+    URLの代わりに「ファイルパス#レンズ名」を返す。
+    レンズマウントはmount列か、ファイル名(CSV_MOUNT_MAP)から決める。
+    """
+    for path in find_csv_path_list(['csv']):
+        for lens in iter_csv_lens(path):
+            lens_url = f'{path}#{lens.name}'
+            if lens_url not in skip_url:
+                yield lens_url, lens
+
+
 def get_other_lens_list():
-    return load_csv_lens('csv/m4_3.csv', 'マイクロフォーサーズ') + load_csv_lens('csv/l_mount.csv', 'ライカL')
+    return [lens for _, lens in iter_other_lens()]
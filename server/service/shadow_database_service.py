@@ -0,0 +1,130 @@
+import os
+import shutil
+from contextlib import contextmanager
+from sqlite3 import connect, OperationalError
+from typing import Iterator
+
+from service.sqlite_database_service import SqliteDataBaseService
+
+
+class ShadowDatabaseService:
+    """データベースの複製(シャドウ)に書き込み、検証してから差し替える
+
+    create で現在のデータベースを(SQLiteのバックアップAPIで)シャドウに複製し、ビルドはそちらに書き込む。
+    validate で件数や不変条件を確かめたら、swap で本来のパスへ os.replace する(差し替えは一瞬で終わる)。
+    差し替え前から開いている接続は古いファイルを読み続けるので、読み手が作りかけの状態を見ることはない。
+    差し替え前のデータベースは「パス + .prev」として残し、rollback で戻せる。
+
+    シャドウを複製してから差し替えるまでに現在のデータベースへ書き込まれた内容は、差し替えで失われる。
+    そのため、その間は lock_build で「パス + .lock」のロックを排他的に持ち、現在のデータベースに書き込むコマンドは
+    use で同じロックを共有して持つ(ビルドが差し替え中ならコマンドを断り、コマンドの実行中ならビルドが待つ)。
+    """
+
+    def __init__(self, database_path: str):
+        self.database_path = database_path
+        self.shadow_path = database_path + '.shadow'
+        self.previous_path = database_path + '.prev'
+        self.lock_path = database_path + '.lock'
+
+    @contextmanager
+    def lock_build(self, timeout: float) -> Iterator[None]:
+        """シャドウの複製から差し替えまでの間、現在のデータベースに書き込むコマンドを止める
+
+        use で実行中のコマンドが終わるまで最大 timeout 秒待ち、終わらなければValueErrorを投げる。
+        """
+        conn = connect(self.lock_path, timeout=timeout, isolation_level=None)
+        try:
+            try:
+                conn.execute('BEGIN EXCLUSIVE')
+            except OperationalError:
+                raise ValueError('データベースに書き込むコマンドが実行中のため、差し替えられません.')
+            yield
+        finally:
+            conn.close()
+
+    @contextmanager
+    def use(self) -> Iterator[None]:
+        """現在のデータベースに書き込むコマンドの間、ビルドによる差し替えを止める(コマンド同士は同時に実行できる)
+
+        ビルドが差し替えの最中なら、書き込みが失われないよう、待たずにValueErrorを投げる。
+        """
+        conn = connect(self.lock_path, timeout=0, isolation_level=None)
+        try:
+            try:
+                # 読み取りのトランザクションの間、共有ロックを持ち続ける
+                conn.execute('BEGIN')
+                conn.execute('SELECT COUNT(*) FROM sqlite_master').fetchall()
+            except OperationalError:
+                raise ValueError('ビルドがデータベースを差し替えている最中のため、実行できません.')
+            yield
+        finally:
+            conn.close()
+
+    def create(self) -> SqliteDataBaseService:
+        """現在のデータベースをシャドウに複製し、シャドウを読み書きするためのクラスを返す"""
+        self.discard()
+        source = connect(self.database_path)
+        target = connect(self.shadow_path)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+        return SqliteDataBaseService(self.shadow_path)
+
+    def discard(self) -> None:
+        """シャドウを削除する"""
+        for path in [self.shadow_path, self.shadow_path + '-journal']:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def validate(self, expected_count: int, min_ratio: float = 0.5) -> None:
+        """シャドウの内容を検証する(問題があればValueErrorを投げる)
+
+        Parameters
+        ----------
+        expected_count: int
+            書き込んだはずのレンズの件数
+        min_ratio: float
+            現在のデータベースと比べて、レンズの件数がこの割合を下回ったら異常とみなす
+            (スクレイピングが何も取得できずに終わった場合などへの備え)
+        """
+        shadow = SqliteDataBaseService(self.shadow_path)
+        result = shadow.select('PRAGMA integrity_check')
+        if result[0]['integrity_check'] != 'ok':
+            raise ValueError(f'シャドウが破損しています({result[0]["integrity_check"]}).')
+
+        count = shadow.select('SELECT COUNT(*) AS count, COUNT(DISTINCT id) AS id_count FROM lens')[0]
+        if count['count'] != expected_count:
+            raise ValueError(f'レンズの件数({count["count"]})が、書き込んだ件数({expected_count})と一致しません.')
+        if count['id_count'] != count['count']:
+            raise ValueError('レンズのIDが重複しています.')
+        fts_count = shadow.select('SELECT COUNT(*) AS count FROM lens_fts')[0]['count']
+        if fts_count != count['count']:
+            raise ValueError(f'全文検索用インデックスの件数({fts_count})が、レンズの件数({count["count"]})と一致しません.')
+        empty_count = shadow.select("SELECT COUNT(*) AS count FROM lens WHERE name = '' OR maker = '' OR mount = ''")
+        if empty_count[0]['count'] > 0:
+            raise ValueError(f'名前・メーカー・マウントが空のレンズが{empty_count[0]["count"]}件あります.')
+
+        current = SqliteDataBaseService(self.database_path)
+        if len(current.select("SELECT name FROM sqlite_master WHERE type='table' AND name='lens'")) > 0:
+            current_count = current.select('SELECT COUNT(*) AS count FROM lens')[0]['count']
+            if count['count'] < current_count * min_ratio:
+                raise ValueError(f'レンズの件数が{current_count}件から{count["count"]}件に減っています.')
+
+    def swap(self) -> None:
+        """シャドウを本来のパスへ差し替え、差し替え前のデータベースを .prev として残す"""
+        if os.path.exists(self.previous_path):
+            os.remove(self.previous_path)
+        try:
+            os.link(self.database_path, self.previous_path)
+        except OSError:
+            # ハードリンクを作れないファイルシステムでは複製する
+            shutil.copy2(self.database_path, self.previous_path)
+        os.replace(self.shadow_path, self.database_path)
+
+    def rollback(self) -> None:
+        """差し替え前のデータベースに戻す"""
+        if not os.path.exists(self.previous_path):
+            raise ValueError(f'{self.previous_path}が無いため、元に戻せません.')
+        os.replace(self.previous_path, self.database_path)
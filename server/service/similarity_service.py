@@ -0,0 +1,223 @@
+import heapq
+import math
+from typing import List, Dict, Optional, Tuple, Set
+
+import numpy
+
+from constant import Lens
+from service.i_lens_listener import ILensListener
+
+# 類似度の計算に用いる項目と、その重み
+DEFAULT_WEIGHTS: Dict[str, float] = {
+    'wide_focal_length': 1.0,
+    'telephoto_focal_length': 1.0,
+    'wide_f_number': 1.0,
+    'telephoto_f_number': 0.5,
+    'weight': 1.0,
+    'overall_diameter': 0.5,
+    'overall_length': 0.5,
+    'price': 1.0,
+}
+
+# 比率で比べるべき(対数を取ってから正規化する)項目
+LOG_SCALE_FIELDS = ['wide_focal_length', 'telephoto_focal_length', 'weight', 'price']
+
+# 差分として溜めておける件数(これを超えると索引全体を作り直す)
+REBUILD_MIN_PENDING = 256
+REBUILD_PENDING_RATIO = 0.05
+
+
+class KdTree:
+    """k-d木
+
+    葉には複数の点をまとめて格納し、葉の中の距離計算はnumpyで一括して行う。
+    各ノードは担当する点の外接直方体を持ち、探索は外接直方体までの距離が近い順に行う。
+    """
+
+    def __init__(self, points: numpy.ndarray, ids: numpy.ndarray, leaf_size: int = 256):
+        self.leaf_size = leaf_size
+        order = numpy.arange(len(points))
+        self.left: List[int] = []
+        self.start: List[int] = []
+        self.end: List[int] = []
+        lower_list: List[numpy.ndarray] = []
+        upper_list: List[numpy.ndarray] = []
+
+        # 再帰を使わずに、幅の最も広い次元の中央値で分割していく
+        stack: List[Tuple[int, int, int]] = [(self.new_node(0, len(points)), 0, len(points))]
+        lower_list.append(points.min(axis=0))
+        upper_list.append(points.max(axis=0))
+        while len(stack) > 0:
+            node, start, end = stack.pop()
+            if end - start <= leaf_size:
+                continue
+            sub = points[order[start:end]]
+            dim = int(numpy.argmax(upper_list[node] - lower_list[node]))
+            mid = (end - start) // 2
+            order[start:end] = order[start:end][numpy.argpartition(sub[:, dim], mid)]
+            for child_start, child_end in [(start, start + mid), (start + mid, end)]:
+                child = self.new_node(child_start, child_end)
+                child_points = points[order[child_start:child_end]]
+                lower_list.append(child_points.min(axis=0))
+                upper_list.append(child_points.max(axis=0))
+                stack.append((child, child_start, child_end))
+            # 右の子は、常に左の子の次の番号になる
+            self.left[node] = child - 1
+
+        # 葉の点が連続して並ぶように並べ替えておく
+        self.points = points[order]
+        self.ids = ids[order]
+        self.lower = numpy.array(lower_list)
+        self.upper = numpy.array(upper_list)
+
+    def new_node(self, start: int, end: int) -> int:
+        self.left.append(-1)
+        self.start.append(start)
+        self.end.append(end)
+        return len(self.start) - 1
+
+    def query(self, point: numpy.ndarray, k: int, exclude: Set[int], best: List[Tuple[float, int]]) -> None:
+        """近い順にk個の(距離の符号を反転したもの, ID)を、ヒープbestに集める。excludeに含まれるIDは除外する
+
+        bestに他の木の探索結果が入っている場合、それより遠い部分は探索しない。
+        """
+        if k <= 0:
+            return
+        queue: List[Tuple[float, int]] = [(0.0, 0)]
+        while len(queue) > 0:
+            distance, node = heapq.heappop(queue)
+            if len(best) == k and distance >= -best[0][0]:
+                break
+            child = self.left[node]
+            if child < 0:
+                # 葉の中では近い順に見ていき、それ以上良くならなくなった時点で打ち切る
+                start, end = self.start[node], self.end[node]
+                distance_list = ((self.points[start:end] - point) ** 2).sum(axis=1)
+                worst = -best[0][0] if len(best) == k else math.inf
+                candidate = numpy.nonzero(distance_list < worst)[0]
+                for i in candidate[numpy.argsort(distance_list[candidate])]:
+                    item = (-float(distance_list[i]), int(self.ids[start + i]))
+                    if len(best) == k and item <= best[0]:
+                        break
+                    if item[1] in exclude:
+                        continue
+                    if len(best) < k:
+                        heapq.heappush(best, item)
+                    else:
+                        heapq.heapreplace(best, item)
+                continue
+
+            # 左右の子は連番で作られているので、外接直方体までの距離をまとめて計算する
+            gap = numpy.maximum(self.lower[child:child + 2] - point, 0) \
+                + numpy.maximum(point - self.upper[child:child + 2], 0)
+            for i, child_distance in enumerate((gap ** 2).sum(axis=1).tolist()):
+                if len(best) < k or child_distance < -best[0][0]:
+                    heapq.heappush(queue, (child_distance, child + i))
+
+
+class SimilarityService(ILensListener):
+    """スペックの近いレンズを探すための索引
+
+    数値項目を正規化(必要に応じて対数化した上で標準化)し、重みを掛けた空間での
+    ユークリッド距離を「似ていなさ」とする。マウントごとにk-d木を持つ。
+    価格が0円(不明)のものは、価格の項目を平均値として扱う。
+
+    LensServiceにlistenerとして登録すると、保存されたレンズを差分として取り込み、
+    差分が溜まった時点で索引全体を作り直す。
+    """
+
+    def __init__(self, lens_list: List[Lens], weights: Optional[Dict[str, float]] = None, leaf_size: int = 256):
+        if weights is None:
+            weights = DEFAULT_WEIGHTS
+        self.weights = {k: v for k, v in weights.items() if v > 0}
+        self.field_list = list(self.weights.keys())
+        self.leaf_size = leaf_size
+        self.rebuild(lens_list)
+
+    def rebuild(self, lens_list: List[Lens]) -> None:
+        """索引全体を作り直す"""
+        self.lens_dict: Dict[int, Lens] = {x.id: x for x in lens_list}
+        lens_list = list(self.lens_dict.values())
+        raw = self.to_raw_matrix(lens_list)
+        if len(lens_list) > 0:
+            self.mean = numpy.nan_to_num(numpy.nanmean(raw, axis=0))
+            self.std = numpy.nan_to_num(numpy.nanstd(raw, axis=0))
+            self.std[self.std == 0] = 1
+        else:
+            self.mean = numpy.zeros(len(self.field_list))
+            self.std = numpy.ones(len(self.field_list))
+        vectors = self.normalize(raw)
+        ids = numpy.array([x.id for x in lens_list], dtype=numpy.int64)
+        mounts = numpy.array([x.mount for x in lens_list])
+        self.tree_dict: Dict[str, KdTree] = {}
+        for mount in sorted(set(mounts.tolist())):
+            mask = mounts == mount
+            self.tree_dict[mount] = KdTree(vectors[mask], ids[mask], self.leaf_size)
+        self.pending: Dict[int, Tuple[str, numpy.ndarray]] = {}
+        self.removed: Set[int] = set()
+
+    def to_raw_matrix(self, lens_list: List[Lens]) -> numpy.ndarray:
+        raw = numpy.array([[getattr(x, y) for y in self.field_list] for x in lens_list], dtype=float)
+        raw = raw.reshape(len(lens_list), len(self.field_list))
+        if 'price' in self.field_list:
+            price = raw[:, self.field_list.index('price')]
+            price[price <= 0] = numpy.nan
+        for i, field in enumerate(self.field_list):
+            if field in LOG_SCALE_FIELDS:
+                raw[:, i] = numpy.log1p(numpy.maximum(raw[:, i], 0))
+        return raw
+
+    def normalize(self, raw: numpy.ndarray) -> numpy.ndarray:
+        scale = numpy.sqrt(numpy.array([self.weights[x] for x in self.field_list]))
+        temp = (raw - self.mean) / self.std
+        return numpy.nan_to_num(temp) * scale
+
+    def to_vector(self, lens: Lens) -> numpy.ndarray:
+        return self.normalize(self.to_raw_matrix([lens]))[0]
+
+    def find_similar(self, lens: Lens, k: int = 10, mount: Optional[str] = None) -> List[Tuple[Lens, float]]:
+        """スペックの近いレンズを探す
+
+        Parameters
+        ----------
+        lens: Lens
+            基準となるレンズ(同じIDのレンズは結果から除く)
+        k: int
+            最大件数(0以下なら空の一覧を返す)
+        mount: Optional[str]
+            結果をこのマウントのレンズに限る場合に指定する
+
+        Returns
+        -------
+            (レンズ, 距離)の一覧。近い順
+        """
+        if k <= 0:
+            return []
+        point = self.to_vector(lens)
+        best: List[Tuple[float, int]] = []  # 距離の2乗の符号を反転したヒープ(先頭が最も遠い)
+        # 木を作った後に保存したレンズは、最新の値で総当たりする
+        for lens_id, (pending_mount, vector) in self.pending.items():
+            if lens_id != lens.id and (mount is None or pending_mount == mount):
+                item = (-float(((vector - point) ** 2).sum()), lens_id)
+                if len(best) < k:
+                    heapq.heappush(best, item)
+                elif item > best[0]:
+                    heapq.heapreplace(best, item)
+        # 近いものが見つかりやすい、基準レンズと同じマウントの木から探索する
+        # (木にある古い値は、保存し直したレンズ(removed)のものなので除く)
+        exclude = self.removed | {lens.id}
+        for tree_mount in sorted(self.tree_dict.keys(), key=lambda x: x != lens.mount):
+            if mount is None or tree_mount == mount:
+                self.tree_dict[tree_mount].query(point, k, exclude, best)
+        return [(self.lens_dict[x[1]], math.sqrt(-x[0])) for x in sorted(best, reverse=True)]
+
+    def on_save(self, lens: Lens) -> None:
+        if lens.id in self.lens_dict and lens.id not in self.pending:
+            self.removed.add(lens.id)
+        self.lens_dict[lens.id] = lens
+        self.pending[lens.id] = (lens.mount, self.to_vector(lens))
+        if len(self.pending) > max(REBUILD_MIN_PENDING, len(self.lens_dict) * REBUILD_PENDING_RATIO):
+            self.rebuild(list(self.lens_dict.values()))
+
+    def on_delete_all(self) -> None:
+        self.rebuild([])
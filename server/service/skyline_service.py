@@ -0,0 +1,132 @@
+from typing import List, Dict
+
+import numpy
+
+from constant import Lens
+
+# 事前計算しておくスカイラインの定義(項目名 → 'min'なら小さいほど、'max'なら大きいほど良い)
+SKYLINE_PRESET_LIST: Dict[str, Dict[str, str]] = {
+    # 軽く・安く・明るく・望遠まで届く
+    'light_cheap_bright_long': {
+        'weight': 'min',
+        'price': 'min',
+        'wide_f_number': 'min',
+        'telephoto_focal_length': 'max',
+    },
+    # 軽く・明るい
+    'light_bright': {
+        'weight': 'min',
+        'wide_f_number': 'min',
+    },
+    # 軽く・望遠まで届く
+    'light_long': {
+        'weight': 'min',
+        'telephoto_focal_length': 'max',
+    },
+    # 安く・明るい
+    'cheap_bright': {
+        'price': 'min',
+        'wide_f_number': 'min',
+    },
+}
+
+
+def calc_skyline(lens_list: List[Lens], dimension: Dict[str, str]) -> List[Lens]:
+    """他のどのレンズにも支配されない(全項目で同等以上かつ、どれかで勝るレンズが存在しない)レンズを求める
+
+    2項目ならソートして1回走査するだけで求める。3項目以上なら、支配するものが必ず先に来る順
+    (正規化した値の和の昇順)に並べ、それまでに残ったレンズとだけ比較する(Sort-Filter-Skyline)。
+    値が0以下の項目を持つレンズ(価格不明など)は対象外とする。
+
+    Parameters
+    ----------
+    lens_list: List[Lens]
+        レンズ一覧
+    dimension: Dict[str, str]
+        比較する項目名 → 'min'(小さいほど良い)か'max'(大きいほど良い)
+
+    Returns
+    -------
+        スカイラインに含まれるレンズ一覧(元の順序を保つ)
+    """
+    if len(dimension) == 0:
+        raise ValueError('比較する項目を1つ以上指定してください.')
+    for key, direction in dimension.items():
+        if direction not in ['min', 'max']:
+            raise ValueError(f'項目{key}の向きは min か max で指定してください.')
+
+    # 全項目を「小さいほど良い」に揃える
+    lens_list = [x for x in lens_list if all([getattr(x, y) > 0 for y in dimension.keys()])]
+    if len(lens_list) == 0:
+        return []
+    value = numpy.array([[getattr(x, y) if z == 'min' else -getattr(x, y) for y, z in dimension.items()]
+                         for x in lens_list], dtype=float)
+
+    if value.shape[1] == 1:
+        mask = value[:, 0] == value[:, 0].min()
+    elif value.shape[1] == 2:
+        mask = skyline_mask_2d(value)
+    else:
+        mask = skyline_mask_sfs(value)
+    return [x for x, y in zip(lens_list, mask) if y]
+
+
+def skyline_mask_2d(value: numpy.ndarray) -> numpy.ndarray:
+    """2項目のスカイラインを、1項目目→2項目目の順にソートして走査することで求める"""
+    order = numpy.lexsort((value[:, 1], value[:, 0]))
+    sorted_value = value[order]
+
+    # 全く同じ値の点は互いに支配しないので、まとめて1つのグループとして扱う
+    is_head = numpy.ones(len(order), dtype=bool)
+    is_head[1:] = (sorted_value[1:] != sorted_value[:-1]).any(axis=1)
+    group = numpy.cumsum(is_head) - 1
+    group_y = sorted_value[is_head, 1]
+
+    # それより前のグループの2項目目の最小値より小さいグループだけが残る
+    previous_min = numpy.full(len(group_y), numpy.inf)
+    previous_min[1:] = numpy.minimum.accumulate(group_y)[:-1]
+    mask = numpy.zeros(len(value), dtype=bool)
+    mask[order] = (group_y < previous_min)[group]
+    return mask
+
+
+def skyline_mask_sfs(value: numpy.ndarray, block_size: int = 256) -> numpy.ndarray:
+    """3項目以上のスカイラインを、Sort-Filter-Skylineで求める"""
+    # 各項目を0～1に正規化した値の和は、支配関係に対して狭義単調になるので、
+    # この順に並べると、支配する点は支配される点より必ず前に来る
+    low = value.min(axis=0)
+    width = value.max(axis=0) - low
+    width[width == 0] = 1
+    remaining = numpy.argsort(((value - low) / width).sum(axis=1), kind='stable')
+
+    # 先頭からblock_size件ずつ取り出してスカイラインを確定させ、
+    # 確定した点に支配される点を、残り全体からまとめて取り除く
+    mask = numpy.zeros(len(value), dtype=bool)
+    while len(remaining) > 0:
+        index, remaining = remaining[0:block_size], remaining[block_size:]
+        block = value[index]
+
+        # ブロック内で支配されているものを除く(支配関係は推移的なので、順序を気にせず比較してよい)
+        survived = ~dominated_by_any(block, block)
+        mask[index[survived]] = True
+        remaining = remaining[~dominated_by_any(value[remaining], block[survived])]
+    return mask
+
+
+def dominated_by_any(point: numpy.ndarray, other: numpy.ndarray, chunk_cell: int = 1 << 22) -> numpy.ndarray:
+    """pointの各点について、otherのどれかに支配されているかを返す"""
+    output = numpy.zeros(len(point), dtype=bool)
+    if len(point) == 0 or len(other) == 0:
+        return output
+
+    # 一時配列が大きくなりすぎないよう、pointを分割して比較する
+    chunk_size = max(1, chunk_cell // len(other))
+    for start in range(0, len(point), chunk_size):
+        temp = point[start:start + chunk_size]
+        less_equal = numpy.ones((len(temp), len(other)), dtype=bool)
+        less = numpy.zeros((len(temp), len(other)), dtype=bool)
+        for i in range(point.shape[1]):
+            less_equal &= other[numpy.newaxis, :, i] <= temp[:, i, numpy.newaxis]
+            less |= other[numpy.newaxis, :, i] < temp[:, i, numpy.newaxis]
+        output[start:start + chunk_size] = (less_equal & less).any(axis=1)
+    return output
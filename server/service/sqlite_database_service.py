@@ -1,18 +1,27 @@
-from sqlite3 import connect
-from typing import List, Dict
+from sqlite3 import connect, Connection
+from typing import List, Dict, Iterable
 
 from service.i_database_service import IDataBaseService
 
 
 class SqliteDataBaseService(IDataBaseService):
-    def __init__(self, database_file_path: str, **kwargs):
+    def __init__(self, database_file_path: str, timeout: float = 5.0, **kwargs):
         super().__init__(**kwargs)
         self.db_file_path = database_file_path
+        # 他のプロセスが書き込み中のとき、ロックが解けるまで待つ秒数
+        self.timeout = timeout
+
+    def connect(self) -> Connection:
+        return connect(self.db_file_path, timeout=self.timeout)
 
     def select(self, query: str, parameter=()) -> List[Dict[str, any]]:
-        with connect(self.db_file_path) as conn:
+        with self.connect() as conn:
             cur = conn.cursor()
             cur.execute(query, parameter)
+            if cur.description is None:
+                # 列を返さない文(PRAGMA incremental_vacuumなど)も、最後まで実行させる
+                cur.fetchall()
+                return []
             columns = [description[0] for description in cur.description]
             output: List[Dict[str, any]] = []
             for row in cur.fetchall():
@@ -31,13 +40,22 @@ class SqliteDataBaseService(IDataBaseService):
             for _ in range(0, len(query)):
                 parameter.append(())
         if len(query) != len(parameter):
-            return
-        with connect(self.db_file_path) as conn:
+            raise ValueError(f'クエリ({len(query)}件)とパラメーター({len(parameter)}件)の数が一致しません.')
+        with self.connect() as conn:
             cur = conn.cursor()
             for q, p in zip(query, parameter):
                 cur.execute(q, p)
             conn.commit()
 
+    def bulk_query(self, query: List[str], parameter: List[Iterable[any]]) -> None:
+        if len(query) != len(parameter):
+            raise ValueError(f'クエリ({len(query)}件)とパラメーター({len(parameter)}件)の数が一致しません.')
+        with self.connect() as conn:
+            cur = conn.cursor()
+            for q, p in zip(query, parameter):
+                cur.executemany(q, p)
+            conn.commit()
+
 
 if __name__ == '__main__':
     service: IDataBaseService = SqliteDataBaseService('database.db')
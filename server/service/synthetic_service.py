@@ -0,0 +1,122 @@
+from typing import List, Iterator
+
+import numpy
+
+from constant import Lens
+
+# マウントごとのメーカー一覧
+SYNTHETIC_MAKER_LIST = {
+    'マイクロフォーサーズ': ['Panasonic', 'OLYMPUS', 'SIGMA', 'Cosina', 'LAOWA', 'TAMRON', 'Tokina'],
+    'ライカL': ['Panasonic', 'SIGMA', 'LEICA'],
+}
+
+# iter_synthetic_lens で一度に生成する件数
+SYNTHETIC_CHUNK_SIZE = 100000
+
+# 35mm判換算の焦点距離を求める際の倍率
+CROP_FACTOR = {
+    'マイクロフォーサーズ': 2,
+    'ライカL': 1,
+}
+
+
+def generate_lens_list(size: int, seed: int = 0, start: int = 0) -> List[Lens]:
+    """性能評価用に、それらしい値を持つ架空のレンズデータを生成する
+
+    焦点距離・F値・質量・大きさ・価格が互いに相関するように生成しているので、
+    実データと同じような偏りを持つ。同じseedからは常に同じデータが生成される。
+
+    Parameters
+    ----------
+    size: int
+        生成する件数
+    seed: int
+        乱数のシード
+    start: int
+        idと型番の番号を、この数の次から振る
+
+    Returns
+    -------
+        レンズデータ一覧(idは start + 1 から振られる)
+    """
+    rng = numpy.random.default_rng(seed)
+
+    # マウントと、単焦点/ズームの別
+    is_mft = rng.random(size) < 0.7
+    is_prime = rng.random(size) < 0.6
+
+    # 焦点距離(実焦点距離で生成してから換算する)
+    wide = numpy.exp(rng.uniform(numpy.log(4), numpy.log(400), size))
+    ratio = numpy.where(is_prime, 1.0, numpy.exp(rng.uniform(numpy.log(1.5), numpy.log(12), size)))
+    wide = numpy.round(wide).clip(4, 600)
+    tele = numpy.round(wide * ratio).clip(4, 800)
+    crop = numpy.where(is_mft, CROP_FACTOR['マイクロフォーサーズ'], CROP_FACTOR['ライカL'])
+
+    # F値(ズームほど暗く、望遠端は広角端以上)
+    wide_f = numpy.where(is_prime,
+                         rng.choice([0.95, 1.2, 1.4, 1.7, 1.8, 2.0, 2.8, 4.0, 5.6], size),
+                         rng.choice([2.8, 3.5, 4.0, 4.5], size))
+    tele_f = numpy.where(is_prime | (rng.random(size) < 0.3), wide_f,
+                         wide_f + rng.choice([0.8, 1.0, 1.3, 1.8, 2.2], size))
+
+    # 質量・大きさ・価格は、焦点距離と明るさから決める
+    weight = 250 * (tele * crop / 100) ** 0.7 * (2.8 / wide_f) ** 0.8 * ratio ** 0.2
+    weight = numpy.round(weight * rng.lognormal(0, 0.25, size)).clip(30, 6000)
+    overall_diameter = numpy.round(numpy.cbrt(weight) * 8.5 * rng.lognormal(0, 0.08, size), 1)
+    overall_length = numpy.round(weight / overall_diameter ** 2 * 700 * rng.lognormal(0, 0.1, size), 1)
+    price = numpy.round(weight * 250 * rng.lognormal(0, 0.35, size), -3).astype(int)
+    price = numpy.where(rng.random(size) < 0.03, 0, price)
+    filter_diameter = numpy.where(
+        rng.random(size) < 0.05, -1,
+        numpy.array([37, 40.5, 43, 46, 49, 52, 55, 58, 62, 67, 72, 77, 82, 86, 95])
+        [numpy.searchsorted([42, 45, 48, 51, 54, 57, 60, 65, 70, 75, 80, 85, 92, 100], overall_diameter)])
+    wide_mfd = numpy.round(wide * 8 * rng.lognormal(0, 0.3, size), -1).clip(50, 5000)
+    tele_mfd = numpy.where(is_prime, wide_mfd, numpy.round(wide_mfd * ratio ** 0.5, -1))
+    magnification = numpy.round(numpy.where(rng.random(size) < 0.1, rng.uniform(0.5, 2.0, size),
+                                            rng.uniform(0.05, 0.35, size)) * crop, 2)
+    is_drip_proof = rng.random(size) < 0.45
+    has_image_stabilization = rng.random(size) < numpy.where(tele * crop > 150, 0.7, 0.2)
+    is_inner_zoom = is_prime | (rng.random(size) < 0.15)
+    maker_index = rng.integers(0, 1000, size)
+
+    output: List[Lens] = []
+    for i in range(size):
+        mount = 'マイクロフォーサーズ' if is_mft[i] else 'ライカL'
+        maker_list = SYNTHETIC_MAKER_LIST[mount]
+        maker = maker_list[maker_index[i] % len(maker_list)]
+        focal_text = f'{int(wide[i])}mm' if is_prime[i] else f'{int(wide[i])}-{int(tele[i])}mm'
+        f_text = f'F{wide_f[i]:g}' if wide_f[i] == tele_f[i] else f'F{wide_f[i]:g}-{tele_f[i]:g}'
+        output.append(Lens(
+            id=start + i + 1,
+            maker=maker,
+            name=f'{maker} SYNTHETIC {focal_text} {f_text}',
+            product_number=f'SYN-{start + i + 1:07d}',
+            wide_focal_length=int(wide[i] * crop[i]),
+            telephoto_focal_length=int(tele[i] * crop[i]),
+            wide_f_number=float(wide_f[i]),
+            telephoto_f_number=float(tele_f[i]),
+            wide_min_focus_distance=int(wide_mfd[i]),
+            telephoto_min_focus_distance=int(tele_mfd[i]),
+            max_photographing_magnification=float(magnification[i]),
+            filter_diameter=float(filter_diameter[i]),
+            is_drip_proof=bool(is_drip_proof[i]),
+            has_image_stabilization=bool(has_image_stabilization[i]),
+            is_inner_zoom=bool(is_inner_zoom[i]),
+            overall_diameter=float(overall_diameter[i]),
+            overall_length=float(overall_length[i]),
+            weight=float(weight[i]),
+            price=int(price[i]),
+            mount=mount,
+        ))
+    return output
+
+
+def iter_synthetic_lens(size: int, seed: int = 0, chunk_size: int = SYNTHETIC_CHUNK_SIZE) -> Iterator[Lens]:
+    """架空のレンズデータを chunk_size 件ずつ生成して1件ずつ返す(100万件などでも、メモリに溜めずに済む)
+
+    chunk ごとに seed と chunk の番号から乱数を作り直すので、同じ seed・chunk_size からは常に同じ列が返る
+    (generate_lens_list(size, seed) とは別の列になる)。idと型番は通し番号になる。
+    """
+    for start in range(0, size, chunk_size):
+        yield from generate_lens_list(min(chunk_size, size - start), seed=seed * 1000003 + start // chunk_size,
+                                      start=start)
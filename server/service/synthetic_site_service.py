@@ -0,0 +1,280 @@
+import html
+import threading
+from collections import Counter
+from dataclasses import replace
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import List, Dict, Tuple, Callable
+
+from constant import Lens
+
+# パナソニックの、全レンズの仕様を1ページに並べた比較ページ
+PANASONIC_COMPARISON_URL = 'https://panasonic.jp/dc/comparison.html'
+
+# ライカの、単焦点・ズームレンズの一覧ページ
+LEICA_PRIME_LIST_URL = 'https://us.leica-camera.com/Photography/Leica-SL/SL-Lenses/Prime-Lenses'
+LEICA_VARIO_LIST_URL = 'https://us.leica-camera.com/Photography/Leica-SL/SL-Lenses/Vario-Lenses'
+
+# 各ページの前後に付ける、ナビゲーションなどの定型部分の大きさ(文字数)の既定値
+PAGE_PADDING = 20000
+
+# ページ(URL → HTML)
+PageMap = Dict[str, str]
+
+
+def make_padding(size: int) -> str:
+    """ナビゲーションや紹介文を模した、約 size 文字の定型部分"""
+    link = ''.join([f'<li><a href="/menu/{i}">メニュー{i}</a></li>' for i in range(10)])
+    teaser = '高画質で軽快に撮影できるレンズです。' * 10
+    block = f'<nav class="global-nav"><ul>{link}</ul></nav><div class="teaser"><p>{teaser}</p></div>'
+    return block * (size // len(block))
+
+
+def make_page(title: str, body: str, padding: int) -> str:
+    return (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>{html.escape(title)}</title></head><body>'
+            f'<header>{make_padding(padding // 2)}</header><main>{body}</main>'
+            f'<footer>{make_padding(padding - padding // 2)}</footer></body></html>')
+
+
+def format_number(value: float) -> str:
+    return f'{value:g}'
+
+
+def format_meter(value: float) -> str:
+    """mm単位の距離を、m単位の表記にする"""
+    return format_number(value / 1000)
+
+
+def to_panasonic_lens(lens: Lens) -> Lens:
+    """架空のレンズを、パナソニックのマイクロフォーサーズ用レンズとして載せられる値に揃える
+
+    焦点距離(35mm判換算)は実焦点距離の2倍なので偶数に、フィルター径は整数に、インナーズームは単焦点だけにする。
+    比較ページをパースした結果は、この値と一致する。
+    """
+    wide = max(round(lens.wide_focal_length / 2), 1)
+    telephoto = max(round(lens.telephoto_focal_length / 2), wide)
+    wide_f_number = round(lens.wide_f_number, 1)
+    telephoto_f_number = max(round(lens.telephoto_f_number, 1), wide_f_number) if wide != telephoto else wide_f_number
+    if wide == telephoto:
+        name = f'LUMIX G {wide}mm / F{format_number(wide_f_number)} ASPH.'
+    elif wide_f_number == telephoto_f_number:
+        name = f'LUMIX G VARIO {wide}-{telephoto}mm / F{format_number(wide_f_number)} ASPH.'
+    else:
+        name = f'LUMIX G VARIO {wide}-{telephoto}mm / F{format_number(wide_f_number)}-' \
+               f'{format_number(telephoto_f_number)} ASPH.'
+    return replace(lens, id=0, maker='Panasonic', name=name, product_number=f'H-{lens.product_number}',
+                   wide_focal_length=wide * 2, telephoto_focal_length=telephoto * 2,
+                   wide_f_number=wide_f_number, telephoto_f_number=telephoto_f_number,
+                   telephoto_min_focus_distance=lens.wide_min_focus_distance if wide == telephoto
+                   else lens.telephoto_min_focus_distance,
+                   max_photographing_magnification=round(lens.max_photographing_magnification, 2),
+                   filter_diameter=round(lens.filter_diameter) if lens.filter_diameter > 0 else -1,
+                   is_inner_zoom=wide == telephoto,
+                   overall_diameter=round(lens.overall_diameter, 1), overall_length=round(lens.overall_length, 1),
+                   weight=round(lens.weight), mount='マイクロフォーサーズ')
+
+
+def make_panasonic_site(lens_list: List[Lens], padding: int = PAGE_PADDING) -> Tuple[PageMap, List[Lens]]:
+    """パナソニックの比較ページを模したページを作る(get_p_lens_list で読み取れる)
+
+    Parameters
+    ----------
+    lens_list: List[Lens]
+        載せるレンズ(synthetic_service の架空のレンズなど。値は to_panasonic_lens で揃える)
+    padding: int
+        ページの前後に付ける定型部分の文字数
+
+    Returns
+    -------
+        (ページ, 載せたレンズの一覧(ページの順))
+    """
+    site_lens_list = [to_panasonic_lens(x) for x in lens_list]
+
+    def focal_length(x: Lens) -> str:
+        if x.wide_focal_length == x.telephoto_focal_length:
+            return f'{x.wide_focal_length}mm'
+        return f'{x.wide_focal_length}mm～{x.telephoto_focal_length}mm'
+
+    def min_focus_distance(x: Lens) -> str:
+        if x.wide_focal_length == x.telephoto_focal_length:
+            return f'{format_meter(x.wide_min_focus_distance)}m'
+        return f'{format_meter(x.wide_min_focus_distance)}m / {format_meter(x.telephoto_min_focus_distance)}m'
+
+    row_list: List[Tuple[str, Callable[[Lens], str]]] = [
+        ('品番', lambda x: x.product_number),
+        ('35mm判換算焦点距離', focal_length),
+        ('レンズ構成', lambda x: '9群12枚（非球面レンズ2枚）'),
+        ('最短撮影距離', min_focus_distance),
+        ('最大撮影倍率', lambda x: f'{x.max_photographing_magnification / 2:.3g}倍'
+                             f'（35mm判換算：{format_number(x.max_photographing_magnification)}倍）'),
+        ('絞り羽根', lambda x: '7枚（円形虹彩絞り）'),
+        ('フィルターサイズ', lambda x: f'φ{x.filter_diameter}mm' if x.filter_diameter > 0 else '－'),
+        ('最大径×全長', lambda x: f'約φ{format_number(x.overall_diameter)}mm×{format_number(x.overall_length)}mm'),
+        ('質量', lambda x: f'約{x.weight:,}g'),
+        ('防塵・防滴', lambda x: '○' if x.is_drip_proof else '－'),
+        ('手ブレ補正', lambda x: 'POWER O.I.S.' if x.has_image_stabilization else '－'),
+        ('メーカー希望小売価格', lambda x: f'{x.price:,}円（税込）'),
+    ]
+    head = ''.join([f'<th><p>{html.escape(x.name)}</p></th>' for x in site_lens_list])
+    body = ''.join([f'<tr><th>{key}</th>' + ''.join([f'<td>{html.escape(func(x))}</td>' for x in site_lens_list]) +
+                    '</tr>' for key, func in row_list])
+    table = f'<table class="comparison"><thead><tr><th></th>{head}</tr></thead><tbody>{body}</tbody></table>'
+    return {PANASONIC_COMPARISON_URL: make_page('レンズ比較', f'<h1>交換レンズ比較</h1>{table}', padding)}, \
+        site_lens_list
+
+
+def to_leica_lens(lens: Lens) -> Lens:
+    """架空のレンズを、ライカのLマウント用レンズとして載せられる値に揃える
+
+    ライカのページには価格・防塵防滴の記載が無く、フィルター径は整数で、どのレンズにも付く。
+    個別ページをパースした結果は、この値と一致する。
+    """
+    wide = lens.wide_focal_length
+    telephoto = max(lens.telephoto_focal_length, wide)
+    wide_f_number = round(lens.wide_f_number, 1)
+    telephoto_f_number = max(round(lens.telephoto_f_number, 1), wide_f_number) if wide != telephoto else wide_f_number
+    if wide == telephoto:
+        name = f'SUMMILUX-SL{wide} f/{format_number(wide_f_number)} ASPH.'
+    elif wide_f_number == telephoto_f_number:
+        name = f'VARIO-ELMARIT-SL{wide}–{telephoto} f/{format_number(wide_f_number)} ASPH.'
+    else:
+        name = f'VARIO-ELMARIT-SL{wide}–{telephoto} f/{format_number(wide_f_number)}–' \
+               f'{format_number(telephoto_f_number)} ASPH.'
+    return replace(lens, id=0, maker='LEICA', name=name, product_number=lens.product_number.replace(' ', ''),
+                   telephoto_focal_length=telephoto, wide_f_number=wide_f_number,
+                   telephoto_f_number=telephoto_f_number,
+                   telephoto_min_focus_distance=lens.wide_min_focus_distance if wide == telephoto
+                   else lens.telephoto_min_focus_distance,
+                   max_photographing_magnification=round(lens.max_photographing_magnification, 2),
+                   filter_diameter=round(lens.filter_diameter) if lens.filter_diameter > 0 else 82,
+                   is_drip_proof=False, is_inner_zoom=wide == telephoto,
+                   overall_diameter=round(lens.overall_diameter, 1), overall_length=round(lens.overall_length, 1),
+                   weight=float(round(lens.weight)), price=0, mount='ライカL')
+
+
+def leica_lens_url(lens: Lens) -> str:
+    list_url = LEICA_PRIME_LIST_URL if lens.wide_focal_length == lens.telephoto_focal_length else LEICA_VARIO_LIST_URL
+    return f'{list_url}/{lens.product_number}'
+
+
+def make_leica_lens_page(lens: Lens, padding: int) -> str:
+    """ライカのレンズごとのページ(仕様の表は section.tech-specs の中にある)"""
+    ratio = f'1:{1 / lens.max_photographing_magnification:.6g}'
+    if lens.wide_focal_length == lens.telephoto_focal_length:
+        working_range = f'{format_meter(lens.wide_min_focus_distance)} m to infinity'
+        reproduction_ratio = ratio
+    else:
+        working_range = '<br>'.join([
+            f'Focal length {lens.wide_focal_length} mm: {format_meter(lens.wide_min_focus_distance)} m to infinity',
+            f'Focal length {lens.telephoto_focal_length} mm: '
+            f'{format_meter(lens.telephoto_min_focus_distance)} m to infinity',
+        ])
+        wide_ratio = f'1:{2 / lens.max_photographing_magnification:.6g}'
+        reproduction_ratio = f'Focal length {lens.wide_focal_length} mm: {wide_ratio}<br>' \
+                             f'Focal length {lens.telephoto_focal_length} mm: {ratio}'
+    row_list: List[Tuple[str, str]] = [
+        ('Order number', ' '.join([lens.product_number[i:i + 2] for i in range(0, len(lens.product_number), 2)])),
+        ('Angle of view (diagonal, horizontal, vertical)', '46.8°, 39.6°, 27°'),
+        ('Working range', working_range),
+        ('Largest reproduction ratio', reproduction_ratio),
+        ('Number of lenses/groups', '12/10'),
+        ('Filter mount', f'E{lens.filter_diameter}'),
+        ('Largest diameter', f'{format_number(lens.overall_diameter)} mm'),
+        ('Length to bayonet mount', f'{format_number(lens.overall_length)} mm'),
+        ('Weight', f'{round(lens.weight):,} g'.replace(',', '.')),
+    ]
+    if lens.has_image_stabilization:
+        row_list.append(('O.I.S. Performance as per CIPA', '5 stops'))
+    table = ''.join([f'<tr><td>{key}</td><td>{value}</td></tr>' for key, value in row_list])
+    return make_page(lens.name, f'<h1>{html.escape(lens.name)}</h1><section class="overview"><p>' +
+                     'Outstanding imaging performance.' * 20 + '</p></section>'
+                     f'<section class="tech-specs"><h2>Technical Data</h2><table>{table}</table></section>', padding)
+
+
+def make_leica_site(lens_list: List[Lens], padding: int = PAGE_PADDING) -> Tuple[PageMap, List[Lens]]:
+    """ライカの一覧ページ(単焦点・ズーム)と、レンズごとのページを模したページを作る(get_l_l_lens_list で読み取れる)
+
+    Parameters
+    ----------
+    lens_list: List[Lens]
+        載せるレンズ(synthetic_service の架空のレンズなど。値は to_leica_lens で揃える)
+    padding: int
+        ページの前後に付ける定型部分の文字数
+
+    Returns
+    -------
+        (ページ, 載せたレンズの一覧(単焦点・ズームの順に、一覧ページの順))
+    """
+    site_lens_list = [to_leica_lens(x) for x in lens_list]
+    prime_list = [x for x in site_lens_list if x.wide_focal_length == x.telephoto_focal_length]
+    vario_list = [x for x in site_lens_list if x.wide_focal_length != x.telephoto_focal_length]
+    output: PageMap = {}
+    for list_url, temp_list in [(LEICA_PRIME_LIST_URL, prime_list), (LEICA_VARIO_LIST_URL, vario_list)]:
+        item_list: List[str] = []
+        for lens in temp_list:
+            lens_url = leica_lens_url(lens)
+            item_list.append('<div class="h2-text-image-multi-layout module no-border">'
+                             f'<h2 class="headline-40"><span>Leica</span>{html.escape(lens.name)}</h2>'
+                             '<p>A new benchmark for the SL-System.</p>'
+                             f'<a class="red_cta" href="{lens_url[len("https://us.leica-camera.com"):]}">Discover</a>'
+                             '</div>')
+            output[lens_url] = make_leica_lens_page(lens, padding)
+        output[list_url] = make_page('SL-Lenses', ''.join(item_list), padding)
+    return output, prime_list + vario_list
+
+
+class SyntheticSiteHandler(BaseHTTPRequestHandler):
+    """「/ホスト名/パス」に、元のURL「https://ホスト名/パス」のページを返す"""
+
+    def do_GET(self):
+        server: 'SyntheticSiteServer' = self.server.site
+        url = 'https://' + self.path[1:]
+        with server.lock:
+            server.hit_counter[url] += 1
+        text = server.page_map.get(url)
+        if text is None:
+            self.send_error(404)
+            return
+        body = text.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class SyntheticSiteServer:
+    """作ったページを返す、手元のスタブのHTTPサーバー
+
+    with 文の中で動き、url_map を ScrapingService(や main.py の --url-map)に渡すと、
+    元のURLの代わりにこのサーバーから取得する。
+    """
+
+    def __init__(self, page_map: PageMap, port: int = 0):
+        self.page_map = page_map
+        self.port = port
+        self.hit_counter: Counter = Counter()
+        self.lock = threading.Lock()
+        self.server: ThreadingHTTPServer = None
+        self.thread: threading.Thread = None
+
+    def __enter__(self) -> 'SyntheticSiteServer':
+        self.server = ThreadingHTTPServer(('127.0.0.1', self.port), SyntheticSiteHandler)
+        self.server.site = self
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    @property
+    def url_map(self) -> Dict[str, str]:
+        """元のURLの先頭(https://ホスト名/)から、このサーバーのURLへの置き換え表"""
+        host_set = set([x.split('/')[2] for x in self.page_map.keys()])
+        return {f'https://{x}/': f'http://127.0.0.1:{self.port}/{x}/' for x in sorted(host_set)}
@@ -1,34 +1,40 @@
-import re
-from typing import List
-
-import pandas
+import unicodedata
+from typing import List, Optional
 
 from constant import Lens
+from service.linear_regex import find_group_list, RegexBudgetExceeded
+
+# 正規表現1回(1項目)あたりの時間の予算(秒)
+REGEX_TIME_BUDGET = 0.05
 
 
-def regex(text: str, pattern: str) -> List[str]:
-    """グループ入り正規表現にマッチさせて、ヒットした場合はそれぞれの文字列の配列、そうでない場合は空配列を返す"""
-    output: List[str] = []
-    for m in re.finditer(pattern, text, re.MULTILINE):
-        for x in m.groups():
-            output.append(x)
-    return output
+def regex(text: str, pattern: str, budget: Optional[float] = REGEX_TIME_BUDGET) -> List[str]:
+    """グループ入り正規表現にマッチさせて、ヒットした場合はそれぞれの文字列の配列、そうでない場合は空配列を返す
+
+    スクレイピングしたページの壊れたセルなどでバックトラックが爆発しないよう、線形時間のエンジン
+    (service.linear_regex)でマッチさせる。予算(秒)を超えたら、その項目は読み取れなかったものとして空配列を返す。
+    """
+    try:
+        return find_group_list(text, pattern, budget)
+    except RegexBudgetExceeded:
+        print(f'regex budget exceeded... [{pattern}] ({len(text)} chars)')
+        return []
 
 
-def load_csv_lens(path: str, lens_mount: str) -> List[Lens]:
-    """CSVファイルからデータを読み込む
+def normalize_search_text(text: str) -> str:
+    """検索用に文字列を正規化する(全角英数字や記号を半角に揃え、小文字にする)"""
+    return unicodedata.normalize('NFKC', text).lower()
 
-    Parameters
-    ----------
-    path: str
-        ファイルパス
-    lens_mount: str
-        レンズマウント
 
-    Returns
-    -------
-        取得結果
+def make_lens_key(maker: str, mount: str, product_number: str, name: str) -> str:
+    """ビルドをまたいで同じレンズを指すキー(「メーカー名/マウント/型番」。型番が無い場合はレンズ名)
+
+    IDはビルドごとに振り直されるので使わない。同じ型番・レンズ名で複数のマウント向けに出しているレンズ
+    (シグマなど)があるので、マウントも含める。
     """
-    df = pandas.read_csv(path, dtype={'product_number': str})
-    df['mount'] = lens_mount
-    return [Lens.from_dict(x) for x in df.to_dict(orient='records')]
+    return f'{maker}/{mount}/{product_number or name}'
+
+
+def lens_key(lens: Lens) -> str:
+    """レンズの、ビルドをまたいで同じレンズを指すキー(make_lens_key を参照)"""
+    return make_lens_key(lens.maker, lens.mount, lens.product_number, lens.name)